@@ -1,11 +1,11 @@
 import traceback
 from flask import Flask, render_template, request, jsonify, session, redirect, url_for, flash, send_file
 import json
-import sqlite3
+from backend.db import get_connection, release_thread_connections
 import base64
 import datetime
 from datetime import datetime
-from backend.crypto_utils import verify_signature
+from backend.crypto_utils import verify_signature, public_key_cache
 import atexit
 from contextlib import contextmanager
 import io
@@ -15,7 +15,7 @@ import subprocess
 
 # Import backend modules
 from backend.database import init_db
-from backend.payroll_system import PayrollSystem
+from backend.payroll_system import get_payroll_system as get_shared_payroll_system
 #from generate_keys import Wallet
 from backend.crypto_utils import CryptoUtils
 from cryptography.hazmat.primitives import hashes, serialization
@@ -27,50 +27,51 @@ app.secret_key = '123'
 # Khởi tạo CSDL
 init_db()
 
-# Biến global để đảm bảo chỉ có một instance PayrollSystem
-_payroll_system = None
-_system_lock = False
-# Tạo một instance duy nhất của PayrollSystem để dùng chung
-payroll_system = PayrollSystem()
+# Chỉ có một instance PayrollSystem cho cả tiến trình (xem get_payroll_system)
+_exit_hook_registered = False
 
-# Tạo class AuthSystem đơn giản
+# Tạo class AuthSystem đơn giản - tạo một lần khi khởi động, login chỉ tra user + verify chữ ký
 class AuthSystem:
     def __init__(self):
         self.init_auth_db()
     
     def init_auth_db(self):
-        conn = sqlite3.connect('payroll.db')
-        c = conn.cursor()
-        c.execute('''CREATE TABLE IF NOT EXISTS users
-                     (id INTEGER PRIMARY KEY,
-                      username TEXT UNIQUE,
-                      password TEXT,
-                      role TEXT DEFAULT 'user',
-                      last_login TIMESTAMP,
-                      is_active BOOLEAN DEFAULT 1)''')
-        
-        # Tạo tài khoản admin mặc định
-        public_key = CryptoUtils.generate_rsa_key_pair(save_to=f"user_admin_keys.json")['public_key']
-
-        c.execute("INSERT OR IGNORE INTO users (username, public_key, role) VALUES (?, ?, ?)",
-                ("admin", public_key, "admin"))
-        
-        conn.commit()
-        conn.close()
+        with get_connection() as conn:
+            c = conn.cursor()
+            c.execute('''CREATE TABLE IF NOT EXISTS users
+                         (id INTEGER PRIMARY KEY,
+                          username TEXT UNIQUE,
+                          password TEXT,
+                          role TEXT DEFAULT 'user',
+                          last_login TIMESTAMP,
+                          is_active BOOLEAN DEFAULT 1)''')
+        
+            # Tạo tài khoản admin mặc định (chỉ sinh khóa RSA khi admin chưa có public key)
+            c.execute("SELECT public_key FROM users WHERE username = ?", ("admin",))
+            admin = c.fetchone()
+            if not admin or not admin[0]:
+                public_key = CryptoUtils.generate_rsa_key_pair(save_to=f"user_admin_keys.json")['public_key']
+                if admin:
+                    c.execute("UPDATE users SET public_key = ? WHERE username = ?", (public_key, "admin"))
+                else:
+                    c.execute("INSERT INTO users (username, public_key, role) VALUES (?, ?, ?)",
+                            ("admin", public_key, "admin"))
+                print("Đã tạo khóa RSA cho tài khoản admin: user_admin_keys.json")
+        
+            conn.commit()
     
     def verify_user(self, username, timestamp, signature):
-        conn = sqlite3.connect('payroll.db')
-        c = conn.cursor()
+        with get_connection() as conn:
+            c = conn.cursor()
 
-        c.execute("SELECT id, username, role, public_key, employee_id, is_active FROM users WHERE username = ?", (username,))
-        row = c.fetchone()
-        conn.close()
+            c.execute("SELECT id, username, role, public_key, employee_id, is_active FROM users WHERE username = ?", (username,))
+            row = c.fetchone()
 
         if row and row[5] == 1:  # kiểm tra active
             db_public_key = row[3]
             message = f"{timestamp}:{username}"  # ✅ Sửa chỗ này
 
-            if verify_signature(db_public_key, message, signature):
+            if verify_signature(db_public_key, message, signature, user_id=row[0]):
                 return {
                     'id': row[0],
                     'username': row[1],
@@ -102,26 +103,20 @@ class AuthSystem:
       
                    
     def get_all_users(self):
-        conn = sqlite3.connect('payroll.db')
-        c = conn.cursor()
-        c.execute("SELECT id, username, role, password, last_login, is_active FROM users")
-        users = c.fetchall()
-        conn.close()
+        with get_connection() as conn:
+            c = conn.cursor()
+            c.execute("SELECT id, username, role, password, last_login, is_active FROM users")
+            users = c.fetchall()
         return users
 
-# Tạo class ReportGenerator đơn giản
-class ReportGenerator:
-    def generate_salary_report_pdf(self):
-        # Tạo PDF đơn giản (mock)
-        content = "Salary Report - Generated on " + datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        buffer = io.BytesIO()
-        buffer.write(content.encode())
-        buffer.seek(0)
-        return buffer
-
 # Khởi tạo các instance
 auth_system = AuthSystem()
-report_gen = ReportGenerator()
+
+@app.teardown_request
+def release_db_connection(exc):
+    """Cuối mỗi request: rollback và trả về pool connection mà route quên đóng (vd do lỗi giữa chừng)"""
+    if release_thread_connections():
+        print("Warning: released a database connection left open by the request")
 
 # Decorator functions
 def login_required(f):
@@ -142,35 +137,27 @@ def admin_required(f):
     return decorated_function
 
 def get_payroll_system():
-    """Singleton pattern cho PayrollSystem"""
-    global _payroll_system, _system_lock
+    """Singleton PayrollSystem dùng chung (backend.payroll_system), đăng ký lưu chain khi thoát"""
+    global _exit_hook_registered
     
-    if _payroll_system is None and not _system_lock:
-        _system_lock = True
-        try:
-            print("Initializing PayrollSystem...")
-            _payroll_system = PayrollSystem()
-            
-            # Đảm bảo lưu blockchain khi thoát ứng dụng
-            atexit.register(save_blockchain_on_exit)
-            
-            print("PayrollSystem initialized successfully")
-        except Exception as e:
-            print(f"Error initializing PayrollSystem: {e}")
-            _system_lock = False
-            raise
-        finally:
-            _system_lock = False
+    payroll = get_shared_payroll_system()
+    if not _exit_hook_registered:
+        _exit_hook_registered = True
+        # Đảm bảo lưu blockchain khi thoát ứng dụng
+        atexit.register(save_blockchain_on_exit)
     
-    return _payroll_system
+    return payroll
 
 def save_blockchain_on_exit():
     """Lưu blockchain khi thoát ứng dụng"""
-    global _payroll_system
-    if _payroll_system:
+    payroll = get_shared_payroll_system()
+    if payroll:
         try:
-            _payroll_system.blockchain.save_to_file()
-            _payroll_system.blockchain.backup_chain()
+            # Đóng block cho các ticket còn trong hàng đợi trước khi lưu
+            if not payroll.sealer.flush(timeout=30):
+                print(f"Warning: {payroll.sealer.pending_count()} queued transactions not sealed")
+            payroll.blockchain.save_to_file()
+            payroll.blockchain.backup_chain()
             print("Blockchain saved on exit")
         except Exception as e:
             print(f"Error saving blockchain on exit: {e}")
@@ -180,9 +167,8 @@ def payroll_transaction():
     """Context manager để đảm bảo transaction safety"""
     payroll = get_payroll_system()
     try:
+        # add_block đã tự lưu block mới (ghi nối ở chế độ log), không ghi lại cả chain ở đây
         yield payroll
-        # Lưu sau mỗi transaction thành công
-        payroll.blockchain.save_to_file()
     except Exception as e:
         print(f"Transaction error: {e}")
         raise
@@ -201,7 +187,6 @@ def login():
         timestamp = request.form['timestamp'] 
         signature = request.form['signature']
 
-        auth_system = AuthSystem()
         user = auth_system.verify_user(username, timestamp, signature)
 
         if user:
@@ -293,16 +278,15 @@ def add_employee():
     if request.method == 'POST':
         name = request.form['name']
         agreed_salary = float(request.form['salary'])
-        conn = sqlite3.connect('payroll.db')
-        c = conn.cursor()
-        from backend.crypto_utils import CryptoUtils
-        crypto = CryptoUtils()
-        public_key = crypto.get_public_key()
-        c.execute("INSERT INTO employees (name, agreed_salary, public_key) VALUES (?, ?, ?)",
-                  (name, agreed_salary, public_key))
-        conn.commit()
-        employee_id = c.lastrowid
-        conn.close()
+        with get_connection() as conn:
+            c = conn.cursor()
+            from backend.crypto_utils import CryptoUtils
+            crypto = CryptoUtils()
+            public_key = crypto.get_public_key()
+            c.execute("INSERT INTO employees (name, agreed_salary, public_key) VALUES (?, ?, ?)",
+                      (name, agreed_salary, public_key))
+            conn.commit()
+            employee_id = c.lastrowid
         return jsonify({'status': 'success', 'employee_id': employee_id})
     return render_template('add_employee.html')
 
@@ -315,21 +299,19 @@ def add_data():
         hours_worked = float(request.form['hours_worked'])
         overtime_hours = float(request.form['overtime_hours'])
         kpi_score = float(request.form['kpi_score'])
-        conn = sqlite3.connect('payroll.db')
-        c = conn.cursor()
-        c.execute("INSERT INTO attendance (employee_id, date, hours_worked, overtime_hours) VALUES (?, ?, ?, ?)",
-                  (employee_id, date, hours_worked, overtime_hours))
-        c.execute("INSERT INTO kpi (employee_id, date, kpi_score) VALUES (?, ?, ?)",
-                  (employee_id, date, kpi_score))
-        conn.commit()
-        conn.close()
+        with get_connection() as conn:
+            c = conn.cursor()
+            c.execute("INSERT INTO attendance (employee_id, date, hours_worked, overtime_hours) VALUES (?, ?, ?, ?)",
+                      (employee_id, date, hours_worked, overtime_hours))
+            c.execute("INSERT INTO kpi (employee_id, date, kpi_score) VALUES (?, ?, ?)",
+                      (employee_id, date, kpi_score))
+            conn.commit()
         return jsonify({'status': 'success'})
     
-    conn = sqlite3.connect('payroll.db')
-    c = conn.cursor()
-    c.execute("SELECT id, name FROM employees")
-    employees = c.fetchall()
-    conn.close()
+    with get_connection() as conn:
+        c = conn.cursor()
+        c.execute("SELECT id, name FROM employees")
+        employees = c.fetchall()
     return render_template('add_data.html', employees=employees)
 
 # Route cải thiện cho process_payroll
@@ -341,24 +323,21 @@ def process_payroll():
             employee_id = int(request.form['employee_id'])
             month = request.form['month']
 
-            with payroll_transaction() as payroll:
-                transaction = payroll.process_payroll(employee_id, month)
-
-                # Lưu blockchain ra file (block đã được tạo bên trong process_payroll)
-                payroll.blockchain.save_to_file()
-
-                return app.response_class(
-                    response=json.dumps({
-                        'status': 'success', 
-                        'transaction': transaction,
-                        'blockchain_info': {
-                            'total_blocks': len(payroll.blockchain.chain),
-                            'last_block_hash': payroll.blockchain.get_latest_block().hash
-                        }
-                    }),
-                    status=200,
-                    mimetype='application/json'
-                )
+            # Chỉ tính lương + mã hóa + đưa vào hàng đợi, block được đào ở thread nền (BlockSealer)
+            payroll = get_payroll_system()
+            transaction, ticket = payroll.submit_payroll(employee_id, month, submitted_by=session.get('user_id'))
+
+            return app.response_class(
+                response=json.dumps({
+                    'status': 'success', 
+                    'transaction': transaction,
+                    'ticket_id': ticket['ticket_id'],
+                    'ticket_status': ticket['status'],
+                    'status_url': url_for('payroll_status', ticket_id=ticket['ticket_id'])
+                }),
+                status=202,
+                mimetype='application/json'
+            )
 
         except Exception as e:
             print("Error in process_payroll:", e)
@@ -371,26 +350,78 @@ def process_payroll():
             }), 500
 
     # GET method: hiển thị form
-    conn = sqlite3.connect('payroll.db')
-    c = conn.cursor()   
-    c.execute("SELECT id, name FROM employees")
-    employees = c.fetchall()
-    conn.close()
+    with get_connection() as conn:
+        c = conn.cursor()   
+        c.execute("SELECT id, name FROM employees")
+        employees = c.fetchall()
     return render_template('process_payroll.html', employees=employees)
 
 
 
+@app.route('/payroll_status/<ticket_id>')
+@login_required
+def payroll_status(ticket_id):
+    """Trạng thái ticket bảng lương: pending -> committed (kèm block_hash) hoặc failed"""
+    ticket = get_payroll_system().get_payroll_ticket(ticket_id)
+    if ticket is None:
+        return jsonify({'status': 'error', 'message': 'Không tìm thấy ticket'}), 404
+    if session.get('role') != 'admin' and ticket['submitted_by'] != session.get('user_id'):
+        return jsonify({'status': 'error', 'message': 'Không có quyền xem ticket này'}), 403
+    return jsonify({'status': 'success', 'ticket': ticket})
+
+
+@app.route('/process_payroll_batch', methods=['POST'])
+@admin_required
+def process_payroll_batch():
+    """Chạy bảng lương cả tháng cho tất cả (hoặc danh sách) nhân viên, gom vào ít block"""
+    try:
+        data = request.get_json(silent=True) or request.form
+        month = data['month']
+        employee_ids = data.get('employee_ids')
+        if isinstance(employee_ids, str):
+            employee_ids = [int(x) for x in employee_ids.split(',') if x.strip()]
+        elif employee_ids:
+            employee_ids = [int(x) for x in employee_ids]
+        else:
+            employee_ids = None
+
+        with payroll_transaction() as payroll:
+            result = payroll.process_payroll_batch(month, employee_ids)
+
+        return jsonify({
+            'status': 'success',
+            'month': result['month'],
+            'processed_count': len(result['processed']),
+            'failed_count': len(result['failures']),
+            'total_salary': result['total_salary'],
+            'blocks': result['blocks'],
+            'failures': result['failures'],
+            'blockchain_info': {
+                'total_blocks': len(payroll.blockchain.chain),
+                'last_block_hash': payroll.blockchain.get_latest_block().hash
+            }
+        })
+
+    except Exception as e:
+        traceback.print_exc()
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 500
+
+
+
 # Route cải thiện cho view_transactions
 @app.route('/view_transactions')
 @login_required
 def view_transactions():
     try:
         payroll = get_payroll_system()
-        transactions, errors = payroll.get_all_transactions()
 
         # Lấy thông tin từ session
         role = session.get('role')
         employee_id = session.get('employee_id')
+        errors = []
 
         if role != 'admin':
             if 'employee_id' not in session:
@@ -403,7 +434,11 @@ def view_transactions():
                     'error': f'Tài khoản nhân viên {session.get("username", "Không rõ")} không có employee_id hợp lệ.',
                     'raw_data': str(session)
                 }])
-            transactions = [tx for tx in transactions if str(tx.get('employee_id')) == str(employee_id)]
+            # Tra index employee -> block thay vì giải mã toàn bộ chain
+            transactions = payroll.get_employee_salary_history(employee_id)
+            transactions.sort(key=lambda tx: tx.get('block_index', 0))
+        else:
+            transactions, errors = payroll.get_all_transactions()
 
         # Format các transaction
         formatted_transactions = []
@@ -421,6 +456,7 @@ def view_transactions():
                     'processed_date': tx.get('processed_date', 'N/A'),
                     'signature': tx.get('signature', '')[:50] + '...' if tx.get('signature') else 'N/A',
                     'block_index': tx.get('block_index', 'N/A'),
+                    'tx_index': tx.get('tx_index', 'N/A'),
                     'block_hash': tx.get('block_hash', '')[:20] + '...' if tx.get('block_hash') else 'N/A'
                 }
                 formatted_transactions.append(formatted_tx)
@@ -448,6 +484,41 @@ def view_transactions():
         ])
 
 
+@app.route('/transaction_proof')
+@login_required
+def transaction_proof():
+    """Merkle inclusion proof cho (block_index, tx_index), kiểm tra bằng backend.merkle.verify_inclusion_proof"""
+    try:
+        block_index = int(request.args.get('block_index', ''))
+        tx_index = int(request.args.get('tx_index', ''))
+    except ValueError:
+        return jsonify({'status': 'error', 'message': 'Thiếu hoặc sai block_index/tx_index'}), 400
+
+    try:
+        payroll = get_payroll_system()
+        blockchain = payroll.blockchain
+
+        # Nhân viên chỉ lấy được proof cho transaction của chính mình
+        if session.get('role') != 'admin':
+            if block_index < 0 or block_index >= len(blockchain.chain):
+                return jsonify({'status': 'error', 'message': f'Block {block_index} không tồn tại'}), 404
+            tx_dict = None
+            block = blockchain.chain[block_index]
+            if 0 <= tx_index < len(block.transactions):
+                tx_dict = blockchain.get_decoded_transaction(block, tx_index)
+            if not isinstance(tx_dict, dict) or str(tx_dict.get('employee_id')) != str(session.get('employee_id')):
+                return jsonify({'status': 'error', 'message': 'Không có quyền xem transaction này'}), 403
+
+        proof = blockchain.get_inclusion_proof(block_index, tx_index)
+        return jsonify({'status': 'success', 'inclusion_proof': proof})
+
+    except Exception as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 400
+
+
 # Tỉ giá đơn giản (bạn có thể lấy từ API sau nếu muốn)
 currency_rates = {
     'USD': 1.0,
@@ -496,13 +567,13 @@ def chitietblockchain():
         # có thể xử lý và format dữ liệu ở đây
         block_data = {
             "index": block.index,
-            "transaction_count": len(block.transactions),
+            "transaction_count": block.tx_count,
             "transactions": [],
             "hash": block.hash,
             "previous_hash": block.previous_hash,
             "is_valid": block.is_valid,
             "chain_valid": True,
-            "size_bytes": len(json.dumps(block.to_dict()).encode("utf-8"))
+            "size_bytes": block.get_size_bytes()
         }
 
         if block.index > 0:
@@ -510,9 +581,9 @@ def chitietblockchain():
             if block.previous_hash != prev_block.hash:
                 block_data["chain_valid"] = False
 
-        for tx in block.transactions:
+        for tx_index, tx in enumerate(block.transactions):
             try:
-                tx_dict = blockchain._decode_transaction(tx)
+                tx_dict = blockchain.get_decoded_transaction(block, tx_index)
                 block_data["transactions"].append(tx_dict)
 
                 # cộng lương để thống kê
@@ -598,6 +669,27 @@ def restore_blockchain():
     return redirect(url_for('chitietblockchain'))
 
 
+@app.route('/verify_blockchain', methods=['POST'])
+@admin_required
+def verify_blockchain():
+    """Verify lại toàn bộ blockchain theo yêu cầu (bỏ qua checkpoint)"""
+    try:
+        payroll = get_payroll_system()
+        chain_valid = payroll.blockchain.validate_chain(full=True)
+
+        return jsonify({
+            'status': 'success',
+            'chain_valid': chain_valid,
+            'verified_index': payroll.blockchain.verified_index,
+            'blocks': len(payroll.blockchain.chain)
+        })
+
+    except Exception as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 500
+
 # Force save blockchain (cho admin)
 @app.route('/force_save_blockchain', methods=['POST'])
 @admin_required
@@ -623,14 +715,13 @@ def force_save_blockchain():
 @app.route('/user_management')
 @admin_required
 def user_manager():
-    conn = sqlite3.connect('payroll.db')
-    c = conn.cursor()
-    c.execute("SELECT id, name FROM employees")
-    employees = c.fetchall()
+    with get_connection() as conn:
+        c = conn.cursor()
+        c.execute("SELECT id, name FROM employees")
+        employees = c.fetchall()
 
-    c.execute("SELECT * FROM users")
-    users = c.fetchall()
-    conn.close()
+        c.execute("SELECT * FROM users")
+        users = c.fetchall()
 
     return render_template('user_management.html', users=users, employees=employees)
 
@@ -643,14 +734,14 @@ def create_user():
         employee_id = request.form.get('employee_id') or None
         role = request.form.get('role', 'user')
 
-        conn = sqlite3.connect('payroll.db')
-        c = conn.cursor()
-        c.execute(
-            "INSERT INTO users (username, public_key, role, is_active, employee_id) VALUES (?, ?, ?, ?, ?)",
-            (username, public_key, role, 1, employee_id)
-        )
-        conn.commit()
-        conn.close()
+        with get_connection() as conn:
+            c = conn.cursor()
+            c.execute(
+                "INSERT INTO users (username, public_key, role, is_active, employee_id) VALUES (?, ?, ?, ?, ?)",
+                (username, public_key, role, 1, employee_id)
+            )
+            conn.commit()
+            public_key_cache.invalidate(c.lastrowid)
 
         return jsonify({'success': True})
     except Exception as e:
@@ -661,11 +752,11 @@ def create_user():
 def deactivate_user():
     try:
         user_id = request.json['user_id']
-        conn = sqlite3.connect('payroll.db')
-        c = conn.cursor()
-        c.execute("UPDATE users SET is_active = 0 WHERE id = ?", (user_id,))
-        conn.commit()
-        conn.close()
+        with get_connection() as conn:
+            c = conn.cursor()
+            c.execute("UPDATE users SET is_active = 0 WHERE id = ?", (user_id,))
+            conn.commit()
+        public_key_cache.invalidate(user_id)
         return jsonify({'success': True})
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)})
@@ -700,23 +791,19 @@ def reports():
     currency = request.args.get('currency', 'USD')
 
     try:
-        # Sử dụng ReportGenerator để lấy thống kê
-        report_gen = ReportGenerator()
+        # Sử dụng ReportGenerator (dùng chung PayrollSystem) để lấy thống kê
+        report_gen = ReportGenerator(get_payroll_system())
         stats = report_gen.get_salary_statistics()
         
-        # Lấy thống kê từ blockchain
-        blockchain_stats = payroll_system.blockchain.get_blockchain_stats()
-        monthly_stats = payroll_system.blockchain.get_transaction_volume_by_month()
+        # Thống kê blockchain đã có sẵn trong stats, không tính lại
+        monthly_stats = stats.get('monthly_blockchain_stats', {})
         
         # Cập nhật stats với thông tin blockchain
         stats.update({
-            'blockchain_blocks': blockchain_stats.get('total_blocks', 0),
-            'blockchain_valid': blockchain_stats.get('chain_valid', False)
+            'blockchain_blocks': stats.get('total_blocks', 0),
+            'blockchain_valid': stats.get('chain_valid', False)
         })
         
-        print(f"[DEBUG] Stats: {stats}")
-        print(f"[DEBUG] Monthly stats: {monthly_stats}")
-        
     except Exception as e:
         print(f"[ERROR] Lỗi khi tạo báo cáo: {e}")
         import traceback
@@ -746,8 +833,7 @@ def reports():
 @login_required
 def export_pdf():
     try:
-        from backend.report_generator import ReportGenerator
-        report_gen = ReportGenerator()
+        report_gen = ReportGenerator(get_payroll_system())
         pdf_buffer = report_gen.generate_salary_report_pdf()
         
         return send_file(
@@ -765,8 +851,7 @@ def export_pdf():
 @login_required
 def export_excel():
     try:
-        from backend.report_generator import ReportGenerator
-        report_gen = ReportGenerator()
+        report_gen = ReportGenerator(get_payroll_system())
         excel_buffer = report_gen.generate_salary_report_excel()
         
         return send_file(
@@ -792,6 +877,7 @@ def to_json_filter(obj):
 def debug_blockchain():
     """Route debug để kiểm tra dữ liệu blockchain"""
     try:
+        payroll_system = get_payroll_system()
         debug_info = {
             'blockchain_blocks': len(payroll_system.blockchain.chain),
             'transactions_raw': [],
@@ -809,10 +895,10 @@ def debug_blockchain():
             for j, tx_b64 in enumerate(block.transactions):
                 try:
                     if isinstance(tx_b64, str):
-                        # Thử giải mã
-                        encrypted_bytes = base64.b64decode(tx_b64)
-                        decrypted_json = payroll_system.crypto.aes_decrypt(encrypted_bytes)
-                        tx_dict = json.loads(decrypted_json)
+                        # Lấy bản đã giải mã từ cache dùng chung
+                        tx_dict = payroll_system.blockchain.get_decoded_transaction(block, j)
+                        if tx_dict is None:
+                            raise Exception("Không giải mã được transaction")
                         
                         debug_info['transactions_decoded'].append({
                             'block_index': i,
@@ -846,40 +932,38 @@ def debug_blockchain():
 def debug_database():
     """Debug route để kiểm tra dữ liệu database"""
     try:
-        conn = sqlite3.connect('payroll.db')
-        c = conn.cursor()
-        
-        debug_info = {}
+        with get_connection() as conn:
+            c = conn.cursor()
         
-        # Kiểm tra bảng employees
-        c.execute("SELECT COUNT(*) FROM employees")
-        debug_info['employees_count'] = c.fetchone()[0]
+            debug_info = {}
         
-        c.execute("SELECT * FROM employees LIMIT 5")
-        debug_info['employees_sample'] = c.fetchall()
+            # Kiểm tra bảng employees
+            c.execute("SELECT COUNT(*) FROM employees")
+            debug_info['employees_count'] = c.fetchone()[0]
         
-        # Kiểm tra bảng attendance
-        c.execute("SELECT COUNT(*) FROM attendance")
-        debug_info['attendance_count'] = c.fetchone()[0]
+            c.execute("SELECT * FROM employees LIMIT 5")
+            debug_info['employees_sample'] = c.fetchall()
         
-        c.execute("SELECT * FROM attendance LIMIT 5")
-        debug_info['attendance_sample'] = c.fetchall()
+            # Kiểm tra bảng attendance
+            c.execute("SELECT COUNT(*) FROM attendance")
+            debug_info['attendance_count'] = c.fetchone()[0]
         
-        # Kiểm tra bảng kpi
-        c.execute("SELECT COUNT(*) FROM kpi")
-        debug_info['kpi_count'] = c.fetchone()[0]
+            c.execute("SELECT * FROM attendance LIMIT 5")
+            debug_info['attendance_sample'] = c.fetchall()
         
-        c.execute("SELECT * FROM kpi LIMIT 5")
-        debug_info['kpi_sample'] = c.fetchall()
+            # Kiểm tra bảng kpi
+            c.execute("SELECT COUNT(*) FROM kpi")
+            debug_info['kpi_count'] = c.fetchone()[0]
         
-        # Kiểm tra tháng có dữ liệu
-        c.execute("""SELECT strftime('%Y-%m', date) as month, COUNT(*) as count 
-                     FROM kpi 
-                     GROUP BY strftime('%Y-%m', date) 
-                     ORDER BY month""")
-        debug_info['months_with_data'] = c.fetchall()
+            c.execute("SELECT * FROM kpi LIMIT 5")
+            debug_info['kpi_sample'] = c.fetchall()
         
-        conn.close()
+            # Kiểm tra tháng có dữ liệu
+            c.execute("""SELECT strftime('%Y-%m', date) as month, COUNT(*) as count 
+                         FROM kpi 
+                         GROUP BY strftime('%Y-%m', date) 
+                         ORDER BY month""")
+            debug_info['months_with_data'] = c.fetchall()
         
         return jsonify(debug_info)
         
@@ -892,32 +976,30 @@ def test_transaction():
     """Tạo một giao dịch test để kiểm tra"""
     try:
         # Kiểm tra xem có nhân viên nào không
-        conn = sqlite3.connect('payroll.db')
-        c = conn.cursor()
-        c.execute("SELECT id FROM employees LIMIT 1")
-        employee = c.fetchone()
+        with get_connection() as conn:
+            c = conn.cursor()
+            c.execute("SELECT id FROM employees LIMIT 1")
+            employee = c.fetchone()
         
-        if not employee:
-            # Tạo nhân viên test
-            from backend.crypto_utils import CryptoUtils
-            crypto = CryptoUtils()
-            c.execute("INSERT INTO employees (name, agreed_salary, public_key) VALUES (?, ?, ?)",
-                      ("Test Employee", 1000, crypto.get_public_key()))
-            employee_id = c.lastrowid
-            
-            # Thêm dữ liệu attendance và kpi test
-            c.execute("INSERT INTO attendance (employee_id, date, hours_worked, overtime_hours) VALUES (?, ?, ?, ?)",
-                      (employee_id, '2025-07-01', 160, 10))
-            c.execute("INSERT INTO kpi (employee_id, date, kpi_score) VALUES (?, ?, ?)",
-                      (employee_id, '2025-07-01', 85))
-            conn.commit()
-        else:
-            employee_id = employee[0]
+            if not employee:
+                # Tạo nhân viên test
+                from backend.crypto_utils import CryptoUtils
+                crypto = CryptoUtils()
+                c.execute("INSERT INTO employees (name, agreed_salary, public_key) VALUES (?, ?, ?)",
+                          ("Test Employee", 1000, crypto.get_public_key()))
+                employee_id = c.lastrowid
             
-        conn.close()
+                # Thêm dữ liệu attendance và kpi test
+                c.execute("INSERT INTO attendance (employee_id, date, hours_worked, overtime_hours) VALUES (?, ?, ?, ?)",
+                          (employee_id, '2025-07-01', 160, 10))
+                c.execute("INSERT INTO kpi (employee_id, date, kpi_score) VALUES (?, ?, ?)",
+                          (employee_id, '2025-07-01', 85))
+                conn.commit()
+            else:
+                employee_id = employee[0]
         
         # Tạo giao dịch test
-        result = payroll_system.process_payroll(employee_id, '2025-07')
+        result = get_payroll_system().process_payroll(employee_id, '2025-07')
         
         return jsonify({
             'status': 'success',
@@ -939,13 +1021,15 @@ def test_transaction():
 def reset_blockchain():
     """Reset blockchain để test (chỉ admin)"""
     try:
-        global payroll_system
-        payroll_system = PayrollSystem()
+        # Load lại chain trong PayrollSystem dùng chung thay vì tạo instance mới
+        # (ticket đang chờ được đóng block vào chain cũ trước, quá hạn thì chuyển failed)
+        payroll = get_payroll_system()
+        payroll.load_blockchain()
         
         return jsonify({
             'status': 'success',
             'message': 'Đã reset blockchain thành công',
-            'blocks': len(payroll_system.blockchain.chain)
+            'blocks': len(payroll.blockchain.chain)
         })
         
     except Exception as e:
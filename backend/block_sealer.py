@@ -0,0 +1,181 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+# Đóng block khi đủ số transaction hoặc transaction cũ nhất đã chờ quá thời gian này (giây)
+SEAL_MAX_TRANSACTIONS = 100
+SEAL_MAX_WAIT = 2.0
+# Số ticket đã xong (committed/failed) giữ lại để tra trạng thái
+TICKET_HISTORY = 10000
+
+
+class BlockSealer:
+    """Hàng đợi bảng lương: route chỉ kiểm tra, mã hóa và đưa transaction vào pending_transactions rồi trả ticket.
+    Thread nền gom pending thành block (đào + lưu) khi đủ SEAL_MAX_TRANSACTIONS hoặc chờ quá SEAL_MAX_WAIT giây."""
+
+    def __init__(self, payroll_system, max_block_transactions=SEAL_MAX_TRANSACTIONS, max_wait=SEAL_MAX_WAIT):
+        self.payroll_system = payroll_system
+        self.max_block_transactions = max_block_transactions
+        self.max_wait = max_wait
+        self._condition = threading.Condition()
+        self._tickets = OrderedDict()   # ticket_id -> trạng thái
+        self._ticket_by_tx = {}         # ciphertext -> ticket_id (envelope v2 có nonce riêng nên không trùng)
+        self._sealing = False
+        self._flush_requested = False
+        self._thread = None
+
+    @property
+    def blockchain(self):
+        # Luôn lấy chain hiện tại của PayrollSystem (có thể đã load lại sau restore)
+        return self.payroll_system.blockchain
+
+    def start(self):
+        with self._condition:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="block-sealer", daemon=True)
+                self._thread.start()
+
+    def submit(self, transaction, ciphertext, submitted_by=None):
+        """Đưa transaction đã mã hóa vào pending, trả về ticket (chưa có block)"""
+        ticket_id = uuid.uuid4().hex
+        ticket = {
+            'ticket_id': ticket_id,
+            'status': 'pending',
+            'employee_id': transaction.get('employee_id'),
+            'month': transaction.get('month'),
+            'total_salary': transaction.get('total_salary'),
+            'submitted_by': submitted_by,
+            'submitted_at': time.time(),
+            'committed_at': None,
+            'block_index': None,
+            'block_hash': None,
+            'tx_index': None,
+            'error': None
+        }
+        with self._condition:
+            self._tickets[ticket_id] = ticket
+            self._ticket_by_tx[ciphertext] = ticket_id
+            self.blockchain.add_transaction(ciphertext)
+            self._condition.notify()
+        self.start()
+        return dict(ticket)
+
+    def status(self, ticket_id):
+        """Trạng thái ticket (pending/committed/failed), None nếu không có"""
+        with self._condition:
+            ticket = self._tickets.get(ticket_id)
+            return dict(ticket) if ticket is not None else None
+
+    def pending_count(self):
+        return len(self.blockchain.pending_transactions)
+
+    def _oldest_wait(self, pending):
+        ticket_id = self._ticket_by_tx.get(pending[0]) if isinstance(pending[0], str) else None
+        if ticket_id is None:
+            return self.max_wait
+        return time.time() - self._tickets[ticket_id]['submitted_at']
+
+    def _next_batch(self):
+        """Chờ tới khi cần đóng block, trả về list transaction sẽ vào block (gọi khi đang giữ _condition)"""
+        while True:
+            pending = self.blockchain.pending_transactions
+            if pending:
+                wait = self.max_wait - self._oldest_wait(pending)
+                if self._flush_requested or len(pending) >= self.max_block_transactions or wait <= 0:
+                    return list(pending[:self.max_block_transactions])
+                self._condition.wait(wait)
+            else:
+                self._flush_requested = False
+                self._condition.notify_all()
+                self._condition.wait()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                batch = self._next_batch()
+                self._sealing = True
+            try:
+                self._seal(batch)
+            finally:
+                with self._condition:
+                    self._sealing = False
+                    self._condition.notify_all()
+
+    def _seal(self, batch):
+        try:
+            new_block = self.blockchain.add_block(batch)
+        except Exception as e:
+            print(f"Error sealing block: {e}")
+            # Bỏ lô lỗi khỏi pending để không thử lại mãi, ticket chuyển sang failed
+            self.blockchain.remove_pending(batch)
+            self._finish(batch, status='failed', error=str(e))
+            return
+        self._finish(batch, status='committed', block=new_block)
+
+    def _finish(self, batch, status, block=None, error=None):
+        with self._condition:
+            now = time.time()
+            for tx_index, ciphertext in enumerate(batch):
+                ticket_id = self._ticket_by_tx.pop(ciphertext, None) if isinstance(ciphertext, str) else None
+                ticket = self._tickets.get(ticket_id)
+                if ticket is None:
+                    continue
+                ticket['status'] = status
+                ticket['committed_at'] = now if block is not None else None
+                ticket['error'] = error
+                if block is not None:
+                    ticket['block_index'] = block.index
+                    ticket['block_hash'] = block.hash
+                    ticket['tx_index'] = tx_index
+                # Đưa ticket vừa xong về cuối để phần dọn dẹp bỏ ticket cũ nhất trước
+                self._tickets.move_to_end(ticket_id)
+            self._prune()
+
+    def _prune(self):
+        # Ticket pending nằm đầu OrderedDict (ticket xong được dời về cuối) -> bỏ qua, xóa ticket xong cũ nhất
+        excess = len(self._tickets) - len(self._ticket_by_tx) - TICKET_HISTORY
+        if excess <= 0:
+            return
+        stale = []
+        for ticket_id, ticket in self._tickets.items():
+            if len(stale) >= excess:
+                break
+            if ticket['status'] != 'pending':
+                stale.append(ticket_id)
+        for ticket_id in stale:
+            del self._tickets[ticket_id]
+
+    def _fail_pending(self, error):
+        """Chuyển mọi ticket còn pending sang failed và bỏ transaction của chúng khỏi pending (gọi khi giữ _condition)"""
+        orphaned = list(self._ticket_by_tx)
+        if orphaned:
+            self.blockchain.remove_pending(orphaned)
+            self._finish(orphaned, status='failed', error=error)
+        self._flush_requested = False
+
+    def flush(self, timeout=None):
+        """Đóng block ngay cho mọi transaction đang chờ (vd khi tắt ứng dụng). Trả về True nếu pending đã hết."""
+        with self._condition:
+            if not self.blockchain.pending_transactions and not self._sealing:
+                return True
+            self._flush_requested = True
+            self._condition.notify_all()
+        self.start()
+        with self._condition:
+            return self._condition.wait_for(
+                lambda: not self.blockchain.pending_transactions and not self._sealing, timeout)
+
+    def replace_blockchain(self, load, timeout=None):
+        """Thay chain (vd reset/load lại) mà không bỏ rơi ticket: đóng block cho pending trên chain cũ trước,
+        rồi gọi load() trong _condition để không submit nào chen vào giữa. Quá timeout mà chưa đóng hết
+        thì ticket còn lại chuyển sang failed thay vì pending mãi. Trả về kết quả của load()."""
+        while True:
+            flushed = self.flush(timeout)
+            with self._condition:
+                # Lô đang đào thuộc chain cũ: chờ nó xong (ticket committed) rồi mới thay chain
+                self._condition.wait_for(lambda: not self._sealing)
+                if flushed and self.blockchain.pending_transactions:
+                    continue  # Có submit mới sau flush, đóng block tiếp
+                self._fail_pending("Blockchain đã được load lại trước khi transaction vào block")
+                return load()
@@ -2,10 +2,17 @@ import hashlib
 import json
 import time
 from datetime import datetime
-import base64
 import threading
 import os
 from ecdsa import SigningKey, VerifyingKey, SECP256k1
+from backend.chain_storage import create_storage, detect_storage_mode, STORAGE_FILES, BinaryChainStorage
+from backend.tx_cache import TransactionCache, TransactionFormatIndex
+from backend.chain_writer import ChainWriter
+from backend.tx_index import EmployeeTxIndex
+from backend.miner import mine_parallel, search_nonce
+from backend.merkle import merkle_root, merkle_proof, block_header
+from backend.tx_decoder import decode_transaction, try_decode, FORMAT_NAMES
+from backend.chain_scan import scan_parallel, default_workers as default_scan_workers
 
 class SalaryData:
     def __init__(self, name, amount, discount, bonus):
@@ -31,76 +38,262 @@ class SalaryData:
             bonus=data['bonus']
         )
     
+# Version 1: hash trên JSON của cả block (định dạng cũ)
+# Version 2: hash trên header cố định + digest của transactions, chỉ nonce thay đổi khi đào
+# Version 3: như version 2 nhưng digest là Merkle root (chứng minh từng transaction bằng proof O(log n))
+BLOCK_VERSION = 3
+
+# Số transaction tối thiểu để parallel_scan dùng process pool (chain nhỏ giải mã tuần tự nhanh hơn)
+PARALLEL_SCAN_MIN_TRANSACTIONS = 20000
+
+# Số lần add_block đào lại khi tip đã đổi (thread khác commit block trước) trong lúc đào
+ADD_BLOCK_MAX_RETRIES = 20
+
+class BlockTransactions:
+    """Danh sách transaction chỉ đọc của Block: dữ liệu giữ dạng bytes, chỉ chuyển về giá trị gốc
+    (chuỗi base64/str/dict) khi truy cập từng phần tử. Hỗ trợ len(), index, slice, duyệt và so sánh với list."""
+
+    __slots__ = ('_kinds', '_data')
+
+    def __init__(self, kinds, data):
+        self._kinds = kinds
+        self._data = data
+
+    def __len__(self):
+        return len(self._data)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [BinaryChainStorage.decode_transaction(self._kinds[i], self._data[i])
+                    for i in range(*index.indices(len(self._data)))]
+        return BinaryChainStorage.decode_transaction(self._kinds[index], self._data[index])
+
+    def __iter__(self):
+        for kind, data in zip(self._kinds, self._data):
+            yield BinaryChainStorage.decode_transaction(kind, data)
+
+    def __eq__(self, other):
+        if isinstance(other, (BlockTransactions, list, tuple)):
+            return list(self) == list(other)
+        return NotImplemented
+
+    def __repr__(self):
+        return repr(list(self))
+
+
+# Các trường ảnh hưởng tới hash/encoding: gán lại thì bỏ cache encoding, kích thước và kết quả validate
+HASHED_FIELDS = frozenset(('index', 'timestamp', 'previous_hash', 'version', 'nonce', 'hash', 'transactions'))
+
 class Block:
-    def __init__(self, index, transactions, timestamp, previous_hash, nonce=0):
-        self.index = index
+    # __slots__: không có __dict__ cho mỗi block; transactions lưu dạng bytes (ciphertext thô, không base64)
+    __slots__ = ('index', 'timestamp', 'previous_hash', 'version', 'nonce', 'hash',
+                 '_tx_kinds', '_tx_data', '_merkle_root', '_size', '_valid')
+
+    def __init__(self, index, transactions, timestamp, previous_hash, nonce=0, version=BLOCK_VERSION):
+        self._init_fields(index, timestamp, previous_hash, nonce, version)
         self.transactions = transactions
+        self.hash = self.calculate_hash()
+
+    def __setattr__(self, name, value):
+        object.__setattr__(self, name, value)
+        if name in HASHED_FIELDS:
+            self._reset_cache()
+
+    def _init_fields(self, index, timestamp, previous_hash, nonce, version):
+        self.index = index
         self.timestamp = timestamp
         self.previous_hash = previous_hash
+        self.version = version
         self.nonce = nonce
-        self.hash = self.calculate_hash()
-        self.is_valid = True
+        self.hash = None
+        self._tx_kinds = b""
+        self._tx_data = ()
+        self._merkle_root = None
+
+    def _reset_cache(self):
+        self._size = None
+        self._valid = None
+
+    @property
+    def transactions(self):
+        return BlockTransactions(self._tx_kinds, self._tx_data)
+
+    @transactions.setter
+    def transactions(self, transactions):
+        encoded = [BinaryChainStorage.encode_transaction(tx) for tx in transactions]
+        self._set_raw_transactions(encoded)
+
+    def _set_raw_transactions(self, raw_transactions):
+        """raw_transactions: list (kind, bytes) theo định dạng BinaryChainStorage"""
+        self._tx_kinds = bytes(kind for kind, _ in raw_transactions)
+        self._tx_data = tuple(bytes(data) for _, data in raw_transactions)
+        self._merkle_root = None
+        self._reset_cache()
+
+    def raw_transactions(self):
+        return zip(self._tx_kinds, self._tx_data)
+
+    @property
+    def tx_count(self):
+        return len(self._tx_data)
+
+    def get_transaction(self, tx_index):
+        return BinaryChainStorage.decode_transaction(self._tx_kinds[tx_index], self._tx_data[tx_index])
+
+    def _transaction_list(self):
+        return list(self.transactions)
+
+    @property
+    def merkle_root(self):
+        if self.version < 3:
+            return None
+        if self._merkle_root is None:
+            self._merkle_root = merkle_root(self._transaction_list())
+        return self._merkle_root
 
     def calculate_hash(self):
-        block_string = json.dumps({
-            'index': self.index,
-            'transactions': self.transactions,
-            'timestamp': self.timestamp,
-            'previous_hash': self.previous_hash,
-            'nonce': self.nonce
-        }, sort_keys=True)
-        return hashlib.sha256(block_string.encode()).hexdigest()
-
-    def mine_block(self, difficulty=1):
+        if self.version == 1:
+            block_string = json.dumps({
+                'index': self.index,
+                'transactions': self._transaction_list(),
+                'timestamp': self.timestamp,
+                'previous_hash': self.previous_hash,
+                'nonce': self.nonce
+            }, sort_keys=True)
+            return hashlib.sha256(block_string.encode()).hexdigest()
+
+        prefix, suffix = self.hash_parts()
+        return hashlib.sha256(prefix + str(self.nonce).encode() + suffix).hexdigest()
+
+    def transactions_digest(self):
+        """Hash một lần toàn bộ transactions, header chỉ chứa digest này"""
+        return hashlib.sha256(json.dumps(self._transaction_list(), sort_keys=True).encode()).hexdigest()
+
+    def hash_parts(self):
+        """Tách dữ liệu được hash thành (prefix, suffix) quanh nonce: hash = sha256(prefix + nonce + suffix)"""
+        if self.version == 1:
+            prefix = '{"index": ' + json.dumps(self.index) + ', "nonce": '
+            suffix = (', "previous_hash": ' + json.dumps(self.previous_hash) +
+                      ', "timestamp": ' + json.dumps(self.timestamp) +
+                      ', "transactions": ' + json.dumps(self._transaction_list(), sort_keys=True) + '}')
+            return prefix.encode(), suffix.encode()
+
+        # Tính lại từ transactions (không dùng merkle_root đã cache) để validate phát hiện transaction bị sửa
+        tx_root = merkle_root(self._transaction_list()) if self.version >= 3 else self.transactions_digest()
+        return block_header(self.version, self.index, self.timestamp, self.previous_hash, tx_root), b""
+
+    def mine_block(self, difficulty=1, workers=1):
+        """Tìm nonce sao cho hash bắt đầu bằng difficulty số 0. workers > 1: chia nonce cho nhiều process"""
         target = "0" * difficulty
         start_time = time.time()
-        
-        while self.hash[:difficulty] != target:
-            self.nonce += 1
-            self.hash = self.calculate_hash()
-            
+
+        if self.hash[:difficulty] != target:
+            prefix, suffix = self.hash_parts()
+            if workers > 1:
+                self.nonce, self.hash = mine_parallel(prefix, suffix, difficulty, workers,
+                                                      start_nonce=self.nonce + 1)
+            else:
+                self.nonce, self.hash = search_nonce(prefix, suffix, difficulty, self.nonce + 1)
+
         mining_time = time.time() - start_time
         print(f"Block mined: {self.hash} (Nonce: {self.nonce}, Time: {mining_time:.2f}s)")
 
+    def _build_encoding(self):
+        return json.dumps(self.to_dict(), sort_keys=True, separators=(',', ':')).encode('utf-8')
+
+    def encode(self):
+        """Encoding chuẩn của block (JSON gọn, sort key) để ghi file.
+        Không giữ lại bytes trên block (mỗi block đã ghi sẽ giữ thêm một bản), chỉ cache kích thước."""
+        encoded = self._build_encoding()
+        self._size = len(encoded)
+        return encoded
+
     def get_size_bytes(self):
-        return len(json.dumps(self.__dict__).encode())
+        # Chỉ cache kích thước, không giữ lại bytes encoding của mọi block trong bộ nhớ
+        if self._size is None:
+            self._size = len(self._build_encoding())
+        return self._size
 
-    def validate_block(self):
-        calculated_hash = self.calculate_hash()
-        return calculated_hash == self.hash
+    def validate_block(self, use_cache=True):
+        # Block không đổi sau khi append nên chỉ rehash một lần, cache bị bỏ khi gán lại trường được hash
+        if self._valid is None or not use_cache:
+            self._valid = self.calculate_hash() == self.hash
+        return self._valid
+
+    @property
+    def is_valid(self):
+        return self.validate_block()
 
     def to_dict(self):
         return {
             "index": self.index,
             "timestamp": self.timestamp,
-            "transactions": self.transactions,  # Giữ nguyên format để lưu
+            "transactions": self._transaction_list(),  # Giữ nguyên format để lưu
             "previous_hash": self.previous_hash,
             "hash": self.hash,
-            "nonce": self.nonce
+            "nonce": self.nonce,
+            "version": self.version,
+            "merkle_root": self.merkle_root
         }
 
     @staticmethod
     def from_dict(data):
-        # Tạo block từ dict, không cần decode transactions ở đây
-        block = Block(
+        # Tạo block từ dict đã lưu: không tính lại hash/merkle root (chỉ tính khi validate)
+        block = Block.__new__(Block)
+        block._init_fields(
             index=data['index'],
-            transactions=data['transactions'],  # Giữ nguyên format
             timestamp=data['timestamp'],
             previous_hash=data['previous_hash'],
-            nonce=data.get('nonce', 0)
+            nonce=data.get('nonce', 0),
+            version=data.get('version', 1)  # Block cũ chưa có version
         )
+        if 'raw_transactions' in data:
+            block._set_raw_transactions(data['raw_transactions'])
+        else:
+            block.transactions = data['transactions']  # Giữ nguyên format
         block.hash = data['hash']
         return block
-    
+
+
 class Blockchain:
-    def __init__(self, difficulty=1):
+    def __init__(self, difficulty=1, storage_mode=None, mining_workers=1, lazy=True):
         self.difficulty = difficulty
+        # Số process dùng để đào block (1 = đào tuần tự như cũ, nên bật khi difficulty >= 4)
+        self.mining_workers = mining_workers
         self.chain = []
         self.pending_transactions = []
         self.mining_reward = 10
-        self.blockchain_file = "blockchain.json"
-        self.backup_file = "blockchain_backup.json"
-        self.lock = threading.Lock()  # Thêm lock để đồng bộ
+        # storage_mode: "json" (ghi lại cả file), "log" (append-only JSON-lines) hoặc "binary", None = tự nhận diện
+        self.storage_mode = storage_mode or detect_storage_mode()
+        self.blockchain_file, self.backup_file = STORAGE_FILES[self.storage_mode]
+        # lazy: với log/binary, self.chain là LazyChain (mmap) thay vì list Block dựng sẵn
+        self.lazy = lazy
+        # lock: critical section ngắn khi commit block (kiểm tra tip + append), không giữ khi đào hay ghi file
+        self.lock = threading.Lock()
+        self.pending_lock = threading.Lock()  # Bảo vệ pending_transactions (route enqueue, BlockSealer lấy ra)
+        self.index_lock = threading.Lock()  # Một thread cập nhật index employee/month tại một thời điểm
+        self.full_verify_lock = threading.Lock()  # Mỗi lúc chỉ một lần verify toàn bộ chain (request hoặc thread nền)
+        # Mọi thao tác ghi file chain chạy trên một thread ghi duy nhất, theo thứ tự commit
+        self.writer = ChainWriter()
+        self._unpersisted = []  # Block đã commit vào self.chain nhưng chưa ghi xuống file
+        self._backup_stale = False  # Backup ghi lỗi và chưa ghi lại được: lần sau ghi lại cả backup thay vì nối
+
+        # Checkpoint của đoạn chain đã verify: chỉ cần kiểm tra các block sau verified_index
+        self.verified_index = -1
+        self.verified_hash = None
+        self.chain_valid = True
+        self.last_full_verify = 0
+        self.full_verify_interval = 24 * 3600  # Verify lại toàn bộ chain mỗi ngày
+
+        # Bộ đếm toàn chain, cộng dồn khi append và lưu cùng checkpoint (không quét lại chain mỗi request)
+        self.reset_chain_totals()
+
+        # Cache transaction đã giải mã, dùng chung cho PayrollSystem/ReportGenerator/routes
+        self.crypto = None
+        self.tx_cache = TransactionCache()
+        # Định dạng đã nhận diện của từng transaction + quarantine bản ghi không giải mã được
+        self.tx_formats = TransactionFormatIndex()
+        self._employee_index = None
         
         if not self.load_existing_blockchain():
             print("Blockchain không thể load. Vui lòng kiểm tra file hoặc khôi phục từ backup.")
@@ -109,22 +302,117 @@ class Blockchain:
         if len(self.chain) == 0:
             self.create_genesis_block()
 
+    def _storage(self):
+        return create_storage(self.storage_mode, self.blockchain_file)
+
+    def _backup_storage(self):
+        return create_storage(self.storage_mode, self.backup_file)
+
+    @property
+    def checkpoint_file(self):
+        return os.path.splitext(self.blockchain_file)[0] + "_checkpoint.json"
+
+    def load_checkpoint(self):
+        """Đọc checkpoint (index, hash của block cao nhất đã verify) từ file"""
+        self.verified_index, self.verified_hash = -1, None
+        try:
+            if os.path.exists(self.checkpoint_file):
+                with open(self.checkpoint_file, 'r') as f:
+                    data = json.load(f)
+                self.verified_index = data['verified_index']
+                self.verified_hash = data['verified_hash']
+                # Checkpoint cũ chưa có last_full_verify: tính chu kỳ verify toàn bộ từ lúc load
+                self.last_full_verify = data.get('last_full_verify', time.time())
+                totals = data.get('chain_totals')
+                if totals:
+                    self.totals_index = totals['index']
+                    self.totals_hash = totals['hash']
+                    self.total_size_bytes = totals['total_size_bytes']
+                    self.total_transactions = totals['total_transactions']
+        except Exception as e:
+            print(f"Error loading checkpoint: {e}")
+
+    def _checkpoint_data(self):
+        # Chụp checkpoint + bộ đếm trong lock để không ghi ra trạng thái nửa vời khi add_block đang commit
+        with self.lock:
+            return {
+                'verified_index': self.verified_index,
+                'verified_hash': self.verified_hash,
+                'last_full_verify': self.last_full_verify,
+                'chain_totals': {
+                    'index': self.totals_index,
+                    'hash': self.totals_hash,
+                    'total_size_bytes': self.total_size_bytes,
+                    'total_transactions': self.total_transactions
+                }
+            }
+
+    def save_checkpoint(self):
+        try:
+            # Chụp dữ liệu ngay trên thread ghi: lần ghi sau luôn mang trạng thái mới nhất
+            self.writer.run(lambda: self._write_checkpoint(self._checkpoint_data()))
+        except Exception as e:
+            print(f"Error saving checkpoint: {e}")
+
+    def _write_checkpoint(self, data):
+        temp_file = self.checkpoint_file + ".tmp"
+        with open(temp_file, 'w') as f:
+            json.dump(data, f)
+        os.replace(temp_file, self.checkpoint_file)
+
+    def reset_checkpoint(self):
+        """Bỏ checkpoint (sau restore/thay chain), lần validate sau sẽ verify toàn bộ"""
+        self.verified_index, self.verified_hash = -1, None
+        self.chain_valid = True
+        self.reset_chain_totals()
+
+    def reset_chain_totals(self):
+        self.totals_index, self.totals_hash = -1, None
+        self.total_size_bytes = 0
+        self.total_transactions = 0
+
+    def update_chain_totals(self):
+        """Cộng kích thước/số transaction của các block chưa đếm vào bộ đếm (khi append chỉ là block mới)"""
+        with self.lock:
+            return self._update_chain_totals_locked()
+
+    def _update_chain_totals_locked(self):
+        # Gọi khi đang giữ self.lock (add_block cập nhật ngay trong critical section commit)
+        if self.totals_index >= len(self.chain) or (
+                self.totals_index >= 0 and self.chain[self.totals_index].hash != self.totals_hash):
+            # Bộ đếm không khớp chain hiện tại -> đếm lại từ đầu
+            self.reset_chain_totals()
+
+        for block in self.chain[self.totals_index + 1:]:
+            self.total_size_bytes += block.get_size_bytes()
+            self.total_transactions += block.tx_count
+
+        if len(self.chain):
+            self.totals_index = len(self.chain) - 1
+            self.totals_hash = self.chain[-1].hash
+        return self.total_size_bytes, self.total_transactions
+
     def load_existing_blockchain(self):
         try:
-            if os.path.exists(self.blockchain_file):
+            storage = self._storage()
+            if storage.exists():
                 print(f"Loading existing blockchain from {self.blockchain_file}")
-                with open(self.blockchain_file, 'r') as f:
-                    data = json.load(f)
-                    if data:
-                        self.chain = [Block.from_dict(block_data) for block_data in data]
-                        print(f"Loaded {len(self.chain)} blocks from existing blockchain")
-
-                        if self.validate_chain():
-                            print("Blockchain validation successful")
-                            return True
-                        else:
-                            print("Blockchain validation failed. Không ghi đè.")
-                            return False  # Không tạo genesis mới!
+                if self.lazy and hasattr(storage, 'open_lazy'):
+                    # Chỉ đọc bảng offset, Block được dựng khi truy cập lần đầu
+                    chain = storage.open_lazy(Block.from_dict)
+                else:
+                    chain = [Block.from_dict(block_data) for block_data in storage.load()]
+                if len(chain):
+                    self.chain = chain
+                    print(f"Loaded {len(self.chain)} blocks from existing blockchain")
+                    self.load_checkpoint()
+
+                    if self.validate_chain():
+                        print("Blockchain validation successful")
+                        return True
+                    else:
+                        print("Blockchain validation failed. Không ghi đè.")
+                        return False  # Không tạo genesis mới!
             return False
         except Exception as e:
             print(f"Error loading blockchain: {e}")
@@ -134,8 +422,11 @@ class Blockchain:
         """Tạo genesis block chỉ khi chưa có blockchain"""
         print("Creating new genesis block")
         genesis = Block(0, [], time.time(), "0")
-        genesis.mine_block(self.difficulty)
+        genesis.mine_block(self.difficulty, self.mining_workers)
         self.chain.append(genesis)
+        self.last_full_verify = time.time()  # Chain mới chỉ có genesis, chưa cần verify toàn bộ
+        self.update_chain_totals()
+        self._advance_checkpoint(genesis)
         self.save_to_file()
         self.backup_chain()
         return genesis
@@ -144,42 +435,137 @@ class Blockchain:
         return self.chain[-1]
 
     def add_block(self, transactions):
-        with self.lock:  # Đảm bảo chỉ 1 thread thực hiện tại 1 thời điểm
-            print(f"Adding block with {len(transactions)} transactions")
-        """Thêm block mới và lưu ngay lập tức"""
-        new_block = Block(
-            len(self.chain), 
-            transactions, 
-            time.time(), 
-            self.get_latest_block().hash
-        )
-        new_block.mine_block(self.difficulty)
-        
-        if self.validate_new_block(new_block):
-            self.chain.append(new_block)
-            self.pending_transactions = []
-            
-            # Lưu ngay sau khi thêm block
-            self.save_to_file()
-            self.backup_chain()
-            
-            print(f"Block #{new_block.index} added and saved to blockchain")
-            return new_block
+        """Thêm block mới và lưu ngay lập tức.
+        Đào trên snapshot của tip (ngoài lock); commit là critical section ngắn kiểm tra lại tip,
+        tip đã đổi thì đào lại trên tip mới. Chỉ trả về sau khi thread ghi đã lưu block xuống file."""
+        transactions = list(transactions)
+        print(f"Adding block with {len(transactions)} transactions")
+
+        for attempt in range(ADD_BLOCK_MAX_RETRIES):
+            with self.lock:
+                tip = self.get_latest_block()
+            new_block = Block(tip.index + 1, transactions, time.time(), tip.hash)
+            new_block.mine_block(self.difficulty, self.mining_workers)
+            if not new_block.validate_block():
+                raise Exception("Block không hợp lệ!")
+            new_block.get_size_bytes()  # tính sẵn (cache) ngoài lock cho _update_chain_totals_locked
+
+            with self.lock:
+                if self.get_latest_block() is not tip:
+                    print(f"Tip changed while mining block #{new_block.index}, retrying ({attempt + 1})")
+                    continue
+                if not self.validate_new_block(new_block):
+                    raise Exception("Block không hợp lệ!")
+                self.chain.append(new_block)
+                self._update_chain_totals_locked()
+                self._advance_checkpoint(new_block, save=False)
+                # Đưa vào hàng ghi ngay trong lock để thứ tự ghi file đúng thứ tự chain
+                self._unpersisted.append(new_block)
+                persisted, result = self.writer.submit(self._persist_unpersisted)
+            break
         else:
-            raise Exception("Block không hợp lệ!")
+            raise Exception(f"Không thể thêm block sau {ADD_BLOCK_MAX_RETRIES} lần thử (chain thay đổi liên tục)")
+
+        self.remove_pending(transactions)
+        self._cache_block_transactions(new_block)
+        self.sync_employee_index()
+
+        persisted.wait()
+        # Block có thể được ghi (hoặc bị rollback) trong lượt ghi của thread khác -> kiểm tra block còn trong chain
+        with self.lock:
+            committed = new_block.index < len(self.chain) and self.chain[new_block.index] is new_block
+        if not committed:
+            raise Exception(f"Không lưu được block #{new_block.index} xuống file, block đã bị hủy: "
+                            f"{result.get('error', 'block trước đó ghi lỗi')}")
+
+        print(f"Block #{new_block.index} added and saved to blockchain")
+        return new_block
+
+    def _persist_unpersisted(self):
+        """Chạy trên thread ghi: lưu mọi block đã commit nhưng chưa ghi (gom nhiều block vào một lần ghi) + checkpoint"""
+        with self.lock:
+            blocks, self._unpersisted = self._unpersisted, []
+        if not blocks:
+            return
+        try:
+            self.persist_blocks(blocks)
+        except Exception as e:
+            print(f"Error persisting blocks #{blocks[0].index}-#{blocks[-1].index}: {e}")
+            self._rollback_to(blocks[0].index)
+            raise
+        self.save_checkpoint()
+
+    def _rollback_to(self, index):
+        """Bỏ khỏi bộ nhớ các block từ index trở đi (chưa xuống được file), đưa bộ đếm và checkpoint về tip cũ.
+        Checkpoint trên đĩa chưa được dời qua các block này nên không cần ghi lại."""
+        with self.lock:
+            dropped = self.chain[index:]
+            if hasattr(self.chain, 'truncate'):
+                self.chain.truncate(index)
+            else:
+                del self.chain[index:]
+            # Block commit sau block lỗi cũng nối trên nó -> bỏ luôn (add_block của chúng sẽ báo lỗi)
+            self._unpersisted = [block for block in self._unpersisted if block.index < index]
+
+            tip = self.chain[-1]
+            if self.totals_index >= index:
+                for block in dropped:
+                    if block.index <= self.totals_index:
+                        self.total_size_bytes -= block.get_size_bytes()
+                        self.total_transactions -= block.tx_count
+                self.totals_index, self.totals_hash = tip.index, tip.hash
+            if self.verified_index >= index:
+                self.verified_index, self.verified_hash = tip.index, tip.hash
+        print(f"Rolled back {len(dropped)} unsaved block(s), tip is now #{tip.index}")
+
+    def persist_block(self, block):
+        """Lưu block vừa thêm: chế độ log/binary chỉ ghi nối block, chế độ json ghi lại cả chain"""
+        self.persist_blocks([block])
+
+    def persist_blocks(self, blocks):
+        """Lưu các block vừa thêm (liên tiếp, theo thứ tự chain).
+        Ghi file chính lỗi thì ném lỗi (để rollback tip); backup lỗi chỉ in ra và ghi lại backup từ đầu."""
+        # Chỉ ghi tới block cuối của đợt này: block commit sau đó chưa lưu, có thể còn bị rollback
+        length = blocks[-1].index + 1
+        if self.storage_mode == "json":
+            def rewrite():
+                chain = self._chain_snapshot(length)
+                self._storage().write_all(chain)
+                try:
+                    self._backup_storage().write_all(chain)
+                    print(f"Blockchain backup created: {self.backup_file}")
+                except Exception as e:
+                    print(f"Error creating backup: {e}")
+
+            self.writer.run(rewrite)
+            return
+
+        def append():
+            self._storage().append_many(blocks)
+            try:
+                if not self._backup_stale:
+                    self._backup_storage().append_many(blocks)
+                    return
+            except Exception as e:
+                print(f"Error appending block to {self.backup_file}: {e}, rewriting backup")
+            # Nối tiếp vào backup đang thiếu block sẽ tạo lỗ hổng, phải ghi lại từ đầu
+            try:
+                self._backup_storage().write_all(self._chain_snapshot(length))
+                self._backup_stale = False
+            except Exception as e:
+                self._backup_stale = True
+                print(f"Error creating backup: {e}")
+
+        self.writer.run(append)
+
+    def _chain_snapshot(self, length=None):
+        with self.lock:
+            return self.chain[:length]
 
     def save_to_file(self):
-        """Lưu blockchain vào file JSON"""
+        """Lưu toàn bộ blockchain vào file (ghi lại cả file)"""
         try:
-            data = [block.to_dict() for block in self.chain]
-            
-            # Lưu vào file tạm trước
-            temp_file = self.blockchain_file + ".tmp"
-            with open(temp_file, 'w') as f:
-                json.dump(data, f, indent=2)
-            
-            # Rename file tạm thành file chính (atomic operation)
-            os.replace(temp_file, self.blockchain_file)
+            self.writer.run(lambda: self._storage().write_all(self._chain_snapshot()))
             print(f"Blockchain saved to {self.blockchain_file}")
             
         except Exception as e:
@@ -188,22 +574,46 @@ class Blockchain:
     def backup_chain(self):
         """Tạo backup của blockchain"""
         try:
-            data = [block.to_dict() for block in self.chain]
-            with open(self.backup_file, 'w') as f:
-                json.dump(data, f, indent=2)
+            self.writer.run(lambda: self._backup_storage().write_all(self._chain_snapshot()))
             print(f"Blockchain backup created: {self.backup_file}")
         except Exception as e:
             print(f"Error creating backup: {e}")
 
     def restore_from_backup(self):
-        if os.path.exists(self.backup_file):
-            with open(self.backup_file, 'r') as f:
-                data = json.load(f)
+        backup = self._backup_storage()
+        if backup.exists():
+            data = backup.load()
+            with self.lock:
                 self.chain = [Block.from_dict(block) for block in data]
+                self.reset_checkpoint()
+            self.tx_cache.clear()
+            self.tx_formats.clear()
             self.save_to_file()
             return True
         return False
-   
+
+    @staticmethod
+    def migrate_storage(source_mode, target_mode, source_file=None, target_file=None, backup_file=None):
+        """Chuyển chain giữa các định dạng lưu (json/log/binary), trả về số block đã chuyển"""
+        source_file = source_file or STORAGE_FILES[source_mode][0]
+        target_file = target_file or STORAGE_FILES[target_mode][0]
+        backup_file = backup_file or STORAGE_FILES[target_mode][1]
+
+        data = create_storage(source_mode, source_file).load()
+        blocks = [Block.from_dict(block_data) for block_data in data]
+
+        for i in range(1, len(blocks)):
+            if blocks[i].previous_hash != blocks[i - 1].hash or not blocks[i].validate_block():
+                raise Exception(f"Block {i} trong {source_file} không hợp lệ, dừng migrate")
+
+        create_storage(target_mode, target_file).write_all(blocks)
+        create_storage(target_mode, backup_file).write_all(blocks)
+        return len(blocks)
+
+    @staticmethod
+    def migrate_json_to_log(json_file="blockchain.json", log_file=None, backup_file=None):
+        """Chuyển blockchain.json (định dạng cũ) sang log append-only, trả về số block đã chuyển"""
+        return Blockchain.migrate_storage("json", "log", json_file, log_file, backup_file)
 
     def validate_new_block(self, new_block):
         latest_block = self.get_latest_block()
@@ -219,34 +629,138 @@ class Blockchain:
             
         return True
 
-    def validate_chain(self):
-        """Validate toàn bộ blockchain"""
+    def _advance_checkpoint(self, block, save=True):
+        """Block mới đã được kiểm tra với tip đã verify -> dời checkpoint lên block này
+        (save=False: checkpoint được thread ghi lưu sau khi block đã xuống file)"""
+        if self.chain_valid and self.verified_index == block.index - 1:
+            self.verified_index = block.index
+            self.verified_hash = block.hash
+            if save:
+                self.save_checkpoint()
+
+    def _verify_range(self, start, use_cache=True):
+        """Kiểm tra hash và liên kết của các block từ start đến cuối chain"""
+        for i in range(max(start, 1), len(self.chain)):
+            current_block = self.chain[i]
+            previous_block = self.chain[i-1]
+
+            if not current_block.validate_block(use_cache):
+                print(f"Block {i} has invalid hash")
+                return False
+
+            if current_block.previous_hash != previous_block.hash:
+                print(f"Block {i} has invalid previous hash")
+                return False
+
+        return True
+
+    def validate_chain(self, full=False):
+        """Validate blockchain: mặc định chỉ kiểm tra các block sau checkpoint đã verify.
+        full=True sẽ verify lại toàn bộ chain; quá full_verify_interval thì verify toàn bộ chạy trên thread nền."""
         try:
-            for i in range(1, len(self.chain)):
-                current_block = self.chain[i]
-                previous_block = self.chain[i-1]
-                
-                if not current_block.validate_block():
-                    print(f"Block {i} has invalid hash")
-                    return False
-                    
-                if current_block.previous_hash != previous_block.hash:
-                    print(f"Block {i} has invalid previous hash")
-                    return False
-                    
-            return True
+            if full:
+                return self.verify_full_chain()
+            self.schedule_full_verify()
+
+            if not self.chain_valid:
+                # Chain đã bị đánh dấu lỗi, chỉ verify lại khi được yêu cầu (full=True) hoặc restore
+                return False
+
+            with self.lock:
+                tip_index = len(self.chain) - 1
+                verified_index = self.verified_index
+                checkpoint_ok = (0 <= verified_index <= tip_index and
+                                 self.chain[verified_index].hash == self.verified_hash)
+            if not checkpoint_ok:
+                # Checkpoint không khớp chain hiện tại (chain bị thay/restore) -> verify lại từ đầu
+                return self.verify_full_chain()
+
+            if verified_index < tip_index:
+                # Verify ngoài lock, chỉ dời checkpoint trong lock (add_block có thể đã dời xa hơn tip_index)
+                valid = self._verify_range(verified_index + 1)
+                with self.lock:
+                    self.chain_valid = valid
+                    if valid and self.verified_index < tip_index:
+                        self.verified_index = tip_index
+                        self.verified_hash = self.chain[tip_index].hash
+                if valid:
+                    self.save_checkpoint()
+
+            return self.chain_valid
+        except Exception as e:
+            print(f"Error validating chain: {e}")
+            return False
+
+    def schedule_full_verify(self):
+        """Quá full_verify_interval thì verify toàn bộ chain trên thread nền, request không phải chờ.
+        Đang có lần verify toàn bộ khác chạy thì bỏ qua."""
+        if time.time() - self.last_full_verify <= self.full_verify_interval:
+            return False
+        if not self.full_verify_lock.acquire(blocking=False):
+            return False
+        if time.time() - self.last_full_verify <= self.full_verify_interval:
+            # Lần verify vừa xong trước khi lấy được lock
+            self.full_verify_lock.release()
+            return False
+
+        def run():
+            try:
+                self._verify_full_chain()
+            finally:
+                self.full_verify_lock.release()
+
+        threading.Thread(target=run, name="full-verify", daemon=True).start()
+        return True
+
+    def verify_full_chain(self):
+        """Rehash toàn bộ chain từ block 1 và cập nhật checkpoint.
+        Đang có lần verify toàn bộ khác chạy thì chờ nó xong và dùng luôn kết quả, không rehash lần nữa."""
+        requested = time.time()
+        with self.full_verify_lock:
+            if self.last_full_verify >= requested:
+                return self.chain_valid
+            return self._verify_full_chain()
+
+    def _verify_full_chain(self):
+        # Gọi khi đang giữ self.full_verify_lock
+        try:
+            tip_index = len(self.chain) - 1
+            valid = self._verify_range(1, use_cache=False)
+            with self.lock:
+                self.chain_valid = valid
+                self.last_full_verify = time.time()
+                if valid and tip_index >= 0:
+                    self.verified_index = tip_index
+                    self.verified_hash = self.chain[tip_index].hash
+                else:
+                    self.verified_index, self.verified_hash = -1, None
+            self.save_checkpoint()
+            return self.chain_valid
         except Exception as e:
             print(f"Error validating chain: {e}")
             return False
 
     def add_transaction(self, transaction):
         """Thêm transaction vào pending list"""
-        self.pending_transactions.append(transaction)
+        with self.pending_lock:
+            self.pending_transactions.append(transaction)
+
+    def remove_pending(self, transactions):
+        """Bỏ các transaction đã vào block (hoặc bị hủy) khỏi pending, giữ nguyên các transaction đến sau"""
+        def key(tx):
+            # ciphertext so theo giá trị, transaction dạng dict so theo object
+            return tx if isinstance(tx, str) else id(tx)
+
+        sealed = set(key(tx) for tx in transactions)
+        with self.pending_lock:
+            self.pending_transactions = [tx for tx in self.pending_transactions if key(tx) not in sealed]
 
     def get_blockchain_stats(self):
-        total_blocks = len(self.chain)
-        total_transactions = sum(len(block.transactions) for block in self.chain)
-        total_size = sum(block.get_size_bytes() for block in self.chain)
+        # Số block, bộ đếm và hash tip đọc cùng lúc trong lock để khớp nhau
+        with self.lock:
+            total_size, total_transactions = self._update_chain_totals_locked()
+            total_blocks = len(self.chain)
+            latest_block_hash = self.get_latest_block().hash if self.chain else "No blocks"
         
         return {
             'total_blocks': total_blocks,
@@ -254,7 +768,8 @@ class Blockchain:
             'total_size_bytes': total_size,
             'chain_valid': self.validate_chain(),
             'difficulty': self.difficulty,
-            'latest_block_hash': self.get_latest_block().hash if self.chain else "No blocks"
+            'latest_block_hash': latest_block_hash,
+            'quarantined_transactions': len(self.tx_formats.quarantined())
         }
 
     def get_blocks_with_details(self):
@@ -268,8 +783,8 @@ class Blockchain:
                 'timestamp': block.timestamp,
                 'timestamp_formatted': datetime.fromtimestamp(block.timestamp).strftime('%Y-%m-%d %H:%M:%S'),
                 'nonce': block.nonce,
-                'transaction_count': len(block.transactions),
-                'transactions': block.transactions,
+                'transaction_count': block.tx_count,
+                'transactions': list(block.transactions),
                 'size_bytes': block.get_size_bytes(),
                 'is_valid': block.validate_block(),
                 'chain_valid': True if i == 0 else block.previous_hash == self.chain[i-1].hash
@@ -284,93 +799,25 @@ class Blockchain:
     def get_transaction_volume_by_month(self, year=2025, only_year=True, debug=False):
         """
         Trả về dict theo từng tháng (YYYY-MM) cho `year` (mặc định tạo đủ 12 tháng).
-        only_year=True: chỉ tính các block trong `year` (nhưng vẫn thêm key nếu block ngoài year có xuất hiện).
+        only_year=True: chỉ lấy các tháng trong `year`; False: thêm cả các tháng khác có block.
+        Số liệu đọc từ bảng tổng hợp theo tháng (cập nhật khi add_block), không giải mã lại chain.
         debug=True: in thông tin chi tiết để debug.
         """
-        def _to_seconds(ts):
-            """Chuẩn hóa timestamp về giây (hỗ trợ s, ms, ns, string số). Trả None nếu không parse được."""
-            try:
-                t = float(ts)
-            except Exception:
-                return None
-            # roughly detect units
-            if t > 1e15:    # nanoseconds
-                return t / 1e9
-            if t > 1e12:    # milliseconds
-                return t / 1e3
-            return t  # assume seconds
-
         # Khởi tạo đủ 12 tháng cho year
         monthly_stats = {f"{year}-{m:02d}": {'transaction_count': 0, 'total_salary': 0, 'blocks': 0}
                         for m in range(1, 13)}
 
-        # cố import CryptoUtils nếu cần
-        try:
-            from backend.crypto_utils import CryptoUtils
-            crypto = CryptoUtils()
-        except Exception:
-            crypto = None
-            if debug:
-                print("CryptoUtils not available — skip special decode.")
+        # Đảm bảo bảng tổng hợp đã bắt kịp chain (chỉ xử lý các block chưa được tổng hợp)
+        self.sync_employee_index()
 
-        for i, block in enumerate(self.chain):
-            sec = _to_seconds(block.timestamp)
-            if sec is None:
-                if debug:
-                    print(f"[BLOCK {i}] invalid timestamp: {block.timestamp!r}")
-                continue
-
-            dt = datetime.fromtimestamp(sec)
-            month_key = dt.strftime('%Y-%m')
-
-            # nếu chỉ lấy năm cụ thể và block không thuộc year, bỏ qua (nếu bạn muốn)
+        for month_key, transaction_count, total_salary, blocks in self.get_employee_index().monthly_totals():
             if only_year and not month_key.startswith(f"{year}-"):
-                if debug:
-                    print(f"[BLOCK {i}] skip (not in year {year}): {month_key}")
                 continue
-
-            # đảm bảo key tồn tại (nếu block thuộc năm khác, vẫn add được)
-            if month_key not in monthly_stats:
-                monthly_stats[month_key] = {'transaction_count': 0, 'total_salary': 0, 'blocks': 0}
-
-            monthly_stats[month_key]['blocks'] += 1
-            if debug:
-                print(f"[BLOCK {i}] raw_ts={block.timestamp!r} -> sec={sec} -> {month_key} (blocks={monthly_stats[month_key]['blocks']})")
-
-            # xử lý từng transaction
-            for j, tx_data in enumerate(block.transactions):
-                try:
-                    tx_dict = self._decode_transaction(tx_data, crypto)
-                except Exception as e:
-                    if debug:
-                        print(f"  [BLOCK {i} TX {j}] decode error: {e}")
-                    continue
-
-                if not isinstance(tx_dict, dict):
-                    if debug:
-                        print(f"  [BLOCK {i} TX {j}] decoded not dict: {tx_dict!r}")
-                    continue
-
-                monthly_stats[month_key]['transaction_count'] += 1
-
-                # lấy total_salary, hỗ trợ string numbers
-                salary = tx_dict.get('total_salary', 0)
-                parsed_salary = 0
-                if isinstance(salary, (int, float)):
-                    parsed_salary = float(salary)
-                else:
-                    # cố parse string (loại bỏ dấu phẩy, spaces)
-                    try:
-                        s = str(salary).replace(',', '').strip()
-                        parsed_salary = float(s)
-                    except Exception:
-                        if debug:
-                            print(f"  [BLOCK {i} TX {j}] cannot parse salary: {salary!r}")
-                        parsed_salary = 0
-
-                monthly_stats[month_key]['total_salary'] += parsed_salary
-                if debug:
-                    print(f"  [BLOCK {i} TX {j}] salary={parsed_salary} -> total for {month_key} = {monthly_stats[month_key]['total_salary']}")
+            monthly_stats[month_key] = {
+                'transaction_count': transaction_count,
+                'total_salary': total_salary,
+                'blocks': blocks
+            }
 
         if debug:
             print("Debug - Monthly blockchain stats:", json.dumps(monthly_stats, indent=2, ensure_ascii=False))
@@ -429,62 +876,195 @@ class Blockchain:
 
 # Thêm vào class Blockchain trong blockchain.py
 
-    def _decode_transaction(self, tx_data, crypto=None):
-        """Helper function để decode transaction với error handling tốt hơn"""
-        try:
-            if isinstance(tx_data, str):
-                # Import crypto utils nếu chưa có
-                if crypto is None:
-                    try:
-                        from backend.crypto_utils import CryptoUtils
-                        crypto = CryptoUtils()
-                    except:
-                        return None
-                
-                # Thử decode base64 + decrypt
-                try:
-                    encrypted_bytes = base64.b64decode(tx_data)
-                    decrypted_json = crypto.aes_decrypt(encrypted_bytes)
-                    return json.loads(decrypted_json)
-                except Exception as decode_error:
-                    print(f"Decode error (trying old method): {decode_error}")
-                    
-                    # Thử phương pháp cũ cho tương thích ngược
-                    try:
-                        from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
-                        from cryptography.hazmat.backends import default_backend
-                        
-                        # Sử dụng key cũ với padding space
-                        cipher = Cipher(algorithms.AES(crypto.key), modes.CBC(crypto.iv), backend=default_backend())
-                        decryptor = cipher.decryptor()
-                        decrypted_padded = decryptor.update(encrypted_bytes) + decryptor.finalize()
-                        decrypted_old = decrypted_padded.decode('utf-8').rstrip()
-                        return json.loads(decrypted_old)
-                    except Exception as old_error:
-                        print(f"Old method also failed: {old_error}")
-                        
-                        # Thử parse JSON trực tiếp
-                        try:
-                            return json.loads(tx_data)
-                        except:
-                            return None
-                            
-            elif isinstance(tx_data, dict):
-                return tx_data
-            else:
+    def get_crypto(self):
+        """CryptoUtils dùng chung cho chain (chỉ đọc file key một lần)"""
+        if self.crypto is None:
+            from backend.crypto_utils import CryptoUtils
+            self.crypto = CryptoUtils()
+        return self.crypto
+
+    def _record_decode_result(self, block, tx_index, tx_dict, tx_format, error, fill_cache=True):
+        """Nhớ định dạng của transaction; giải mã được thì đưa vào cache, không thì đưa vào quarantine"""
+        self.tx_formats.set(block.hash, tx_index, block.tx_count, tx_format)
+        if error is not None:
+            print(f"Quarantine transaction block {block.index}, tx {tx_index} ({FORMAT_NAMES.get(tx_format)}): {error}")
+            self.tx_formats.quarantine(block.hash, tx_index, {
+                'block_index': block.index,
+                'block_hash': block.hash,
+                'tx_index': tx_index,
+                'format': FORMAT_NAMES.get(tx_format),
+                'error': error
+            })
+        elif fill_cache:
+            self.tx_cache.put(block.hash, tx_index, tx_dict)
+
+    def get_decoded_transaction(self, block, tx_index):
+        """Lấy transaction đã giải mã qua cache; trả về bản sao để caller có thể thêm metadata.
+        Bản ghi đã bị quarantine trả về None ngay, không giải mã lại."""
+        tx_dict = self.tx_cache.get(block.hash, tx_index)
+        if tx_dict is None:
+            if self.tx_formats.is_quarantined(block.hash, tx_index):
                 return None
-                
+            try:
+                crypto = self.get_crypto()
+            except Exception:
+                crypto = None
+            tx_dict, tx_format, error = try_decode(block.transactions[tx_index], crypto,
+                                                   self.tx_formats.get(block.hash, tx_index))
+            self._record_decode_result(block, tx_index, tx_dict, tx_format, error)
+            if tx_dict is None:
+                return None
+        return dict(tx_dict)
+
+    def get_quarantined_transactions(self):
+        """Các transaction không giải mã được (block_index, block_hash, tx_index, format, error)"""
+        return self.tx_formats.quarantined()
+
+    def release_quarantine(self):
+        """Cho các bản ghi trong quarantine được giải mã lại ở lần quét sau"""
+        return self.tx_formats.release()
+
+    def iter_decoded_transactions(self):
+        """Duyệt (block, tx_index, tx_dict) của toàn chain, tx_dict = None nếu không giải mã được"""
+        for block in self.chain:
+            for tx_index in range(len(block.transactions)):
+                yield block, tx_index, self.get_decoded_transaction(block, tx_index)
+
+    def parallel_scan(self, workers=None, start=0, end=None, fill_cache=True):
+        """Giải mã mọi transaction của các block [start, end), trả về list (block, tx_index, tx_dict) theo thứ tự chain.
+        Block chưa có trong cache được chia cho nhiều process (mỗi worker có cipher riêng);
+        ít hơn PARALLEL_SCAN_MIN_TRANSACTIONS transaction cần giải mã hoặc workers=1 thì giải mã tuần tự."""
+        blocks = self.chain[start:end]
+        workers = workers or default_scan_workers()
+
+        # Đã có trong cache hoặc đã bị quarantine thì không cần giải mã lại
+        uncached = [block for block in blocks
+                    if not all(self.tx_cache.contains(block.hash, i) or self.tx_formats.is_quarantined(block.hash, i)
+                               for i in range(block.tx_count))]
+        if workers <= 1 or sum(block.tx_count for block in uncached) < PARALLEL_SCAN_MIN_TRANSACTIONS:
+            return [(block, tx_index, self.get_decoded_transaction(block, tx_index))
+                    for block in blocks for tx_index in range(block.tx_count)]
+
+        crypto = self.get_crypto()
+        known_formats = {}
+        for block in uncached:
+            formats = self.tx_formats.block_formats(block.hash)
+            if formats is not None:
+                known_formats[block.hash] = formats
+
+        decoded = {}
+        scanned = scan_parallel(uncached, crypto.key, crypto.iv, workers, known_formats=known_formats)
+        for block, results in zip(uncached, scanned):
+            decoded_transactions = []
+            for tx_index, (tx_dict, tx_format, error) in enumerate(results):
+                if self.tx_formats.is_quarantined(block.hash, tx_index):
+                    tx_dict = None
+                else:
+                    self._record_decode_result(block, tx_index, tx_dict and dict(tx_dict), tx_format, error, fill_cache)
+                decoded_transactions.append(tx_dict)
+            decoded[block.hash] = decoded_transactions
+
+        results = []
+        for block in blocks:
+            decoded_transactions = decoded.get(block.hash)
+            for tx_index in range(block.tx_count):
+                if decoded_transactions is not None:
+                    results.append((block, tx_index, decoded_transactions[tx_index]))
+                else:
+                    results.append((block, tx_index, self.get_decoded_transaction(block, tx_index)))
+        return results
+
+    def get_inclusion_proof(self, block_index, tx_index):
+        """Merkle proof O(log n) cho transaction (block_index, tx_index), kiểm tra bằng merkle.verify_inclusion_proof"""
+        if block_index < 0 or block_index >= len(self.chain):
+            raise Exception(f"Block {block_index} không tồn tại")
+        block = self.chain[block_index]
+        if block.version < 3:
+            raise Exception(f"Block {block_index} (version {block.version}) không có Merkle root")
+
+        return {
+            'block_index': block.index,
+            'block_hash': block.hash,
+            'tx_index': tx_index,
+            'transaction': block.transactions[tx_index] if 0 <= tx_index < len(block.transactions) else None,
+            'merkle_root': block.merkle_root,
+            'proof': merkle_proof(block.transactions, tx_index),
+            'header': {
+                'version': block.version,
+                'index': block.index,
+                'timestamp': block.timestamp,
+                'previous_hash': block.previous_hash,
+                'nonce': block.nonce
+            }
+        }
+
+    def _cache_block_transactions(self, block):
+        """Giải mã transaction của block vừa append để điền sẵn cache"""
+        for tx_index in range(len(block.transactions)):
+            self.get_decoded_transaction(block, tx_index)
+
+    @property
+    def index_file(self):
+        return os.path.splitext(self.blockchain_file)[0] + "_index.db"
+
+    def get_employee_index(self):
+        if self._employee_index is None or self._employee_index.db_path != self.index_file:
+            self._employee_index = EmployeeTxIndex(self.index_file)
+        return self._employee_index
+
+    def sync_employee_index(self):
+        """Index (employee/month và tổng hợp theo tháng) các block chưa có trong index;
+        rebuild từ đầu nếu index không khớp chain"""
+        try:
+            # Hai thread cùng sync sẽ cộng trùng bảng tổng hợp -> chỉ một thread cập nhật index
+            with self.index_lock:
+                index = self.get_employee_index()
+                tip_index, tip_hash = index.get_tip()
+                if 0 <= tip_index < len(self.chain) and self.chain[tip_index].hash == tip_hash:
+                    start = tip_index + 1
+                else:
+                    index.clear()
+                    start = 0
+
+                index.add_blocks([
+                    (block, [self.get_decoded_transaction(block, i) for i in range(len(block.transactions))])
+                    for block in self.chain[start:]
+                ])
+            return True
         except Exception as e:
-            print(f"Transaction decode error: {e}")
-            return None
+            print(f"Error syncing employee index: {e}")
+            return False
+
+    def get_payroll_totals(self):
+        """(số transaction, tổng lương) toàn chain từ bảng tổng hợp theo tháng, không giải mã lại chain"""
+        self.sync_employee_index()
+        rows = self.get_employee_index().monthly_totals()
+        return sum(row[1] for row in rows), sum(row[2] for row in rows)
+
+    def rebuild_employee_index(self):
+        """Xóa và dựng lại toàn bộ index employee/month và bảng tổng hợp theo tháng từ chain"""
+        self.get_employee_index().clear()
+        return self.sync_employee_index()
+
+    def get_employee_transactions(self, employee_id, month=None):
+        """Lấy (block, tx_index, tx_dict) của một nhân viên qua index - O(số kết quả)"""
+        self.sync_employee_index()
+        results = []
+        for block_index, tx_index in self.get_employee_index().lookup(employee_id, month):
+            block = self.chain[block_index]
+            results.append((block, tx_index, self.get_decoded_transaction(block, tx_index)))
+        return results
+
+    def _decode_transaction(self, tx_data, crypto=None):
+        """Helper function để decode transaction với error handling tốt hơn"""
+        return decode_transaction(tx_data, crypto)
 
     def validate_and_fix_blockchain(self):
         """Kiểm tra và sửa các transaction bị lỗi trong blockchain"""
         print("Validating and fixing blockchain...")
         
         try:
-            from backend.crypto_utils import CryptoUtils
-            crypto = CryptoUtils()
+            self.get_crypto()
         except:
             print("Cannot load crypto utils")
             return False
@@ -492,21 +1072,16 @@ class Blockchain:
         fixed_count = 0
         error_count = 0
         
-        for block_idx, block in enumerate(self.chain):
-            for tx_idx, tx_data in enumerate(block.transactions):
-                try:
-                    # Thử decode transaction
-                    decoded = self._decode_transaction(tx_data, crypto)
-                    if decoded is None:
-                        error_count += 1
-                        print(f"Cannot decode transaction in block {block_idx}, tx {tx_idx}")
-                    else:
-                        fixed_count += 1
-                except Exception as e:
-                    error_count += 1
-                    print(f"Error in block {block_idx}, tx {tx_idx}: {e}")
+        # Giải mã cả chain (song song khi chain lớn)
+        for block, tx_idx, decoded in self.parallel_scan():
+            if decoded is None:
+                error_count += 1
+                print(f"Cannot decode transaction in block {block.index}, tx {tx_idx}")
+            else:
+                fixed_count += 1
         
-        print(f"Validation complete: {fixed_count} valid, {error_count} errors")
+        print(f"Validation complete: {fixed_count} valid, {error_count} errors, "
+              f"{len(self.get_quarantined_transactions())} quarantined")
         return error_count == 0
 
 
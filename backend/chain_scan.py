@@ -0,0 +1,64 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from backend.crypto_utils import CryptoUtils
+from backend.tx_decoder import try_decode_many
+
+# Số transaction tối thiểu mỗi task gửi cho worker (gom nhiều block nhỏ vào một task)
+TASK_TRANSACTIONS = 2000
+
+_worker_state = {}
+
+
+def _init_worker(key, iv):
+    # Mỗi worker có CryptoUtils/cipher riêng, không đọc lại file key
+    _worker_state['crypto'] = CryptoUtils.from_key(key, iv)
+
+
+def _decode_blocks(blocks_transactions):
+    """blocks_transactions: list (transactions, mã định dạng đã biết hoặc None) của từng block
+    -> list kết quả try_decode (tx_dict, mã định dạng, lỗi) của từng block.
+    Transaction của cả task được giải mã một lô (decrypt_many) rồi chia lại theo block."""
+    transactions, formats, counts = [], [], []
+    for block_transactions, block_formats in blocks_transactions:
+        transactions.extend(block_transactions)
+        formats.extend(block_formats or [None] * len(block_transactions))
+        counts.append(len(block_transactions))
+
+    decoded = try_decode_many(transactions, _worker_state['crypto'], formats)
+    results, start = [], 0
+    for count in counts:
+        results.append(decoded[start:start + count])
+        start += count
+    return results
+
+
+def _make_tasks(blocks, task_transactions, known_formats):
+    """Chia các block liên tiếp thành task có khoảng task_transactions transaction"""
+    task, count = [], 0
+    for block in blocks:
+        task.append((list(block.transactions), known_formats.get(block.hash)))
+        count += block.tx_count
+        if count >= task_transactions:
+            yield task
+            task, count = [], 0
+    if task:
+        yield task
+
+
+def default_workers():
+    return os.cpu_count() or 1
+
+
+def scan_parallel(blocks, key, iv, workers=None, task_transactions=TASK_TRANSACTIONS, known_formats=None):
+    """Giải mã transaction của các block bằng ProcessPoolExecutor.
+    known_formats: {block_hash: mã định dạng từng tx} từ lần quét trước, worker đi thẳng đúng đường giải mã.
+    Trả về list kết quả (tx_dict, mã định dạng, lỗi) của từng block, cùng thứ tự với blocks."""
+    workers = workers or default_workers()
+    results = []
+    tasks = _make_tasks(blocks, task_transactions, known_formats or {})
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(key, iv)) as executor:
+        # map giữ nguyên thứ tự task nên kết quả ghép lại đúng thứ tự chain
+        for decoded_blocks in executor.map(_decode_blocks, tasks):
+            results.extend(decoded_blocks)
+    return results
@@ -0,0 +1,503 @@
+from array import array
+import base64
+import binascii
+import json
+import mmap
+import os
+import struct
+import threading
+import zlib
+from collections import OrderedDict
+
+from backend.tx_envelope import ENVELOPE_PREFIX
+
+# Số block đọc từ file mà LazyChain giữ lại (cửa sổ gần tip), ngoài các block append lúc chạy
+LAZY_CACHE_SIZE = 1024
+
+
+class LazyChain:
+    """Chain dạng sequence đọc lười từ mmap: khi mở chỉ giữ bảng offset của các block,
+    Block chỉ được dựng khi truy cập. Block đọc từ file giữ trong cache LRU có giới hạn (cửa sổ gần tip),
+    duyệt/slice cả chain không đưa block vào cache. Block append sau khi mở và block cuối trong file luôn được giữ.
+    Hỗ trợ len(), index, slice, duyệt và append."""
+
+    def __init__(self, path, bounds, decode_record, make_block, cache_size=LAZY_CACHE_SIZE):
+        # bounds: array offset, block i nằm trong [bounds[i], bounds[i + 1])
+        self.path = path
+        self._bounds = bounds
+        self._decode_record = decode_record
+        self._make_block = make_block
+        self._stored_count = max(len(bounds) - 1, 0)
+        self._cache_size = cache_size
+        self._cache = OrderedDict()  # index -> Block đọc từ file, cũ nhất ở đầu
+        self._cache_lock = threading.Lock()
+        self._last_stored = None  # Block cuối trong file (tip khi chưa append), giữ để tip luôn là cùng một object
+        self._appended = []  # Block append sau khi mở: không có trong mmap nên phải giữ
+        self._mmap = None
+        if self._stored_count:
+            with open(path, 'rb') as f:
+                self._mmap = mmap.mmap(f.fileno(), bounds[-1], access=mmap.ACCESS_READ)
+
+    def __len__(self):
+        return self._stored_count + len(self._appended)
+
+    def _load(self, index, cache=True):
+        if index >= self._stored_count:
+            return self._appended[index - self._stored_count]
+        if index == self._stored_count - 1 and self._last_stored is not None:
+            return self._last_stored
+        with self._cache_lock:
+            block = self._cache.get(index)
+            if block is not None:
+                self._cache.move_to_end(index)
+                return block
+
+        data = self._decode_record(self._mmap, self._bounds[index], self._bounds[index + 1])
+        block = self._make_block(data)
+        with self._cache_lock:
+            if index == self._stored_count - 1:
+                if self._last_stored is None:
+                    self._last_stored = block
+                return self._last_stored
+            if not cache:
+                return block
+            # Thread khác có thể vừa dựng cùng block: dùng object đã có trong cache
+            block = self._cache.setdefault(index, block)
+            self._cache.move_to_end(index)
+            while len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
+        return block
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._load(i, cache=False) for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if index < 0 or index >= len(self):
+            raise IndexError("chain index out of range")
+        return self._load(index)
+
+    def __iter__(self):
+        # Duyệt cả chain (verify, scan, thống kê) không giữ lại block đã đọc
+        for i in range(len(self)):
+            yield self._load(i, cache=False)
+
+    def append(self, block):
+        # Block mới đã được ghi nối bởi storage, chỉ cần giữ trong bộ nhớ
+        self._appended.append(block)
+
+    def truncate(self, length):
+        """Bỏ các block từ vị trí length trở đi (rollback block chưa ghi được xuống file)"""
+        if length >= self._stored_count:
+            del self._appended[length - self._stored_count:]
+            return
+        with self._cache_lock:
+            self._appended = []
+            self._stored_count = length
+            self._last_stored = None
+            for index in [i for i in self._cache if i >= length]:
+                del self._cache[index]
+
+    def loaded_count(self):
+        """Số block đang được giữ dạng object"""
+        with self._cache_lock:
+            return len(self._cache) + len(self._appended) + (self._last_stored is not None)
+
+    def close(self):
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+
+
+class JsonChainStorage:
+    """Lưu toàn bộ chain trong một file JSON (định dạng cũ, ghi lại cả file mỗi lần lưu)"""
+
+    mode = "json"
+
+    def __init__(self, path):
+        self.path = path
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def load(self):
+        """Đọc toàn bộ danh sách block dict từ file"""
+        with open(self.path, 'r') as f:
+            data = json.load(f)
+        return data or []
+
+    def write_all(self, blocks):
+        """Ghi lại toàn bộ chain (qua file tạm rồi rename để đảm bảo atomic)"""
+        data = [block.to_dict() for block in blocks]
+        temp_file = self.path + ".tmp"
+        with open(temp_file, 'w') as f:
+            json.dump(data, f, indent=2)
+        os.replace(temp_file, self.path)
+
+    def append(self, block, blocks):
+        # Định dạng JSON không hỗ trợ ghi nối, phải ghi lại cả chain
+        self.write_all(blocks)
+
+
+class LogChainStorage:
+    """Lưu chain dạng append-only JSON-lines: mỗi block là một dòng, chỉ ghi nối block mới"""
+
+    mode = "log"
+
+    def __init__(self, path):
+        self.path = path
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def load(self):
+        """Replay log, bỏ qua (và cắt bỏ) dòng cuối bị ghi dở nếu có"""
+        blocks = []
+        valid_size = 0
+        with open(self.path, 'rb') as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    print(f"Bỏ qua record ghi dở ở cuối {self.path}")
+                    break
+                try:
+                    blocks.append(json.loads(line))
+                except ValueError:
+                    print(f"Record hỏng ở cuối {self.path}, dừng replay tại block {len(blocks)}")
+                    break
+                valid_size += len(line)
+
+        if valid_size != os.path.getsize(self.path):
+            with open(self.path, 'r+b') as f:
+                f.truncate(valid_size)
+        return blocks
+
+    @staticmethod
+    def encode_record(block):
+        if hasattr(block, 'encode'):
+            return block.encode() + b"\n"  # Encoding chuẩn của Block (không cache bytes, chỉ cache kích thước)
+        return (json.dumps(block.to_dict(), separators=(',', ':')) + "\n").encode('utf-8')
+
+    @staticmethod
+    def _decode_line(view, start, end):
+        return json.loads(view[start:end])
+
+    def open_lazy(self, make_block):
+        """Mở chain dạng LazyChain: chỉ quét vị trí xuống dòng, không parse JSON của từng block.
+        Chỉ record cuối được kiểm tra (ghi dở/hỏng thì cắt bỏ như load())."""
+        bounds = array('q', [0])
+        size = os.path.getsize(self.path)
+        if size:
+            with open(self.path, 'rb') as f:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                    position = mapped.find(b"\n")
+                    while position != -1:
+                        bounds.append(position + 1)
+                        position = mapped.find(b"\n", position + 1)
+                    if len(bounds) > 1:
+                        try:
+                            json.loads(mapped[bounds[-2]:bounds[-1]])
+                        except ValueError:
+                            print(f"Record hỏng ở cuối {self.path}, bỏ qua block {len(bounds) - 2}")
+                            bounds.pop()
+
+        if bounds[-1] != size:
+            print(f"Bỏ qua record ghi dở ở cuối {self.path}")
+            with open(self.path, 'r+b') as f:
+                f.truncate(bounds[-1])
+        return LazyChain(self.path, bounds, self._decode_line, make_block)
+
+    def write_all(self, blocks):
+        """Ghi lại toàn bộ log (dùng cho restore/migrate), atomic qua file tạm"""
+        temp_file = self.path + ".tmp"
+        with open(temp_file, 'wb') as f:
+            for block in blocks:
+                f.write(self.encode_record(block))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_file, self.path)
+
+    def append(self, block, blocks=None):
+        """Ghi nối một block vào cuối log - O(kích thước block)"""
+        self.append_many([block])
+
+    def append_many(self, new_blocks):
+        """Ghi nối nhiều block liên tiếp với một lần fsync. Lỗi giữa chừng thì cắt bỏ phần đã ghi dở rồi ném lỗi."""
+        with open(self.path, 'ab') as f:
+            start = f.tell()
+            try:
+                f.write(b"".join(self.encode_record(block) for block in new_blocks))
+                f.flush()
+                os.fsync(f.fileno())
+            except Exception:
+                # Không để record hỏng ở cuối file: lần ghi nối sau sẽ nằm sau nó và không load lại được
+                f.truncate(start)
+                raise
+
+
+class BinaryChainStorage:
+    """Lưu chain dạng nhị phân append-only: header cố định + ciphertext thô (không base64, không JSON).
+    File: MAGIC, sau đó mỗi block là một record [độ dài body, crc32][body].
+    Body: BLOCK_HEADER, previous_hash, hash, rồi từng transaction [kind, độ dài][dữ liệu]."""
+
+    mode = "binary"
+
+    MAGIC = b"BCHAIN\x00\x01"
+    RECORD_HEADER = struct.Struct('>II')        # độ dài body, crc32 của body
+    BLOCK_HEADER = struct.Struct('>HBQdQI')     # version, flags, index, timestamp, nonce, số transaction
+    TX_HEADER = struct.Struct('>BI')            # kind, độ dài dữ liệu
+    HASH_LENGTH = struct.Struct('>H')
+
+    FLAG_INT_TIMESTAMP = 0x01
+
+    # Loại transaction: ciphertext base64 (CBC cũ / envelope "v2:") lưu dạng byte thô, chuỗi khác lưu utf-8, còn lại lưu JSON
+    TX_CIPHERTEXT = 0
+    TX_TEXT = 1
+    TX_JSON = 2
+    TX_SEALED = 3
+
+    # Hash hex 64 ký tự lưu 32 byte, giá trị khác (vd previous_hash "0" của genesis) lưu dạng chuỗi
+    HASH_DIGEST = 0
+    HASH_TEXT = 1
+
+    def __init__(self, path):
+        self.path = path
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    @classmethod
+    def _encode_hash(cls, value):
+        if len(value) == 64:
+            try:
+                digest = bytes.fromhex(value)
+                if digest.hex() == value:
+                    return bytes([cls.HASH_DIGEST]) + digest
+            except ValueError:
+                pass
+        data = value.encode('utf-8')
+        return bytes([cls.HASH_TEXT]) + cls.HASH_LENGTH.pack(len(data)) + data
+
+    @classmethod
+    def _decode_hash(cls, view, offset):
+        kind = view[offset]
+        offset += 1
+        if kind == cls.HASH_DIGEST:
+            return bytes(view[offset:offset + 32]).hex(), offset + 32
+        (length,) = cls.HASH_LENGTH.unpack_from(view, offset)
+        offset += cls.HASH_LENGTH.size
+        return bytes(view[offset:offset + length]).decode('utf-8'), offset + length
+
+    @classmethod
+    def encode_transaction(cls, tx):
+        if isinstance(tx, str):
+            kind, encoded = cls.TX_CIPHERTEXT, tx
+            if tx.startswith(ENVELOPE_PREFIX):
+                kind, encoded = cls.TX_SEALED, tx[len(ENVELOPE_PREFIX):]
+            try:
+                raw = base64.b64decode(encoded, validate=True)
+                if base64.b64encode(raw).decode('ascii') == encoded:
+                    return kind, raw
+            except (binascii.Error, ValueError):
+                pass
+            return cls.TX_TEXT, tx.encode('utf-8')
+        return cls.TX_JSON, json.dumps(tx, separators=(',', ':')).encode('utf-8')
+
+    @classmethod
+    def decode_transaction(cls, kind, data):
+        """Chuyển dữ liệu transaction trong file về đúng giá trị gốc trong block"""
+        if kind == cls.TX_CIPHERTEXT:
+            return binascii.b2a_base64(data, newline=False).decode('ascii')
+        if kind == cls.TX_SEALED:
+            return ENVELOPE_PREFIX + binascii.b2a_base64(data, newline=False).decode('ascii')
+        if kind == cls.TX_TEXT:
+            return bytes(data).decode('utf-8')
+        return json.loads(bytes(data))
+
+    @classmethod
+    def encode_record(cls, block):
+        timestamp = block.timestamp
+        flags = cls.FLAG_INT_TIMESTAMP if isinstance(timestamp, int) else 0
+        parts = [
+            cls.BLOCK_HEADER.pack(block.version, flags, block.index, float(timestamp),
+                                  block.nonce, len(block.transactions)),
+            cls._encode_hash(block.previous_hash),
+            cls._encode_hash(block.hash)
+        ]
+        if hasattr(block, 'raw_transactions'):
+            raw_transactions = block.raw_transactions()
+        else:
+            raw_transactions = (cls.encode_transaction(tx) for tx in block.transactions)
+        for kind, data in raw_transactions:
+            parts.append(cls.TX_HEADER.pack(kind, len(data)))
+            parts.append(data)
+
+        body = b"".join(parts)
+        return cls.RECORD_HEADER.pack(len(body), zlib.crc32(body)) + body
+
+    @classmethod
+    def decode_record(cls, view, offset, raw=False):
+        """Đọc block dict từ record bắt đầu tại offset (offset trỏ vào body).
+        raw=True: thay "transactions" bằng "raw_transactions" = list (kind, memoryview) trỏ thẳng vào buffer,
+        không copy/base64 (Block.from_dict nhận được cả hai dạng)."""
+        version, flags, index, timestamp, nonce, tx_count = cls.BLOCK_HEADER.unpack_from(view, offset)
+        offset += cls.BLOCK_HEADER.size
+        previous_hash, offset = cls._decode_hash(view, offset)
+        block_hash, offset = cls._decode_hash(view, offset)
+
+        transactions = []
+        for _ in range(tx_count):
+            kind, length = cls.TX_HEADER.unpack_from(view, offset)
+            offset += cls.TX_HEADER.size
+            data = view[offset:offset + length]
+            offset += length
+            transactions.append((kind, data) if raw else cls.decode_transaction(kind, data))
+
+        if flags & cls.FLAG_INT_TIMESTAMP:
+            timestamp = int(timestamp)
+        return {
+            "index": index,
+            "timestamp": timestamp,
+            "raw_transactions" if raw else "transactions": transactions,
+            "previous_hash": previous_hash,
+            "hash": block_hash,
+            "nonce": nonce,
+            "version": version
+        }
+
+    @classmethod
+    def scan_records(cls, view, verify_crc=True):
+        """Duyệt buffer, trả về (list offset body của các record hợp lệ, số byte hợp lệ).
+        Dừng ở record cuối bị ghi dở hoặc sai crc (verify_crc=False: chỉ kiểm tra độ dài)."""
+        if len(view) < len(cls.MAGIC):
+            return [], 0
+        if bytes(view[:len(cls.MAGIC)]) != cls.MAGIC:
+            raise Exception("File blockchain nhị phân không đúng định dạng")
+
+        offsets = []
+        offset = len(cls.MAGIC)
+        total = len(view)
+        while offset + cls.RECORD_HEADER.size <= total:
+            length, crc = cls.RECORD_HEADER.unpack_from(view, offset)
+            body_start = offset + cls.RECORD_HEADER.size
+            if body_start + length > total:
+                break
+            if verify_crc and zlib.crc32(view[body_start:body_start + length]) != crc:
+                break
+            offsets.append(body_start)
+            offset = body_start + length
+        return offsets, offset
+
+    def load(self, raw=False):
+        """Đọc toàn bộ block dict qua mmap, cắt bỏ record ghi dở ở cuối nếu có.
+        raw=True: raw_transactions là (kind, memoryview) trỏ vào một buffer chung, không tạo chuỗi base64."""
+        size = os.path.getsize(self.path)
+        if size == 0:
+            return []
+
+        with open(self.path, 'rb') as f:
+            if raw:
+                # memoryview phải sống lâu hơn file nên đọc vào một bytes dùng chung thay vì mmap
+                view = memoryview(f.read())
+                offsets, valid_size = self.scan_records(view)
+                blocks = [self.decode_record(view, offset, raw=True) for offset in offsets]
+            else:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                    view = memoryview(mapped)
+                    try:
+                        offsets, valid_size = self.scan_records(view)
+                        blocks = [self.decode_record(view, offset) for offset in offsets]
+                    finally:
+                        view.release()
+
+        if valid_size != size:
+            print(f"Bỏ qua record ghi dở ở cuối {self.path}")
+            with open(self.path, 'r+b') as f:
+                f.truncate(valid_size)
+        return blocks
+
+    @classmethod
+    def _decode_body(cls, view, start, end):
+        return cls.decode_record(view, start, raw=True)
+
+    def open_lazy(self, make_block):
+        """Mở chain dạng LazyChain: chỉ đọc header độ dài để dựng bảng offset,
+        crc chỉ kiểm tra ở record cuối (các record trước đã fsync khi ghi)."""
+        bounds = array('q')
+        valid_size = 0
+        size = os.path.getsize(self.path)
+        if size:
+            with open(self.path, 'rb') as f:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                    offsets, valid_size = self.scan_records(mapped, verify_crc=False)
+                    if offsets:
+                        last = offsets[-1]
+                        length, crc = self.RECORD_HEADER.unpack_from(mapped, last - self.RECORD_HEADER.size)
+                        if zlib.crc32(mapped[last:last + length]) != crc:
+                            print(f"Record hỏng ở cuối {self.path}, bỏ qua block {len(offsets) - 1}")
+                            valid_size = last - self.RECORD_HEADER.size
+                            offsets.pop()
+
+            # bounds[i] = đầu body của block i, phần tử cuối = cuối record cuối
+            bounds.extend(offsets)
+            bounds.append(valid_size)
+            if valid_size != size:
+                print(f"Bỏ qua record ghi dở ở cuối {self.path}")
+                with open(self.path, 'r+b') as f:
+                    f.truncate(valid_size)
+        return LazyChain(self.path, bounds, self._decode_body, make_block)
+
+    def write_all(self, blocks):
+        """Ghi lại toàn bộ file (dùng cho restore/migrate), atomic qua file tạm"""
+        temp_file = self.path + ".tmp"
+        with open(temp_file, 'wb') as f:
+            f.write(self.MAGIC)
+            for block in blocks:
+                f.write(self.encode_record(block))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_file, self.path)
+
+    def append(self, block, blocks=None):
+        """Ghi nối một block vào cuối file - O(kích thước block)"""
+        self.append_many([block])
+
+    def append_many(self, new_blocks):
+        """Ghi nối nhiều block liên tiếp với một lần fsync. Lỗi giữa chừng thì cắt bỏ phần đã ghi dở rồi ném lỗi."""
+        with open(self.path, 'ab') as f:
+            start = f.tell()
+            try:
+                if start == 0:
+                    f.write(self.MAGIC)
+                f.write(b"".join(self.encode_record(block) for block in new_blocks))
+                f.flush()
+                os.fsync(f.fileno())
+            except Exception:
+                f.truncate(start)
+                raise
+
+
+STORAGE_BACKENDS = {
+    JsonChainStorage.mode: JsonChainStorage,
+    LogChainStorage.mode: LogChainStorage,
+    BinaryChainStorage.mode: BinaryChainStorage,
+}
+
+STORAGE_FILES = {
+    "json": ("blockchain.json", "blockchain_backup.json"),
+    "log": ("blockchain.jsonl", "blockchain_backup.jsonl"),
+    "binary": ("blockchain.bin", "blockchain_backup.bin"),
+}
+
+
+def detect_storage_mode():
+    """Tự chọn chế độ lưu theo file đã migrate: binary (blockchain.bin), log (blockchain.jsonl), ngược lại JSON"""
+    for mode in ("binary", "log"):
+        if os.path.exists(STORAGE_FILES[mode][0]):
+            return mode
+    return "json"
+
+
+def create_storage(mode, path):
+    if mode not in STORAGE_BACKENDS:
+        raise Exception(f"Chế độ lưu blockchain không hợp lệ: {mode}")
+    return STORAGE_BACKENDS[mode](path)
@@ -0,0 +1,50 @@
+import queue
+import threading
+
+
+class ChainWriter:
+    """Thread ghi file duy nhất của một Blockchain: ghi nối block, ghi lại cả chain, backup, checkpoint
+    đều chạy lần lượt trên thread này theo đúng thứ tự được đưa vào hàng đợi."""
+
+    def __init__(self, name="chain-writer"):
+        self.name = name
+        self._jobs = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def _ensure_started(self):
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            job, done, result = self._jobs.get()
+            try:
+                result['value'] = job()
+            except Exception as e:
+                result['error'] = e
+            finally:
+                done.set()
+
+    def in_writer_thread(self):
+        return threading.current_thread() is self._thread
+
+    def submit(self, job):
+        """Đưa job vào hàng đợi ghi, trả về (event báo xong, dict kết quả 'value'/'error')"""
+        done, result = threading.Event(), {}
+        self._ensure_started()
+        self._jobs.put((job, done, result))
+        return done, result
+
+    def run(self, job, timeout=None):
+        """Chạy job trên thread ghi và chờ kết quả; gọi từ chính thread ghi thì chạy luôn"""
+        if self.in_writer_thread():
+            return job()
+        done, result = self.submit(job)
+        if not done.wait(timeout):
+            raise Exception("Quá thời gian chờ ghi blockchain")
+        if 'error' in result:
+            raise result['error']
+        return result.get('value')
@@ -1,18 +1,47 @@
 import json
 import base64
+import hashlib
 import os
+import threading
 
 from cryptography.hazmat.primitives import hashes, serialization
 from cryptography.hazmat.primitives.asymmetric import rsa, padding
 from cryptography.hazmat.backends import default_backend
 from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
 from cryptography.hazmat.primitives.ciphers.algorithms import AES
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+from cryptography.exceptions import InvalidTag
+
+# AES-GCM cho envelope transaction: nonce 96 bit ngẫu nhiên mỗi bản ghi, tag 128 bit
+GCM_NONCE_SIZE = 12
+GCM_TAG_SIZE = 16
+# Key GCM được dẫn xuất từ aes_key (HKDF), không dùng chung trực tiếp với key CBC
+AEAD_KEY_INFO = b"payroll transaction envelope v2"
 
 class CryptoUtils:
     def __init__(self):
         self.key_file = 'crypto_keys.json'
         self.load_or_create_keys()
 
+    @classmethod
+    def from_key(cls, key, iv):
+        """CryptoUtils chỉ có key AES, không đọc/ghi file key (dùng trong worker process)"""
+        crypto = cls.__new__(cls)
+        crypto.key_file = None
+        crypto.key = key
+        crypto.iv = iv
+        crypto.rsa_private_key = None
+        return crypto
+
+    def _get_cipher(self):
+        """Cipher AES-CBC dựng một lần cho (key, iv) hiện tại, mỗi lần mã hóa/giải mã chỉ tạo context mới"""
+        cached = getattr(self, '_cipher', None)
+        if cached is None or cached[0] != (self.key, self.iv):
+            cipher = Cipher(algorithms.AES(self.key), modes.CBC(self.iv), backend=default_backend())
+            cached = self._cipher = ((self.key, self.iv), cipher)
+        return cached[1]
+
     def load_or_create_keys(self):
         try:
             with open(self.key_file, 'r') as f:
@@ -48,6 +77,84 @@ class CryptoUtils:
         with open(self.key_file, 'w') as f:
             json.dump(data, f)
 
+    def _get_aead_key(self):
+        """Key AES-256 cho GCM, dẫn xuất một lần từ aes_key hiện tại"""
+        cached = getattr(self, '_aead_key', None)
+        if cached is None or cached[0] != self.key:
+            aead_key = HKDF(algorithm=hashes.SHA256(), length=32, salt=None,
+                            info=AEAD_KEY_INFO, backend=default_backend()).derive(self.key)
+            cached = self._aead_key = (self.key, aead_key, AESGCM(aead_key))
+        return cached
+
+    def aead_encrypt(self, data, associated_data=b""):
+        """Mã hóa AES-GCM một lần: trả về nonce || ciphertext || tag (nonce mới cho mỗi bản ghi)"""
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        nonce = os.urandom(GCM_NONCE_SIZE)
+        return nonce + self._get_aead_key()[2].encrypt(nonce, data, associated_data)
+
+    def aead_decrypt(self, envelope, associated_data=b""):
+        """Giải mã và xác thực nonce || ciphertext || tag, trả về bytes"""
+        try:
+            envelope = bytes(envelope)
+            return self._get_aead_key()[2].decrypt(envelope[:GCM_NONCE_SIZE], envelope[GCM_NONCE_SIZE:], associated_data)
+        except InvalidTag:
+            raise Exception("❌ Giải mã thất bại: dữ liệu bị sửa hoặc sai key (GCM tag không khớp)")
+
+    def encrypt_many(self, payloads, associated_data=b""):
+        """Mã hóa AES-GCM cả lô: lấy AESGCM một lần và sinh nonce cho cả lô bằng một lần os.urandom.
+        Trả về list nonce || ciphertext || tag cùng thứ tự (mỗi bản ghi vẫn có nonce ngẫu nhiên riêng)."""
+        payloads = list(payloads)
+        encrypt = self._get_aead_key()[2].encrypt
+        nonces = os.urandom(GCM_NONCE_SIZE * len(payloads))
+        results = []
+        for i, data in enumerate(payloads):
+            if isinstance(data, str):
+                data = data.encode('utf-8')
+            nonce = nonces[i * GCM_NONCE_SIZE:(i + 1) * GCM_NONCE_SIZE]
+            results.append(nonce + encrypt(nonce, data, associated_data))
+        return results
+
+    def decrypt_many(self, envelopes, associated_data=b""):
+        """Giải mã AES-GCM cả lô nonce || ciphertext || tag, lấy AESGCM một lần cho cả lô.
+        Trả về list (bytes, None) hoặc (None, lỗi) cùng thứ tự: bản ghi hỏng không làm hỏng cả lô."""
+        decrypt = self._get_aead_key()[2].decrypt
+        results = []
+        for envelope in envelopes:
+            if len(envelope) < GCM_NONCE_SIZE + GCM_TAG_SIZE:
+                results.append((None, "Envelope quá ngắn"))
+                continue
+            try:
+                results.append((decrypt(envelope[:GCM_NONCE_SIZE], envelope[GCM_NONCE_SIZE:], associated_data), None))
+            except InvalidTag:
+                results.append((None, "❌ Giải mã thất bại: dữ liệu bị sửa hoặc sai key (GCM tag không khớp)"))
+        return results
+
+    def aead_encryptor(self, associated_data=b""):
+        """Mã hóa AES-GCM dạng stream cho payload lớn: trả về (nonce, encryptor).
+        Gọi encryptor.update(chunk) cho từng phần, encryptor.finalize(), rồi lấy encryptor.tag."""
+        nonce = os.urandom(GCM_NONCE_SIZE)
+        encryptor = Cipher(algorithms.AES(self._get_aead_key()[1]), modes.GCM(nonce), backend=default_backend()).encryptor()
+        encryptor.authenticate_additional_data(associated_data)
+        return nonce, encryptor
+
+    def aead_decryptor(self, nonce, tag, associated_data=b""):
+        """Giải mã AES-GCM dạng stream: decryptor.update(chunk) từng phần, finalize() kiểm tra tag (InvalidTag nếu sai)"""
+        decryptor = Cipher(algorithms.AES(self._get_aead_key()[1]), modes.GCM(nonce, tag), backend=default_backend()).decryptor()
+        decryptor.authenticate_additional_data(associated_data)
+        return decryptor
+
+    def legacy_decrypt(self, encrypted_data):
+        """Giải mã bản ghi AES-CBC cũ (iv cố định) trong một lượt.
+        Bỏ PKCS7 padding nếu hợp lệ, không thì giữ nguyên (bản ghi rất cũ đệm bằng khoảng trắng)."""
+        decryptor = self._get_cipher().decryptor()
+        decrypted = decryptor.update(encrypted_data) + decryptor.finalize()
+        padding_length = decrypted[-1] if decrypted else 0
+        if 0 < padding_length <= min(len(decrypted), algorithms.AES.block_size) and \
+                decrypted[-padding_length:] == bytes((padding_length,)) * padding_length:
+            decrypted = decrypted[:-padding_length]
+        return decrypted.decode('utf-8')
+
     def pkcs7_pad(self, data: bytes) -> bytes:
         """Thêm padding để data dài đúng block size (AES = 16 bytes)"""
         block_size = algorithms.AES.block_size  
@@ -80,8 +187,7 @@ class CryptoUtils:
     def aes_decrypt(self, encrypted_data):
         """Giải mã dữ liệu AES với PKCS7 padding"""
         try:
-            cipher = Cipher(algorithms.AES(self.key), modes.CBC(self.iv), backend=default_backend())
-            decryptor = cipher.decryptor()
+            decryptor = self._get_cipher().decryptor()
 
             # Giải mã
             decrypted_padded = decryptor.update(encrypted_data) + decryptor.finalize()
@@ -99,8 +205,7 @@ class CryptoUtils:
     def aes_encrypt(self, data):
         """Mã hóa AES với PKCS7 padding chuẩn"""
         try:
-            cipher = Cipher(algorithms.AES(self.key), modes.CBC(self.iv), backend=default_backend())
-            encryptor = cipher.encryptor()
+            encryptor = self._get_cipher().encryptor()
 
             # Chuyển string thành bytes nếu cần
             if isinstance(data, str):
@@ -156,9 +261,48 @@ class CryptoUtils:
         }
 
 
-def verify_signature(public_key_pem, message, signature_b64):
-    try:
+class PublicKeyCache:
+    """Cache public key đã parse theo user, kèm fingerprint của PEM.
+    PEM trong DB đổi (update_key.py, insert_public_key.py, /create_user) thì fingerprint đổi và key được load lại."""
+
+    def __init__(self):
+        self._keys = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def fingerprint(public_key_pem):
+        return hashlib.sha256(public_key_pem.encode()).hexdigest()
+
+    def get(self, user_id, public_key_pem):
+        fingerprint = self.fingerprint(public_key_pem)
+        entry = self._keys.get(user_id)
+        if entry is not None and entry[0] == fingerprint:
+            return entry[1]
+
         public_key = serialization.load_pem_public_key(public_key_pem.encode())
+        with self._lock:
+            self._keys[user_id] = (fingerprint, public_key)
+        return public_key
+
+    def invalidate(self, user_id=None):
+        """Xóa key đã cache của một user (hoặc tất cả nếu user_id=None)"""
+        with self._lock:
+            if user_id is None:
+                self._keys.clear()
+            else:
+                self._keys.pop(user_id, None)
+
+
+public_key_cache = PublicKeyCache()
+
+
+def verify_signature(public_key_pem, message, signature_b64, user_id=None):
+    try:
+        # Có user_id thì dùng public key đã parse trong cache
+        if user_id is not None:
+            public_key = public_key_cache.get(user_id, public_key_pem)
+        else:
+            public_key = serialization.load_pem_public_key(public_key_pem.encode())
 
         public_key.verify(
             base64.b64decode(signature_b64),
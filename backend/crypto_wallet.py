@@ -1,7 +1,7 @@
 import requests
 import json
 from decimal import Decimal
-import sqlite3
+from backend.db import get_connection
 from datetime import datetime
 
 class CryptoWallet:
@@ -11,7 +11,7 @@ class CryptoWallet:
     
     def init_wallet_db(self):
         """Khởi tạo bảng ví crypto"""
-        conn = sqlite3.connect('payroll.db')
+        conn = get_connection()
         c = conn.cursor()
         
         c.execute('''CREATE TABLE IF NOT EXISTS crypto_wallets
@@ -41,7 +41,7 @@ class CryptoWallet:
         import secrets
         wallet_address = "0x" + secrets.token_hex(20)
         
-        conn = sqlite3.connect('payroll.db')
+        conn = get_connection()
         c = conn.cursor()
         
         c.execute("INSERT INTO crypto_wallets (employee_id, wallet_address) VALUES (?, ?)",
@@ -58,7 +58,7 @@ class CryptoWallet:
     
     def send_salary(self, employee_id, amount_usd):
         """Gửi lương qua crypto (mô phỏng)"""
-        conn = sqlite3.connect('payroll.db')
+        conn = get_connection()
         c = conn.cursor()
         
         # Lấy thông tin ví
@@ -100,7 +100,7 @@ class CryptoWallet:
     
     def get_wallet_info(self, employee_id):
         """Lấy thông tin ví của nhân viên"""
-        conn = sqlite3.connect('payroll.db')
+        conn = get_connection()
         c = conn.cursor()
         
         c.execute("""SELECT w.wallet_address, w.balance, 
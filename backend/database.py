@@ -1,8 +1,9 @@
-import sqlite3
+from backend.db import get_connection
 from backend.crypto_utils import CryptoUtils
+from backend.migrations import run_migrations
 
 def init_db():
-    conn = sqlite3.connect('payroll.db')
+    conn = get_connection()
     c = conn.cursor()
 
     # Tạo bảng employees
@@ -55,4 +56,7 @@ def init_db():
     public_key = crypto.get_public_key()
 
     conn.commit()
+
+    # Áp dụng các migration schema (index, cột month) còn thiếu
+    run_migrations(conn)
     conn.close()
\ No newline at end of file
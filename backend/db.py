@@ -0,0 +1,141 @@
+import os
+import sqlite3
+import threading
+
+DB_PATH = 'payroll.db'
+BUSY_TIMEOUT_MS = 5000
+MAX_IDLE_CONNECTIONS = 8
+STATEMENT_CACHE_SIZE = 256
+
+
+class PooledConnection:
+    """Bọc sqlite3.Connection: close() trả connection về pool thay vì đóng thật.
+    Dùng được với with: lỗi trong khối thì rollback, ra khỏi khối thì trả về pool (commit vẫn gọi tường minh)."""
+
+    def __init__(self, pool, raw):
+        self._pool = pool
+        self._raw = raw
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+    def cursor(self):
+        return self._raw.cursor()
+
+    def close(self):
+        self._pool.release(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        if exc_type is not None and self._raw.in_transaction:
+            self._raw.rollback()
+        self.close()
+        return False
+
+
+class ConnectionPool:
+    """Pool connection SQLite cho một file DB.
+    Mỗi thread dùng lại một connection (gọi lồng nhau trong cùng thread nhận cùng connection),
+    connection nhàn rỗi được giữ lại cho thread sau thay vì mở mới. Bật WAL để reader không chặn writer."""
+
+    def __init__(self, db_path, max_idle=MAX_IDLE_CONNECTIONS):
+        self.db_path = db_path
+        self.max_idle = max_idle
+        self._idle = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _create(self):
+        # cached_statements: sqlite3 giữ lại prepared statement theo câu SQL trên mỗi connection
+        conn = sqlite3.connect(self.db_path, timeout=BUSY_TIMEOUT_MS / 1000,
+                               check_same_thread=False, cached_statements=STATEMENT_CACHE_SIZE)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+        return conn
+
+    def acquire(self):
+        held = getattr(self._local, 'held', None)
+        if held is not None:
+            held[1] += 1
+            return held[0]
+
+        with self._lock:
+            raw = self._idle.pop() if self._idle else None
+        if raw is None:
+            raw = self._create()
+
+        wrapper = PooledConnection(self, raw)
+        self._local.held = [wrapper, 1]
+        return wrapper
+
+    def release(self, wrapper):
+        held = getattr(self._local, 'held', None)
+        if held is None or held[0] is not wrapper:
+            return  # đã trả rồi (close 2 lần)
+
+        held[1] -= 1
+        if held[1] > 0:
+            return
+        self._release_raw(wrapper._raw)
+
+    def release_thread(self):
+        """Trả connection thread hiện tại còn giữ (quên close do lỗi), bỏ qua số lần acquire lồng nhau"""
+        held = getattr(self._local, 'held', None)
+        if held is None:
+            return False
+        self._release_raw(held[0]._raw)
+        return True
+
+    def _release_raw(self, raw):
+        self._local.held = None
+        # Giống sqlite3 close(): bỏ các thay đổi chưa commit
+        if raw.in_transaction:
+            raw.rollback()
+
+        with self._lock:
+            if len(self._idle) < self.max_idle:
+                self._idle.append(raw)
+                return
+        raw.close()
+
+    def close_all(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for raw in idle:
+            raw.close()
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_connection(db_path=DB_PATH):
+    """Lấy connection dùng chung (WAL, busy_timeout) cho db_path.
+    Dùng `with get_connection() as conn:` (hoặc gọi conn.close()) để trả về pool kể cả khi có lỗi."""
+    key = os.path.abspath(db_path)
+    pool = _pools.get(key)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.setdefault(key, ConnectionPool(key))
+    return pool.acquire()
+
+
+def release_thread_connections():
+    """Rollback và trả về pool mọi connection thread hiện tại còn giữ (gọi cuối mỗi request)"""
+    with _pools_lock:
+        pools = list(_pools.values())
+    released = 0
+    for pool in pools:
+        if pool.release_thread():
+            released += 1
+    return released
+
+
+def close_all_connections():
+    with _pools_lock:
+        pools = list(_pools.values())
+    for pool in pools:
+        pool.close_all()
@@ -0,0 +1,91 @@
+import hashlib
+import json
+
+# Tiền tố phân biệt lá và node trong (tránh ghép node trong giả làm lá)
+LEAF_PREFIX = b"\x00"
+NODE_PREFIX = b"\x01"
+
+
+def hash_leaf(transaction):
+    data = json.dumps(transaction, sort_keys=True).encode()
+    return hashlib.sha256(LEAF_PREFIX + data).digest()
+
+
+def hash_node(left, right):
+    return hashlib.sha256(NODE_PREFIX + left + right).digest()
+
+
+def _next_level(level):
+    # Node lẻ cuối cùng được đưa thẳng lên tầng trên (không nhân đôi)
+    parents = [hash_node(level[i], level[i + 1]) for i in range(0, len(level) - 1, 2)]
+    if len(level) % 2 == 1:
+        parents.append(level[-1])
+    return parents
+
+
+def merkle_root(transactions):
+    """Merkle root (hex) của danh sách transaction, block rỗng dùng sha256 của chuỗi rỗng"""
+    if not transactions:
+        return hashlib.sha256(b"").hexdigest()
+
+    level = [hash_leaf(tx) for tx in transactions]
+    while len(level) > 1:
+        level = _next_level(level)
+    return level[0].hex()
+
+
+def merkle_proof(transactions, tx_index):
+    """Danh sách node anh em từ lá tx_index lên root: [{'hash': hex, 'position': 'left'|'right'}]"""
+    if tx_index < 0 or tx_index >= len(transactions):
+        raise Exception(f"Transaction {tx_index} không tồn tại trong block")
+
+    proof = []
+    level = [hash_leaf(tx) for tx in transactions]
+    position = tx_index
+    while len(level) > 1:
+        sibling = position ^ 1
+        if sibling < len(level):
+            proof.append({
+                'hash': level[sibling].hex(),
+                'position': 'left' if sibling < position else 'right'
+            })
+        level = _next_level(level)
+        position //= 2
+    return proof
+
+
+def verify_merkle_proof(transaction, proof, root):
+    """Kiểm tra transaction thuộc cây có merkle root = root theo proof"""
+    try:
+        current = hash_leaf(transaction)
+        for step in proof:
+            sibling = bytes.fromhex(step['hash'])
+            if step['position'] == 'left':
+                current = hash_node(sibling, current)
+            else:
+                current = hash_node(current, sibling)
+        return current.hex() == root
+    except (KeyError, TypeError, ValueError):
+        return False
+
+
+def block_header(version, index, timestamp, previous_hash, tx_root):
+    """Header được hash của block version >= 2 (nonce nối vào cuối), tx_root: digest/merkle root của transactions"""
+    return f"{version}|{index}|{timestamp!r}|{previous_hash}|{tx_root}|".encode()
+
+
+def verify_inclusion_proof(inclusion_proof):
+    """Kiểm tra proof do Blockchain.get_inclusion_proof trả về mà không cần tải chain:
+    transaction -> merkle root (qua proof) -> header + nonce -> block hash."""
+    try:
+        if not verify_merkle_proof(inclusion_proof['transaction'], inclusion_proof['proof'],
+                                   inclusion_proof['merkle_root']):
+            return False
+
+        header = inclusion_proof['header']
+        header_bytes = block_header(header['version'], header['index'], header['timestamp'],
+                                    header['previous_hash'], inclusion_proof['merkle_root'])
+        block_hash = hashlib.sha256(header_bytes + str(header['nonce']).encode()).hexdigest()
+        return block_hash == inclusion_proof['block_hash']
+    except (KeyError, TypeError):
+        return False
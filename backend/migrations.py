@@ -0,0 +1,81 @@
+import sqlite3
+
+# Mỗi migration là (version, mô tả, danh sách câu lệnh SQL). Version hiện tại lưu trong PRAGMA user_version.
+MIGRATIONS = [
+    (1, "Index (employee_id, date) và (date) cho attendance, kpi", [
+        "CREATE INDEX IF NOT EXISTS idx_attendance_employee_date ON attendance (employee_id, date)",
+        "CREATE INDEX IF NOT EXISTS idx_attendance_date ON attendance (date)",
+        "CREATE INDEX IF NOT EXISTS idx_kpi_employee_date ON kpi (employee_id, date)",
+        "CREATE INDEX IF NOT EXISTS idx_kpi_date ON kpi (date)",
+    ]),
+    # Version 2 (cột month generated + index (month, employee_id)) đã bỏ: oracle lọc theo khoảng date
+    # nên không query nào dùng tới. Version 3 dọn lại cho DB đã lỡ chạy version 2.
+    (3, "Bỏ cột month và index (month, employee_id) không dùng tới", [
+        "DROP INDEX IF EXISTS idx_attendance_month_employee",
+        "DROP INDEX IF EXISTS idx_kpi_month_employee",
+        "ALTER TABLE attendance DROP COLUMN month",
+        "ALTER TABLE kpi DROP COLUMN month",
+    ]),
+]
+
+# ALTER TABLE DROP COLUMN cần SQLite >= 3.35
+DROP_COLUMN_MIN_VERSION = (3, 35, 0)
+
+
+def get_schema_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def _column_exists(conn, table, column):
+    # table_xinfo (không phải table_info): cột generated là cột ẩn, table_info không liệt kê
+    return any(col[1] == column for col in conn.execute(f"PRAGMA table_xinfo({table})").fetchall())
+
+
+def _has_month_schema(conn):
+    """DB đã từng chạy version 2 cũ (còn cột month hoặc index month) hay chưa"""
+    if any(_column_exists(conn, table, "month") for table in ("attendance", "kpi")):
+        return True
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'index' AND name IN "
+                        "('idx_attendance_month_employee', 'idx_kpi_month_employee')").fetchone() is not None
+
+
+# Migration chỉ dọn dẹp: không có gì để làm thì chỉ nâng user_version, không chạy/in gì
+MIGRATION_CHECKS = {
+    3: _has_month_schema,
+}
+
+
+def run_migrations(conn, target_version=None):
+    """Chạy các migration chưa áp dụng theo thứ tự, trả về schema version sau khi chạy"""
+    current = get_schema_version(conn)
+    target_version = target_version or MIGRATIONS[-1][0]
+
+    for version, description, statements in MIGRATIONS:
+        if version <= current or version > target_version:
+            continue
+
+        c = conn.cursor()
+        check = MIGRATION_CHECKS.get(version)
+        if check is not None and not check(conn):
+            c.execute(f"PRAGMA user_version = {version}")
+            conn.commit()
+            current = version
+            continue
+
+        for statement in statements:
+            # ALTER TABLE DROP COLUMN không có IF EXISTS
+            if statement.startswith("ALTER TABLE") and " DROP COLUMN " in statement:
+                table, column = statement.split()[2], statement.split()[5]
+                if not _column_exists(conn, table, column):
+                    continue
+                if sqlite3.sqlite_version_info < DROP_COLUMN_MIN_VERSION:
+                    # Cột VIRTUAL không tốn chỗ lưu, chỉ cần bỏ index là đủ
+                    print(f"ℹ️ SQLite {sqlite3.sqlite_version} không hỗ trợ DROP COLUMN, giữ cột {table}.{column}.")
+                    continue
+            c.execute(statement)
+        c.execute(f"PRAGMA user_version = {version}")
+        conn.commit()
+        current = version
+        print(f"✅ Migration {version}: {description}")
+
+    return current
@@ -0,0 +1,106 @@
+import hashlib
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+# Số nonce mỗi worker thử trong một lượt, và tần suất kiểm tra cờ dừng
+CHUNK_SIZE = 20000
+STOP_CHECK_INTERVAL = 1000
+
+_worker_state = {}
+
+
+# Giá trị của best_nonce khi chưa worker nào tìm thấy
+NOT_FOUND = -1
+
+
+def search_nonce(prefix, suffix, difficulty, start=0, count=None, best_nonce=None):
+    """Tìm nonce trong [start, start + count) với hash = sha256(prefix + nonce + suffix).
+    prefix chỉ hash một lần (midstate), mỗi nonce chỉ copy state rồi hash thêm phần còn lại.
+    best_nonce (multiprocessing.Value): nonce nhỏ nhất các worker đã tìm thấy; chỉ dừng sớm khi đã vượt qua nó,
+    nên mọi nonce nhỏ hơn kết quả đều được thử. Trả về (nonce, hash) đầu tiên đạt target, None nếu hết khoảng/bị dừng."""
+    target = "0" * difficulty
+    midstate = hashlib.sha256(prefix)
+    nonce = start
+    end = None if count is None else start + count
+
+    while end is None or nonce < end:
+        if best_nonce is not None and nonce % STOP_CHECK_INTERVAL == 0:
+            best = best_nonce.value
+            if best != NOT_FOUND and nonce > best:
+                return None
+        h = midstate.copy()
+        h.update(str(nonce).encode() + suffix)
+        block_hash = h.hexdigest()
+        if block_hash.startswith(target):
+            return nonce, block_hash
+        nonce += 1
+    return None
+
+
+def _init_worker(best_nonce, prefix, suffix, difficulty):
+    _worker_state['best_nonce'] = best_nonce
+    _worker_state['prefix'] = prefix
+    _worker_state['suffix'] = suffix
+    _worker_state['difficulty'] = difficulty
+
+
+def _search_nonces(start, count):
+    best_nonce = _worker_state['best_nonce']
+    result = search_nonce(_worker_state['prefix'], _worker_state['suffix'], _worker_state['difficulty'],
+                          start, count, best_nonce)
+    if result is not None:
+        with best_nonce.get_lock():
+            if best_nonce.value == NOT_FOUND or result[0] < best_nonce.value:
+                best_nonce.value = result[0]
+    return result
+
+
+def default_workers():
+    return os.cpu_count() or 1
+
+
+def mine_parallel(prefix, suffix, difficulty, workers=None, start_nonce=0, chunk_size=CHUNK_SIZE):
+    """Chia không gian nonce cho nhiều process (ProcessPoolExecutor).
+    prefix/suffix: phần dữ liệu cố định quanh nonce (xem Block.hash_parts).
+    Khi có worker tìm thấy nonce hợp lệ, các lượt nằm sau nonce đó bị hủy/dừng, các lượt nằm trước vẫn chạy hết
+    -> trả về (nonce, hash) với nonce nhỏ nhất, giống hệt kết quả đào tuần tự từ start_nonce."""
+    workers = workers or default_workers()
+    best_nonce = multiprocessing.Value('q', NOT_FOUND)
+    found = []
+
+    executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                   initargs=(best_nonce, prefix, suffix, difficulty))
+    try:
+        next_nonce = start_nonce
+        futures = {}  # future -> nonce bắt đầu của lượt
+        for _ in range(workers * 2):
+            futures[executor.submit(_search_nonces, next_nonce, chunk_size)] = next_nonce
+            next_nonce += chunk_size
+
+        while futures:
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                del futures[future]
+                result = future.result()
+                if result is not None:
+                    found.append(result)
+
+            if found:
+                best = min(found)[0]
+                # Hủy các lượt nằm sau nonce tốt nhất, chờ các lượt nằm trước chạy xong (có thể có nonce nhỏ hơn)
+                for future, start in futures.items():
+                    if start > best:
+                        future.cancel()
+                for future in wait(futures).done:
+                    if not future.cancelled() and future.result() is not None:
+                        found.append(future.result())
+                break
+
+            for _ in done:
+                futures[executor.submit(_search_nonces, next_nonce, chunk_size)] = next_nonce
+                next_nonce += chunk_size
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+    return min(found)
@@ -1,11 +1,42 @@
-import sqlite3
+from backend.db import get_connection
+
+def month_range(month):
+    """'YYYY-MM' -> ('YYYY-MM-01', ngày đầu tháng sau) để lọc cột date bằng điều kiện khoảng (dùng được index)"""
+    year, mon = int(month[:4]), int(month[5:7])
+    next_year, next_mon = (year + 1, 1) if mon == 12 else (year, mon + 1)
+    return f"{year:04d}-{mon:02d}-01", f"{next_year:04d}-{next_mon:02d}-01"
 
 def oracle_fetch_data(employee_id, month):
-    conn = sqlite3.connect('payroll.db')
+    start, end = month_range(month)
+    conn = get_connection()
     c = conn.cursor()
-    c.execute("SELECT SUM(hours_worked), SUM(overtime_hours) FROM attendance WHERE employee_id = ? AND strftime('%Y-%m', date) = ?", (employee_id, month))
+    c.execute("SELECT SUM(hours_worked), SUM(overtime_hours) FROM attendance WHERE employee_id = ? AND date >= ? AND date < ?", (employee_id, start, end))
     work_hours, overtime_hours = c.fetchone()
-    c.execute("SELECT AVG(kpi_score) FROM kpi WHERE employee_id = ? AND strftime('%Y-%m', date) = ?", (employee_id, month))
+    c.execute("SELECT AVG(kpi_score) FROM kpi WHERE employee_id = ? AND date >= ? AND date < ?", (employee_id, start, end))
     kpi_score = c.fetchone()[0]
     conn.close()
-    return work_hours or 0, overtime_hours or 0, kpi_score or 0
\ No newline at end of file
+    return work_hours or 0, overtime_hours or 0, kpi_score or 0
+
+def oracle_fetch_month(month):
+    """Lấy dữ liệu cả tháng cho mọi nhân viên bằng một GROUP BY mỗi bảng.
+    Trả về dict employee_id -> (work_hours, overtime_hours, kpi_score), nhân viên không có dữ liệu sẽ vắng mặt."""
+    start, end = month_range(month)
+    conn = get_connection()
+    c = conn.cursor()
+    c.execute("""SELECT employee_id, SUM(hours_worked), SUM(overtime_hours)
+                 FROM attendance
+                 WHERE date >= ? AND date < ?
+                 GROUP BY employee_id""", (start, end))
+    attendance = {row[0]: (row[1] or 0, row[2] or 0) for row in c.fetchall()}
+    c.execute("""SELECT employee_id, AVG(kpi_score)
+                 FROM kpi
+                 WHERE date >= ? AND date < ?
+                 GROUP BY employee_id""", (start, end))
+    kpi = {row[0]: row[1] or 0 for row in c.fetchall()}
+    conn.close()
+
+    data = {}
+    for employee_id in set(attendance) | set(kpi):
+        work_hours, overtime_hours = attendance.get(employee_id, (0, 0))
+        data[employee_id] = (work_hours, overtime_hours, kpi.get(employee_id, 0))
+    return data
\ No newline at end of file
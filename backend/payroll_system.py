@@ -1,12 +1,18 @@
-import sqlite3
+from backend.db import get_connection
 import time
 import json
 import base64
 import os
+import threading
 from backend.blockchain import Blockchain
 from backend.smart_contract import SmartContract
 from backend.crypto_utils import CryptoUtils
-from backend.oracle import oracle_fetch_data
+from backend.tx_envelope import seal_transaction, seal_transactions
+from backend.block_sealer import BlockSealer
+from backend.oracle import oracle_fetch_data, oracle_fetch_month
+
+# Thời gian tối đa (giây) chờ hàng đợi đóng block trước khi load lại chain
+SEAL_FLUSH_TIMEOUT = 30
 
 class PayrollSystem:
     def __init__(self):
@@ -17,11 +23,27 @@ class PayrollSystem:
         self.crypto = CryptoUtils()
         
         # Khởi tạo blockchain (sẽ tự động load từ file nếu có)
-        self.blockchain = Blockchain()
+        self.load_blockchain()
+
+        # Hàng đợi bảng lương + thread nền đóng block (thread chỉ chạy khi có ticket đầu tiên)
+        self.sealer = BlockSealer(self)
         
         # In thông tin blockchain sau khi khởi tạo
         self.print_blockchain_status()
 
+    def load_blockchain(self, timeout=SEAL_FLUSH_TIMEOUT):
+        """Load (hoặc load lại) blockchain từ file, dùng chung CryptoUtils của hệ thống.
+        Khi load lại, transaction đang chờ trong hàng đợi được đóng block vào chain cũ trước (xem BlockSealer)."""
+        sealer = getattr(self, 'sealer', None)
+        if sealer is None:
+            return self._open_blockchain()
+        return sealer.replace_blockchain(self._open_blockchain, timeout)
+
+    def _open_blockchain(self):
+        self.blockchain = Blockchain()
+        self.blockchain.crypto = self.crypto  # Dùng chung key AES cho cache giải mã
+        return self.blockchain
+
     def print_blockchain_status(self):
         """In thông tin trạng thái blockchain"""
         info = self.blockchain.get_blockchain_info()
@@ -33,61 +55,83 @@ class PayrollSystem:
         print(f"Last block time: {info['last_block_time']}")
         print("========================")
 
+    def build_transaction(self, employee_id, employee_name, agreed_salary, month,
+                          work_hours, overtime_hours, kpi_score):
+        """Tính lương bằng smart contract và tạo transaction (chưa mã hóa)"""
+        actual_workdays = work_hours / 8 if work_hours else 0
+        base_salary = self.smart_contract.calculate_base_salary(agreed_salary, actual_workdays)
+        overtime_salary = self.smart_contract.calculate_overtime_salary(overtime_hours, agreed_salary)
+        kpi_bonus = self.smart_contract.calculate_kpi_bonus(kpi_score)
+        total_salary = self.smart_contract.calculate_total_salary(base_salary, overtime_salary, kpi_bonus)
+
+        # Tạo transaction (bỏ phần ký giao dịch)
+        return {
+            'employee_id': employee_id,
+            'employee_name': employee_name,
+            'month': month,
+            'work_hours': work_hours,
+            'overtime_hours': overtime_hours,
+            'kpi_score': kpi_score,
+            'agreed_salary': agreed_salary,
+            'actual_workdays': actual_workdays,
+            'base_salary': base_salary,
+            'overtime_salary': overtime_salary,
+            'kpi_bonus': kpi_bonus,
+            'total_salary': total_salary,
+            'timestamp': time.time(),
+            'processed_date': time.strftime('%Y-%m-%d %H:%M:%S')
+        }
+
+    def encrypt_transaction(self, transaction):
+        """Mã hóa transaction để lưu vào blockchain (envelope AES-GCM "v2:", nonce riêng mỗi bản ghi)"""
+        return seal_transaction(transaction, self.crypto)
+
+    def encrypt_transactions(self, transactions):
+        """Mã hóa nhiều transaction một lượt (AESGCM và nonce lấy một lần cho cả lô)"""
+        return seal_transactions(transactions, self.crypto)
+
+    def prepare_payroll(self, employee_id, month):
+        """Lấy dữ liệu Oracle + thông tin nhân viên và tính lương, trả về transaction (chưa mã hóa)"""
+        # Lấy dữ liệu từ Oracle
+        work_hours, overtime_hours, kpi_score = oracle_fetch_data(employee_id, month)
+        
+        # Lấy thông tin nhân viên
+        conn = get_connection()
+        c = conn.cursor()
+        c.execute("SELECT name, agreed_salary FROM employees WHERE id = ?", (employee_id,))
+        employee_info = c.fetchone()
+        conn.close()
+        
+        if not employee_info:
+            raise Exception(f"Không tìm thấy nhân viên với ID {employee_id}")
+        
+        employee_name, agreed_salary = employee_info
+
+        return self.build_transaction(employee_id, employee_name, agreed_salary, month,
+                                      work_hours, overtime_hours, kpi_score)
+
+    def submit_payroll(self, employee_id, month, submitted_by=None):
+        """Tính lương, mã hóa và đưa vào hàng đợi; block được đóng ở thread nền.
+        Trả về (transaction chưa mã hóa, ticket) - tra trạng thái ticket bằng get_payroll_ticket."""
+        print(f"Queueing payroll for employee {employee_id}, month {month}")
+        transaction = self.prepare_payroll(employee_id, month)
+        ticket = self.sealer.submit(transaction, self.encrypt_transaction(transaction), submitted_by)
+        return transaction, ticket
+
+    def get_payroll_ticket(self, ticket_id):
+        return self.sealer.status(ticket_id)
+
     def process_payroll(self, employee_id, month):
-        """Xử lý bảng lương và lưu vào blockchain"""
+        """Xử lý bảng lương và lưu vào blockchain ngay (đào block trong lời gọi)"""
         try:
             print(f"Processing payroll for employee {employee_id}, month {month}")
             
-            # Lấy dữ liệu từ Oracle
-            work_hours, overtime_hours, kpi_score = oracle_fetch_data(employee_id, month)
-            
-            # Lấy thông tin nhân viên
-            conn = sqlite3.connect('payroll.db')
-            c = conn.cursor()
-            c.execute("SELECT name, agreed_salary FROM employees WHERE id = ?", (employee_id,))
-            employee_info = c.fetchone()
-            conn.close()
-            
-            if not employee_info:
-                raise Exception(f"Không tìm thấy nhân viên với ID {employee_id}")
-            
-            employee_name, agreed_salary = employee_info
-
-            # Tính toán lương sử dụng smart contract
-            actual_workdays = work_hours / 8 if work_hours else 0
-            base_salary = self.smart_contract.calculate_base_salary(agreed_salary, actual_workdays)
-            overtime_salary = self.smart_contract.calculate_overtime_salary(overtime_hours, agreed_salary)
-            kpi_bonus = self.smart_contract.calculate_kpi_bonus(kpi_score)
-            total_salary = self.smart_contract.calculate_total_salary(base_salary, overtime_salary, kpi_bonus)
-
-            # Tạo transaction (bỏ phần ký giao dịch)
-            transaction = {
-                'employee_id': employee_id,
-                'employee_name': employee_name,
-                'month': month,
-                'work_hours': work_hours,
-                'overtime_hours': overtime_hours,
-                'kpi_score': kpi_score,
-                'agreed_salary': agreed_salary,
-                'actual_workdays': actual_workdays,
-                'base_salary': base_salary,
-                'overtime_salary': overtime_salary,
-                'kpi_bonus': kpi_bonus,
-                'total_salary': total_salary,
-                'timestamp': time.time(),
-                'processed_date': time.strftime('%Y-%m-%d %H:%M:%S')
-            }
-
-            # Mã hóa transaction để lưu vào blockchain
-            transaction_json = json.dumps(transaction, ensure_ascii=False)
-            encrypted_transaction = self.crypto.aes_encrypt(transaction_json)
-            encrypted_transaction_b64 = base64.b64encode(encrypted_transaction).decode('utf-8')
+            transaction = self.prepare_payroll(employee_id, month)
+            employee_name = transaction['employee_name']
+            total_salary = transaction['total_salary']
 
-            # Thêm transaction đã mã hóa vào pending
-            self.blockchain.add_transaction(encrypted_transaction_b64)
-
-            # Tạo block mới với tất cả pending transactions
-            new_block = self.blockchain.add_block(self.blockchain.pending_transactions)
+            # Tạo block mới chỉ với transaction này (pending của hàng đợi do BlockSealer xử lý)
+            new_block = self.blockchain.add_block([self.encrypt_transaction(transaction)])
             
             print(f"Transaction processed successfully:")
             print(f"- Employee: {employee_name} (ID: {employee_id})")
@@ -102,31 +146,90 @@ class PayrollSystem:
             print(f"Error processing payroll: {e}")
             raise e
 
+    def process_payroll_batch(self, month, employee_ids=None, max_block_transactions=500):
+        """Chạy bảng lương cả tháng cho nhiều nhân viên (mặc định: tất cả) trong một lượt.
+        Transaction được gom vào một hoặc vài block (tối đa max_block_transactions/block),
+        lỗi của từng nhân viên được ghi lại trong 'failures' thay vì dừng cả lượt."""
+        print(f"Processing payroll batch for month {month}")
+
+        conn = get_connection()
+        c = conn.cursor()
+        c.execute("SELECT id, name, agreed_salary FROM employees ORDER BY id")
+        employees = {row[0]: (row[1], row[2]) for row in c.fetchall()}
+        conn.close()
+
+        if employee_ids is None:
+            employee_ids = list(employees.keys())
+
+        # Một GROUP BY cho cả tháng thay vì hai truy vấn oracle cho từng nhân viên
+        month_data = oracle_fetch_month(month)
+
+        built = []  # (employee_id, transaction)
+        failures = []
+
+        for employee_id in employee_ids:
+            try:
+                if employee_id not in employees:
+                    raise Exception(f"Không tìm thấy nhân viên với ID {employee_id}")
+
+                employee_name, agreed_salary = employees[employee_id]
+                work_hours, overtime_hours, kpi_score = month_data.get(employee_id, (0, 0, 0))
+                transaction = self.build_transaction(employee_id, employee_name, agreed_salary, month,
+                                                     work_hours, overtime_hours, kpi_score)
+                built.append((employee_id, transaction))
+            except Exception as e:
+                failures.append({'employee_id': employee_id, 'error': str(e)})
+
+        # Mã hóa cả lượt một lần, dùng chung cipher
+        ciphertexts = self.encrypt_transactions([transaction for _, transaction in built])
+        # (employee_id, transaction, ciphertext)
+        pending = [(employee_id, transaction, ciphertext)
+                   for (employee_id, transaction), ciphertext in zip(built, ciphertexts)]
+
+        blocks = []
+        processed = []
+        for start in range(0, len(pending), max_block_transactions):
+            chunk = pending[start:start + max_block_transactions]
+            try:
+                new_block = self.blockchain.add_block([ciphertext for _, _, ciphertext in chunk])
+                blocks.append({
+                    'index': new_block.index,
+                    'hash': new_block.hash,
+                    'transaction_count': len(chunk)
+                })
+                processed.extend({
+                    'employee_id': employee_id,
+                    'total_salary': transaction['total_salary'],
+                    'block_index': new_block.index
+                } for employee_id, transaction, _ in chunk)
+            except Exception as e:
+                failures.extend({'employee_id': employee_id, 'error': f"Không thể tạo block: {e}"}
+                                for employee_id, _, _ in chunk)
+
+        print(f"Payroll batch {month}: {len(processed)} processed, {len(failures)} failed, {len(blocks)} blocks")
+        return {
+            'month': month,
+            'processed': processed,
+            'failures': failures,
+            'blocks': blocks,
+            'total_salary': sum(item['total_salary'] for item in processed)
+        }
+
     def get_employee_salary_history(self, employee_id):
         """Lấy lịch sử lương của nhân viên"""
         try:
             transactions = []
             
-            for block in self.blockchain.chain:
-                for tx_data in block.transactions:
-                    try:
-                        # Decode transaction
-                        if isinstance(tx_data, str):
-                            encrypted_bytes = base64.b64decode(tx_data)
-                            decrypted_json = self.crypto.aes_decrypt(encrypted_bytes)
-                            tx_dict = json.loads(decrypted_json)
-                        else:
-                            tx_dict = tx_data
-                        
-                        # Kiểm tra nếu là transaction của nhân viên này
-                        if tx_dict.get('employee_id') == employee_id:
-                            tx_dict['block_index'] = block.index
-                            tx_dict['block_hash'] = block.hash
-                            transactions.append(tx_dict)
-                            
-                    except Exception as e:
-                        print(f"Error decoding transaction: {e}")
-                        continue
+            # Tra index phụ thay vì quét toàn chain
+            for block, tx_index, tx_dict in self.blockchain.get_employee_transactions(employee_id):
+                if not isinstance(tx_dict, dict):
+                    continue
+
+                tx_dict['block_index'] = block.index
+                tx_dict['block_hash'] = block.hash
+                tx_dict['block_timestamp'] = block.timestamp
+                tx_dict['tx_index'] = tx_index
+                transactions.append(tx_dict)
             
             # Sắp xếp theo thời gian
             transactions.sort(key=lambda x: x.get('timestamp', 0), reverse=True)
@@ -153,32 +256,29 @@ class PayrollSystem:
         errors = []
         
         try:
-            for block_index, block in enumerate(self.blockchain.chain):
-                for tx_index, tx_data in enumerate(block.transactions):
-                    try:
-                        if isinstance(tx_data, str):
-                            # Decode base64 + decrypt
-                            encrypted_bytes = base64.b64decode(tx_data)
-                            decrypted_json = self.crypto.aes_decrypt(encrypted_bytes)
-                            tx_dict = json.loads(decrypted_json)
-                        else:
-                            tx_dict = tx_data
-                        
-                        # Thêm metadata
-                        tx_dict['block_index'] = block_index
-                        tx_dict['block_hash'] = block.hash
-                        tx_dict['block_timestamp'] = block.timestamp
-                        
-                        transactions.append(tx_dict)
-                        
-                    except Exception as e:
-                        error_info = {
-                            'block_index': block_index,
-                            'transaction_index': tx_index,
-                            'error': str(e),
-                            'raw_data': str(tx_data)[:100] + '...' if len(str(tx_data)) > 100 else str(tx_data)
-                        }
-                        errors.append(error_info)
+            # Giải mã qua cache dùng chung, chain lớn thì giải mã song song
+            for block, tx_index, tx_dict in self.blockchain.parallel_scan():
+                try:
+                    if not isinstance(tx_dict, dict):
+                        raise Exception("Không giải mã được transaction")
+                    
+                    # Thêm metadata
+                    tx_dict['block_index'] = block.index
+                    tx_dict['block_hash'] = block.hash
+                    tx_dict['block_timestamp'] = block.timestamp
+                    tx_dict['tx_index'] = tx_index
+                    
+                    transactions.append(tx_dict)
+                    
+                except Exception as e:
+                    tx_data = block.transactions[tx_index]
+                    error_info = {
+                        'block_index': block.index,
+                        'transaction_index': tx_index,
+                        'error': str(e),
+                        'raw_data': str(tx_data)[:100] + '...' if len(str(tx_data)) > 100 else str(tx_data)
+                    }
+                    errors.append(error_info)
         
         except Exception as e:
             print(f"Error getting all transactions: {e}")
@@ -213,7 +313,7 @@ class PayrollSystem:
             total_salary = sum(tx.get('total_salary', 0) for tx in transactions if isinstance(tx.get('total_salary'), (int, float)))
             
             # Thống kê nhân viên
-            conn = sqlite3.connect('payroll.db')
+            conn = get_connection()
             c = conn.cursor()
             c.execute("SELECT COUNT(*) FROM employees")
             total_employees = c.fetchone()[0]
@@ -231,4 +331,17 @@ class PayrollSystem:
             
         except Exception as e:
             print(f"Error getting system stats: {e}")
-            return {}
\ No newline at end of file
+            return {}
+
+
+_payroll_system = None
+_payroll_system_lock = threading.Lock()
+
+def get_payroll_system():
+    """PayrollSystem duy nhất của tiến trình (chain + crypto), dùng chung cho routes và ReportGenerator"""
+    global _payroll_system
+    if _payroll_system is None:
+        with _payroll_system_lock:
+            if _payroll_system is None:
+                _payroll_system = PayrollSystem()
+    return _payroll_system
@@ -1,109 +1,33 @@
-import sqlite3
-import json
-import base64
+from backend.db import get_connection
 from datetime import datetime
 import io
 
 class ReportGenerator:
-    def __init__(self):
-        pass
+    def __init__(self, payroll_system=None):
+        # Dùng chung PayrollSystem của tiến trình (chain + crypto đã load sẵn)
+        self.payroll_system = payroll_system
     
-    def get_salary_statistics(self):
-        """Lấy thống kê lương chi tiết - Version 3 with better debugging"""
+    def get_salary_statistics(self, include_details=False):
+        """Lấy thống kê lương. Tổng lương/số transaction đọc từ bảng tổng hợp theo tháng (không giải mã chain);
+        include_details=True (xuất PDF/Excel) mới giải mã toàn chain để lấy transaction_details."""
         try:
-            from backend.payroll_system import PayrollSystem
-            payroll_system = PayrollSystem()
+            from backend.payroll_system import get_payroll_system
+            payroll_system = self.payroll_system or get_payroll_system()
+            blockchain = payroll_system.blockchain
             
-            # Debug: In ra thông tin blockchain
-            print(f"Debug - Total blocks: {len(payroll_system.blockchain.chain)}")
-            
-            # Lấy dữ liệu từ blockchain
-            total_salary = 0
-            total_transactions = 0
+            total_transactions, total_salary = blockchain.get_payroll_totals()
             transaction_details = []
             decoding_errors = []
             
-            for block_index, block in enumerate(payroll_system.blockchain.chain):
-                print(f"Debug - Block {block_index}: {len(block.transactions)} transactions")
-                
-                for tx_index, tx_data in enumerate(block.transactions):
-                    try:
-                        tx_dict = None
-                        
-                        # Kiểm tra kiểu dữ liệu và decode
-                        if isinstance(tx_data, str):
-                            print(f"Debug - Processing string transaction: {tx_data[:50]}...")
-                            
-                            # Thử decode base64 + decrypt trước
-                            try:
-                                encrypted_bytes = base64.b64decode(tx_data)
-                                decrypted_json = payroll_system.crypto.aes_decrypt(encrypted_bytes)
-                                tx_dict = json.loads(decrypted_json)
-                                print(f"Debug - Successfully decrypted transaction")
-                            except Exception as decode_error:
-                                print(f"Debug - Decode error: {decode_error}")
-                                
-                                # Thử parse JSON trực tiếp
-                                try:
-                                    tx_dict = json.loads(tx_data)
-                                    print(f"Debug - Parsed as direct JSON")
-                                except Exception as json_error:
-                                    print(f"Debug - JSON parse error: {json_error}")
-                                    decoding_errors.append(f"Block {block_index}, TX {tx_index}: Decode failed - {str(decode_error)}")
-                                    continue
-                                    
-                        elif isinstance(tx_data, dict):
-                            # Dữ liệu đã là dictionary
-                            tx_dict = tx_data
-                            print(f"Debug - Transaction is already a dict")
-                            
-                        else:
-                            # Kiểu dữ liệu khác
-                            print(f"Debug - Unknown transaction type: {type(tx_data)}")
-                            try:
-                                tx_dict = json.loads(str(tx_data))
-                            except:
-                                decoding_errors.append(f"Block {block_index}, TX {tx_index}: Unknown data type {type(tx_data)}")
-                                continue
-                        
-                        # Xử lý transaction đã decode
-                        if tx_dict and isinstance(tx_dict, dict):
-                            print(f"Debug - Transaction dict: {tx_dict}")
-                            
-                            # Kiểm tra các trường bắt buộc
-                            if 'total_salary' in tx_dict:
-                                salary = tx_dict.get('total_salary', 0)
-                                
-                                # Đảm bảo salary là số
-                                try:
-                                    salary = float(salary)
-                                    if salary > 0:
-                                        total_salary += salary
-                                        total_transactions += 1
-                                        transaction_details.append(tx_dict)
-                                        print(f"Debug - Added transaction: ${salary}")
-                                    else:
-                                        print(f"Debug - Invalid salary value: {salary}")
-                                except (ValueError, TypeError):
-                                    print(f"Debug - Cannot convert salary to float: {salary}")
-                                    decoding_errors.append(f"Block {block_index}, TX {tx_index}: Invalid salary value")
-                            else:
-                                print(f"Debug - Transaction missing total_salary field")
-                                decoding_errors.append(f"Block {block_index}, TX {tx_index}: Missing total_salary field")
-                        else:
-                            print(f"Debug - Failed to get valid transaction dict")
-                            decoding_errors.append(f"Block {block_index}, TX {tx_index}: Failed to parse transaction")
-                            
-                    except Exception as e:
-                        decoding_errors.append(f"Block {block_index}, TX {tx_index}: {str(e)}")
-                        print(f"Debug - Transaction processing error: {e}")
-                        continue
-            
-            print(f"Debug - Final totals - Salary: ${total_salary}, Transactions: {total_transactions}")
-            print(f"Debug - Decoding errors: {len(decoding_errors)}")
+            if include_details:
+                transaction_details, decoding_errors = self.get_transaction_details(blockchain)
+            else:
+                # Lỗi giải mã đã gặp khi tổng hợp (quarantine), không quét lại chain
+                decoding_errors = [f"Block {info['block_index']}, TX {info['tx_index']}: {info.get('error')}"
+                                   for info in blockchain.get_quarantined_transactions()]
             
             # Lấy thống kê từ database
-            conn = sqlite3.connect('payroll.db')
+            conn = get_connection()
             c = conn.cursor()
             
             c.execute("SELECT COUNT(*) FROM employees")
@@ -150,7 +74,6 @@ class ReportGenerator:
             monthly_blockchain_stats = {}
             try:
                 monthly_blockchain_stats = payroll_system.blockchain.get_transaction_volume_by_month()
-                print(f"Debug - Monthly blockchain stats: {monthly_blockchain_stats}")
             except Exception as e:
                 print(f"Debug - Monthly blockchain stats error: {e}")
             
@@ -168,7 +91,6 @@ class ReportGenerator:
                 'monthly_blockchain_stats': monthly_blockchain_stats
             }
             
-            print(f"Debug - Final result: {result}")
             return result
             
         except Exception as e:
@@ -178,7 +100,7 @@ class ReportGenerator:
             
             # Fallback: Lấy dữ liệu cơ bản từ database
             try:
-                conn = sqlite3.connect('payroll.db')
+                conn = get_connection()
                 c = conn.cursor()
                 
                 c.execute("SELECT COUNT(*) FROM employees")
@@ -218,10 +140,30 @@ class ReportGenerator:
                     'monthly_blockchain_stats': {}
                 }
     
+    def get_transaction_details(self, blockchain):
+        """Giải mã toàn chain (song song, qua cache dùng chung): list transaction có lương hợp lệ và list lỗi"""
+        transaction_details = []
+        decoding_errors = []
+        for block, tx_index, tx_dict in blockchain.parallel_scan():
+            if not isinstance(tx_dict, dict):
+                decoding_errors.append(f"Block {block.index}, TX {tx_index}: Failed to parse transaction")
+                continue
+            if 'total_salary' not in tx_dict:
+                decoding_errors.append(f"Block {block.index}, TX {tx_index}: Missing total_salary field")
+                continue
+            try:
+                salary = float(tx_dict.get('total_salary', 0))
+            except (ValueError, TypeError):
+                decoding_errors.append(f"Block {block.index}, TX {tx_index}: Invalid salary value")
+                continue
+            if salary > 0:
+                transaction_details.append(tx_dict)
+        return transaction_details, decoding_errors
+    
     def generate_salary_report_pdf(self):
         """Tạo báo cáo lương dạng PDF với dữ liệu thực"""
         try:
-            stats = self.get_salary_statistics()
+            stats = self.get_salary_statistics(include_details=True)
             
             # Tạo nội dung báo cáo chi tiết
             content = f"""SALARY REPORT - PAYROLL BLOCKCHAIN SYSTEM
@@ -300,7 +242,7 @@ Please check the system logs for more details.
     def generate_salary_report_excel(self):
         """Tạo báo cáo lương dạng Excel với dữ liệu thực"""
         try:
-            stats = self.get_salary_statistics()
+            stats = self.get_salary_statistics(include_details=True)
             
             # Tạo nội dung CSV-like cho Excel
             content = f"""SALARY REPORT - EXCEL FORMAT
@@ -0,0 +1,105 @@
+import threading
+from collections import OrderedDict
+
+
+class TransactionCache:
+    """Cache LRU cho transaction đã giải mã, key = (block_hash, tx_index).
+    Block đã vào chain thì không đổi nên mỗi ciphertext chỉ cần giải mã một lần."""
+
+    def __init__(self, max_entries=50000):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, block_hash, tx_index):
+        key = (block_hash, tx_index)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, block_hash, tx_index, tx_dict):
+        key = (block_hash, tx_index)
+        with self._lock:
+            self._entries[key] = tx_dict
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def contains(self, block_hash, tx_index):
+        """Kiểm tra có trong cache mà không tính hit/miss, không đổi thứ tự LRU"""
+        with self._lock:
+            return (block_hash, tx_index) in self._entries
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        return {
+            'entries': len(self._entries),
+            'max_entries': self.max_entries,
+            'hits': self.hits,
+            'misses': self.misses
+        }
+
+
+class TransactionFormatIndex:
+    """Định dạng đã nhận diện của từng transaction (1 byte/tx, theo block_hash) và danh sách quarantine.
+    Lần quét sau đi thẳng đúng đường giải mã; bản ghi hỏng chỉ thử một lần rồi bị bỏ qua."""
+
+    def __init__(self):
+        self._formats = {}      # block_hash -> bytearray mã định dạng
+        self._quarantine = {}   # (block_hash, tx_index) -> thông tin lỗi
+        self._lock = threading.Lock()
+
+    def get(self, block_hash, tx_index):
+        formats = self._formats.get(block_hash)
+        if formats is None or tx_index >= len(formats):
+            return 0
+        return formats[tx_index]
+
+    def set(self, block_hash, tx_index, tx_count, tx_format):
+        with self._lock:
+            formats = self._formats.get(block_hash)
+            if formats is None:
+                formats = self._formats[block_hash] = bytearray(tx_count)
+            formats[tx_index] = tx_format
+
+    def block_formats(self, block_hash):
+        """Mã định dạng đã biết của cả block (bytes), None nếu chưa quét"""
+        formats = self._formats.get(block_hash)
+        return bytes(formats) if formats is not None else None
+
+    def quarantine(self, block_hash, tx_index, info):
+        with self._lock:
+            self._quarantine[(block_hash, tx_index)] = info
+
+    def is_quarantined(self, block_hash, tx_index):
+        return (block_hash, tx_index) in self._quarantine
+
+    def quarantined(self):
+        """Danh sách bản ghi đang bị quarantine, theo thứ tự block/tx"""
+        with self._lock:
+            entries = list(self._quarantine.values())
+        return sorted(entries, key=lambda info: (info['block_index'], info['tx_index']))
+
+    def release(self):
+        """Bỏ quarantine (vd sau khi khôi phục đúng key), trả về số bản ghi sẽ được thử giải mã lại"""
+        with self._lock:
+            count = len(self._quarantine)
+            self._quarantine.clear()
+        return count
+
+    def clear(self):
+        with self._lock:
+            self._quarantine.clear()
+            self._formats.clear()
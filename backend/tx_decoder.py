@@ -0,0 +1,103 @@
+import base64
+import json
+
+from backend.tx_envelope import is_sealed, open_transaction, open_transactions
+
+# Mã định dạng của transaction trong block (1 byte, lưu trong TransactionFormatIndex)
+FORMAT_UNKNOWN = 0
+FORMAT_CBC = 1          # base64 + AES-CBC cũ (iv cố định)
+FORMAT_ENVELOPE = 2     # "v2:" + base64(AES-GCM envelope)
+FORMAT_JSON = 3         # JSON thuần (không mã hóa)
+FORMAT_DICT = 4         # dict trong block
+FORMAT_INVALID = 255    # không giải mã được -> quarantine
+
+# JSON thuần cũ có thể bắt đầu bằng BOM/khoảng trắng (base64 của bản ghi CBC không bao giờ có các ký tự này)
+JSON_LEADING_CHARS = '\ufeff \t\r\n'
+
+FORMAT_NAMES = {
+    FORMAT_UNKNOWN: 'unknown',
+    FORMAT_CBC: 'cbc',
+    FORMAT_ENVELOPE: 'v2',
+    FORMAT_JSON: 'json',
+    FORMAT_DICT: 'dict',
+    FORMAT_INVALID: 'invalid'
+}
+
+
+def detect_format(tx_data):
+    """Nhận diện định dạng từ tag phiên bản/ký tự đầu, không giải mã"""
+    if isinstance(tx_data, dict):
+        return FORMAT_DICT
+    if not isinstance(tx_data, str):
+        return FORMAT_INVALID
+    if is_sealed(tx_data):
+        return FORMAT_ENVELOPE
+    if tx_data.lstrip(JSON_LEADING_CHARS).startswith('{'):
+        return FORMAT_JSON
+    return FORMAT_CBC
+
+
+def decode_as(tx_data, tx_format, crypto):
+    """Giải mã theo định dạng đã biết, Exception nếu không giải mã được (không thử định dạng khác)"""
+    if tx_format == FORMAT_ENVELOPE:
+        return open_transaction(tx_data, crypto)
+    if tx_format == FORMAT_CBC:
+        return json.loads(crypto.legacy_decrypt(base64.b64decode(tx_data)))
+    if tx_format == FORMAT_JSON:
+        return json.loads(tx_data.lstrip(JSON_LEADING_CHARS))
+    if tx_format == FORMAT_DICT:
+        return tx_data
+    raise Exception(f"Định dạng transaction không hỗ trợ: {FORMAT_NAMES.get(tx_format, tx_format)}")
+
+
+def try_decode(tx_data, crypto=None, tx_format=None):
+    """Giải mã một transaction, trả về (tx_dict hoặc None, mã định dạng, lỗi hoặc None).
+    tx_format đã biết (từ lần quét trước) thì đi thẳng đường đó, không nhận diện lại."""
+    if tx_format is None or tx_format == FORMAT_UNKNOWN:
+        tx_format = detect_format(tx_data)
+    try:
+        if tx_format in (FORMAT_ENVELOPE, FORMAT_CBC) and crypto is None:
+            from backend.crypto_utils import CryptoUtils
+            crypto = CryptoUtils()
+        tx_dict = decode_as(tx_data, tx_format, crypto)
+        if not isinstance(tx_dict, dict):
+            raise Exception("Transaction sau giải mã không phải dict")
+        return tx_dict, tx_format, None
+    except Exception as e:
+        return None, tx_format, str(e)
+
+
+def try_decode_many(transactions, crypto=None, tx_formats=None):
+    """Giải mã nhiều transaction, trả về list kết quả như try_decode cùng thứ tự.
+    Transaction envelope được giải mã cả lô qua open_transactions (crypto.decrypt_many), định dạng khác đi từng cái.
+    tx_formats: list mã định dạng đã biết (None/FORMAT_UNKNOWN ở vị trí chưa biết)."""
+    if len(transactions) == 1:
+        # Lô một phần tử: chi phí gom lô lớn hơn phần tiết kiệm được
+        return [try_decode(transactions[0], crypto, tx_formats[0] if tx_formats else None)]
+    formats = [tx_formats[i] if tx_formats and tx_formats[i] not in (None, FORMAT_UNKNOWN) else detect_format(tx_data)
+               for i, tx_data in enumerate(transactions)]
+    results = [None] * len(transactions)
+    sealed = [i for i, tx_format in enumerate(formats) if tx_format == FORMAT_ENVELOPE]
+    if sealed:
+        if crypto is None:
+            from backend.crypto_utils import CryptoUtils
+            crypto = CryptoUtils()
+        for i, (tx_dict, error) in zip(sealed, open_transactions([transactions[i] for i in sealed], crypto)):
+            if error is None and not isinstance(tx_dict, dict):
+                tx_dict, error = None, "Transaction sau giải mã không phải dict"
+            results[i] = (tx_dict, FORMAT_ENVELOPE, error)
+
+    for i, tx_data in enumerate(transactions):
+        if results[i] is None:
+            results[i] = try_decode(tx_data, crypto, formats[i])
+    return results
+
+
+def decode_transaction(tx_data, crypto=None):
+    """Giải mã một transaction trong block theo tag phiên bản:
+    "v2:..." -> AES-GCM envelope, "{...}" -> JSON thuần, còn lại -> base64 + AES-CBC cũ.
+    Dùng chung cho Blockchain và worker process của parallel scan."""
+    tx_dict, _, error = try_decode(tx_data, crypto)
+    if error is not None:
+        print(f"Transaction decode error: {error}")
+    return tx_dict
@@ -0,0 +1,139 @@
+import base64
+import binascii
+import json
+
+from backend.crypto_utils import GCM_NONCE_SIZE, GCM_TAG_SIZE
+
+# Tag phiên bản đứng đầu transaction string:
+# - "v2:" + base64(nonce || ciphertext || tag): AES-GCM, nonce riêng cho mỗi bản ghi
+# - không có tag (base64 thuần): AES-CBC cũ với iv cố định trong crypto_keys.json
+ENVELOPE_PREFIX = "v2:"
+ENVELOPE_AAD = b"payroll-tx-v2"
+
+# Payload lớn hơn ngưỡng này được mã hóa theo từng đoạn qua update()
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+def is_sealed(tx_data):
+    return isinstance(tx_data, str) and tx_data.startswith(ENVELOPE_PREFIX)
+
+
+def seal_bytes(data, crypto):
+    """bytes -> nonce || ciphertext || tag, payload lớn được mã hóa stream theo STREAM_CHUNK_SIZE"""
+    if len(data) <= STREAM_CHUNK_SIZE:
+        return crypto.aead_encrypt(data, ENVELOPE_AAD)
+
+    nonce, encryptor = crypto.aead_encryptor(ENVELOPE_AAD)
+    view = memoryview(data)
+    parts = [nonce]
+    for start in range(0, len(view), STREAM_CHUNK_SIZE):
+        parts.append(encryptor.update(view[start:start + STREAM_CHUNK_SIZE]))
+    parts.append(encryptor.finalize())
+    parts.append(encryptor.tag)
+    return b"".join(parts)
+
+
+def open_bytes(envelope, crypto):
+    """nonce || ciphertext || tag -> bytes; giải mã và kiểm tra tag trong một lượt"""
+    if len(envelope) < GCM_NONCE_SIZE + GCM_TAG_SIZE:
+        raise Exception("Envelope quá ngắn")
+    if len(envelope) - GCM_NONCE_SIZE - GCM_TAG_SIZE <= STREAM_CHUNK_SIZE:
+        return crypto.aead_decrypt(envelope, ENVELOPE_AAD)
+
+    view = memoryview(envelope)
+    decryptor = crypto.aead_decryptor(bytes(view[:GCM_NONCE_SIZE]), bytes(view[-GCM_TAG_SIZE:]), ENVELOPE_AAD)
+    ciphertext = view[GCM_NONCE_SIZE:-GCM_TAG_SIZE]
+    parts = []
+    for start in range(0, len(ciphertext), STREAM_CHUNK_SIZE):
+        parts.append(decryptor.update(ciphertext[start:start + STREAM_CHUNK_SIZE]))
+    parts.append(decryptor.finalize())
+    return b"".join(parts)
+
+
+def seal_transaction(transaction, crypto):
+    """Transaction dict -> "v2:" + base64(envelope) để lưu vào block"""
+    data = json.dumps(transaction, ensure_ascii=False).encode('utf-8')
+    return ENVELOPE_PREFIX + base64.b64encode(seal_bytes(data, crypto)).decode('ascii')
+
+
+def seal_transactions(transactions, crypto):
+    """Nhiều transaction dict -> list "v2:..." cùng thứ tự, mã hóa cả lô qua crypto.encrypt_many
+    (payload lớn hơn STREAM_CHUNK_SIZE vẫn đi đường stream như seal_bytes)"""
+    if len(transactions) == 1:
+        # Lô một phần tử: chi phí gom lô lớn hơn phần tiết kiệm được
+        return [seal_transaction(transactions[0], crypto)]
+    # Một encoder cho cả lô (json.dumps tạo JSONEncoder mới mỗi lần gọi), kết quả giống hệt seal_transaction
+    encode = json.JSONEncoder(ensure_ascii=False).encode
+    payloads = [encode(transaction).encode('utf-8') for transaction in transactions]
+    small = [i for i, data in enumerate(payloads) if len(data) <= STREAM_CHUNK_SIZE]
+    envelopes = [None] * len(payloads)
+    for i, envelope in zip(small, crypto.encrypt_many([payloads[i] for i in small], ENVELOPE_AAD)):
+        envelopes[i] = envelope
+    for i, data in enumerate(payloads):
+        if envelopes[i] is None:
+            envelopes[i] = seal_bytes(data, crypto)
+    return [ENVELOPE_PREFIX + base64.b64encode(envelope).decode('ascii') for envelope in envelopes]
+
+
+def _unwrap(tx_data):
+    """"v2:..." -> bytes envelope (Exception nếu không phải envelope hoặc base64 hỏng)"""
+    if not is_sealed(tx_data):
+        raise Exception("Không phải transaction envelope v2")
+    try:
+        return base64.b64decode(tx_data[len(ENVELOPE_PREFIX):], validate=True)
+    except (binascii.Error, ValueError) as e:
+        raise Exception(f"Envelope base64 không hợp lệ: {e}")
+
+
+def open_transaction(tx_data, crypto):
+    """"v2:..." -> transaction dict (Exception nếu sai định dạng hoặc tag không khớp)"""
+    return json.loads(open_bytes(_unwrap(tx_data), crypto))
+
+
+def _loads_many(plaintexts):
+    """Parse nhiều JSON bytes trong một lần json.loads (ghép thành một mảng).
+    Có bản ghi hỏng (lỗi parse hoặc số phần tử lệch) thì parse lại từng cái để chỉ bản ghi đó bị lỗi."""
+    try:
+        values = json.loads(b"[" + b",".join(plaintexts) + b"]")
+        if len(values) == len(plaintexts):
+            return [(value, None) for value in values]
+    except ValueError:
+        pass
+    results = []
+    for data in plaintexts:
+        try:
+            results.append((json.loads(data), None))
+        except ValueError as e:
+            results.append((None, str(e)))
+    return results
+
+
+def open_transactions(tx_datas, crypto):
+    """Nhiều "v2:..." -> list (transaction dict hoặc None, lỗi hoặc None) cùng thứ tự.
+    Giải mã cả lô qua crypto.decrypt_many và parse JSON cả lô một lần,
+    bản ghi hỏng chỉ lỗi riêng nó (để quarantine từng transaction)."""
+    results = [None] * len(tx_datas)
+    plaintexts, positions = [], []
+    batch, batch_positions = [], []
+    for i, tx_data in enumerate(tx_datas):
+        try:
+            envelope = _unwrap(tx_data)
+            if len(envelope) - GCM_NONCE_SIZE - GCM_TAG_SIZE > STREAM_CHUNK_SIZE:
+                plaintexts.append(open_bytes(envelope, crypto))
+                positions.append(i)
+            else:
+                batch.append(envelope)
+                batch_positions.append(i)
+        except Exception as e:
+            results[i] = (None, str(e))
+
+    for i, (data, error) in zip(batch_positions, crypto.decrypt_many(batch, ENVELOPE_AAD)):
+        if error is None:
+            plaintexts.append(data)
+            positions.append(i)
+        else:
+            results[i] = (None, error)
+
+    for i, result in zip(positions, _loads_many(plaintexts)):
+        results[i] = result
+    return results
@@ -0,0 +1,172 @@
+from datetime import datetime
+
+from backend.db import get_connection
+
+# Tăng khi thêm bảng dẫn xuất mới: index cũ sẽ được xóa và dựng lại từ chain
+INDEX_VERSION = 2
+
+
+def to_seconds(ts):
+    """Chuẩn hóa timestamp về giây (hỗ trợ s, ms, ns, string số). Trả None nếu không parse được."""
+    try:
+        t = float(ts)
+    except Exception:
+        return None
+    # roughly detect units
+    if t > 1e15:    # nanoseconds
+        return t / 1e9
+    if t > 1e12:    # milliseconds
+        return t / 1e3
+    return t  # assume seconds
+
+
+def block_month(timestamp):
+    """Tháng (YYYY-MM) của block theo timestamp, None nếu timestamp không hợp lệ"""
+    sec = to_seconds(timestamp)
+    if sec is None:
+        return None
+    return datetime.fromtimestamp(sec).strftime('%Y-%m')
+
+
+def parse_salary(salary):
+    """total_salary dạng số hoặc chuỗi số (có dấu phẩy) -> float, không parse được thì 0"""
+    if isinstance(salary, (int, float)):
+        return float(salary)
+    try:
+        return float(str(salary).replace(',', '').strip())
+    except Exception:
+        return 0
+
+
+class EmployeeTxIndex:
+    """Index phụ lưu trong SQLite, cạnh file chain:
+    - tx_index: (employee_id, month) -> (block_index, tx_index)
+    - monthly_stats: tổng hợp theo tháng của block (số transaction, tổng lương, số block)
+    Cập nhật khi append block và có thể rebuild lại từ chain bất kỳ lúc nào."""
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.init_db()
+
+    def _connect(self):
+        return get_connection(self.db_path)
+
+    def init_db(self):
+        conn = self._connect()
+        c = conn.cursor()
+        c.execute('''CREATE TABLE IF NOT EXISTS tx_index
+                     (employee_id TEXT,
+                      month TEXT,
+                      block_index INTEGER,
+                      tx_index INTEGER,
+                      PRIMARY KEY (block_index, tx_index))''')
+        c.execute("CREATE INDEX IF NOT EXISTS idx_tx_index_employee_month ON tx_index (employee_id, month)")
+        c.execute('''CREATE TABLE IF NOT EXISTS tx_index_meta
+                     (key TEXT PRIMARY KEY,
+                      value TEXT)''')
+        c.execute('''CREATE TABLE IF NOT EXISTS monthly_stats
+                     (month TEXT PRIMARY KEY,
+                      transaction_count INTEGER NOT NULL DEFAULT 0,
+                      total_salary REAL NOT NULL DEFAULT 0,
+                      blocks INTEGER NOT NULL DEFAULT 0)''')
+
+        # Index tạo bởi phiên bản cũ (chưa có bảng tổng hợp) -> xóa để lần sync sau dựng lại từ đầu
+        c.execute("SELECT value FROM tx_index_meta WHERE key = 'version'")
+        row = c.fetchone()
+        if row is None or int(row[0]) != INDEX_VERSION:
+            self._clear(c)
+        conn.commit()
+        conn.close()
+
+    @staticmethod
+    def _rows_for_block(block, decoded_transactions):
+        rows = []
+        for tx_index, tx_dict in enumerate(decoded_transactions):
+            if isinstance(tx_dict, dict) and tx_dict.get('employee_id') is not None:
+                rows.append((str(tx_dict['employee_id']), tx_dict.get('month'), block.index, tx_index))
+        return rows
+
+    @staticmethod
+    def _month_totals(blocks_with_transactions):
+        """Cộng dồn {month: (số transaction, tổng lương, số block)} theo tháng của block"""
+        totals = {}
+        for block, decoded_transactions in blocks_with_transactions:
+            month = block_month(block.timestamp)
+            if month is None:
+                continue
+            tx_count, total_salary, blocks = totals.get(month, (0, 0.0, 0))
+            for tx_dict in decoded_transactions:
+                if isinstance(tx_dict, dict):
+                    tx_count += 1
+                    total_salary += parse_salary(tx_dict.get('total_salary', 0))
+            totals[month] = (tx_count, total_salary, blocks + 1)
+        return totals
+
+    def get_tip(self):
+        """Trả về (index, hash) của block cuối cùng đã được index, (-1, None) nếu chưa có"""
+        conn = self._connect()
+        c = conn.cursor()
+        c.execute("SELECT key, value FROM tx_index_meta WHERE key IN ('tip_index', 'tip_hash')")
+        meta = dict(c.fetchall())
+        conn.close()
+        return int(meta.get('tip_index', -1)), meta.get('tip_hash')
+
+    def add_blocks(self, blocks_with_transactions):
+        """blocks_with_transactions: list (block, [tx_dict đã giải mã]) theo thứ tự chain.
+        Index, bảng tổng hợp theo tháng và tip được cập nhật trong cùng một transaction."""
+        if not blocks_with_transactions:
+            return
+        conn = self._connect()
+        c = conn.cursor()
+        for block, decoded_transactions in blocks_with_transactions:
+            c.executemany("INSERT OR REPLACE INTO tx_index (employee_id, month, block_index, tx_index) VALUES (?, ?, ?, ?)",
+                          self._rows_for_block(block, decoded_transactions))
+        for month, (tx_count, total_salary, blocks) in self._month_totals(blocks_with_transactions).items():
+            c.execute('''INSERT INTO monthly_stats (month, transaction_count, total_salary, blocks) VALUES (?, ?, ?, ?)
+                         ON CONFLICT(month) DO UPDATE SET
+                             transaction_count = transaction_count + excluded.transaction_count,
+                             total_salary = total_salary + excluded.total_salary,
+                             blocks = blocks + excluded.blocks''',
+                      (month, tx_count, total_salary, blocks))
+        last_block = blocks_with_transactions[-1][0]
+        c.executemany("INSERT OR REPLACE INTO tx_index_meta (key, value) VALUES (?, ?)",
+                      [('tip_index', str(last_block.index)), ('tip_hash', last_block.hash)])
+        conn.commit()
+        conn.close()
+
+    @staticmethod
+    def _clear(c):
+        c.execute("DELETE FROM tx_index")
+        c.execute("DELETE FROM monthly_stats")
+        c.execute("DELETE FROM tx_index_meta")
+        c.execute("INSERT INTO tx_index_meta (key, value) VALUES ('version', ?)", (str(INDEX_VERSION),))
+
+    def clear(self):
+        conn = self._connect()
+        c = conn.cursor()
+        self._clear(c)
+        conn.commit()
+        conn.close()
+
+    def lookup(self, employee_id, month=None):
+        """Danh sách (block_index, tx_index) của nhân viên, theo thứ tự chain"""
+        conn = self._connect()
+        c = conn.cursor()
+        if month is None:
+            c.execute("SELECT block_index, tx_index FROM tx_index WHERE employee_id = ? ORDER BY block_index, tx_index",
+                      (str(employee_id),))
+        else:
+            c.execute("SELECT block_index, tx_index FROM tx_index WHERE employee_id = ? AND month = ? ORDER BY block_index, tx_index",
+                      (str(employee_id), month))
+        positions = c.fetchall()
+        conn.close()
+        return positions
+
+    def monthly_totals(self):
+        """Danh sách (month, transaction_count, total_salary, blocks) theo thứ tự tháng"""
+        conn = self._connect()
+        c = conn.cursor()
+        c.execute("SELECT month, transaction_count, total_salary, blocks FROM monthly_stats ORDER BY month")
+        rows = c.fetchall()
+        conn.close()
+        return rows
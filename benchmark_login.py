@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark Login: số lần login/giây (tra user + verify chữ ký RSA-PSS)
+khi parse PEM mỗi lần so với dùng public key đã cache.
+"""
+
+import base64
+import sqlite3
+import sys
+import time
+
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.asymmetric import padding
+from cryptography.hazmat.primitives import serialization
+
+from backend.crypto_utils import CryptoUtils, verify_signature, public_key_cache
+
+def create_users(total_users):
+    """Tạo bảng users trong bộ nhớ, trả về (conn, {username: (timestamp, signature)})"""
+    conn = sqlite3.connect(':memory:')
+    c = conn.cursor()
+    c.execute("CREATE TABLE users (id INTEGER PRIMARY KEY, username TEXT UNIQUE, public_key TEXT, is_active BOOLEAN DEFAULT 1)")
+
+    signed = {}
+    for i in range(total_users):
+        username = f"user{i}"
+        keys = CryptoUtils.generate_rsa_key_pair()
+        private_key = serialization.load_pem_private_key(keys['private_key'].encode(), password=None)
+        timestamp = int(time.time())
+        signature = private_key.sign(
+            f"{timestamp}:{username}".encode(),
+            padding.PSS(mgf=padding.MGF1(hashes.SHA256()), salt_length=padding.PSS.MAX_LENGTH),
+            hashes.SHA256()
+        )
+        c.execute("INSERT INTO users (username, public_key) VALUES (?, ?)", (username, keys['public_key']))
+        signed[username] = (timestamp, base64.b64encode(signature).decode())
+
+    conn.commit()
+    return conn, signed
+
+def login(conn, username, timestamp, signature, use_cache):
+    """Giống AuthSystem.verify_user: tra user rồi verify chữ ký"""
+    row = conn.execute("SELECT id, public_key, is_active FROM users WHERE username = ?", (username,)).fetchone()
+    if not row or not row[2]:
+        return False
+    user_id = row[0] if use_cache else None
+    return verify_signature(row[1], f"{timestamp}:{username}", signature, user_id=user_id)
+
+def run(conn, signed, total_logins, use_cache):
+    public_key_cache.invalidate()
+    usernames = list(signed)
+    start_time = time.perf_counter()
+    for i in range(total_logins):
+        username = usernames[i % len(usernames)]
+        timestamp, signature = signed[username]
+        assert login(conn, username, timestamp, signature, use_cache), "Login thất bại!"
+    return total_logins / (time.perf_counter() - start_time)
+
+def main():
+    total_logins = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    total_users = 10
+
+    print(f"🔐 Tạo {total_users} user với khóa RSA-2048 ...")
+    conn, signed = create_users(total_users)
+
+    without_cache = run(conn, signed, total_logins, use_cache=False)
+    with_cache = run(conn, signed, total_logins, use_cache=True)
+
+    print("-" * 50)
+    print(f"{'Chế độ':<24} | {'Login/giây':<20}")
+    print("-" * 50)
+    print(f"{'Parse PEM mỗi lần':<24} | {without_cache:<20.1f}")
+    print(f"{'Cache public key':<24} | {with_cache:<20.1f}")
+    print("-" * 50)
+    print(f"🚀 Nhanh hơn {with_cache / without_cache:.2f} lần")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark Memory: RSS của chain 100k block khi giữ Block dạng cũ
+(__dict__, transactions là list chuỗi base64) so với Block hiện tại (__slots__, transactions dạng bytes).
+Mỗi kiểu chạy trong một process riêng để đo RSS độc lập.
+"""
+
+import base64
+import os
+import random
+import resource
+import subprocess
+import sys
+
+class LegacyBlock:
+    """Bố cục Block trước đây: thuộc tính trong __dict__, transactions là list str"""
+    def __init__(self, index, transactions, timestamp, previous_hash, nonce, block_hash):
+        self.index = index
+        self.transactions = transactions
+        self.timestamp = timestamp
+        self.previous_hash = previous_hash
+        self.nonce = nonce
+        self.hash = block_hash
+        self.is_valid = True
+
+def current_rss():
+    """RSS hiện tại (byte), đọc từ /proc nếu có"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+def generate_blocks(total_blocks, tx_per_block, tx_size):
+    rng = random.Random(42)
+    for i in range(total_blocks):
+        yield {
+            "index": i,
+            "timestamp": 1700000000.0 + i,
+            "transactions": [base64.b64encode(rng.randbytes(tx_size)).decode('utf-8') for _ in range(tx_per_block)],
+            "previous_hash": "%064x" % rng.getrandbits(256),
+            "hash": "%064x" % rng.getrandbits(256),
+            "nonce": rng.randint(0, 100000),
+            "version": 3
+        }
+
+def measure(kind, total_blocks, tx_per_block, tx_size):
+    if kind == "compact":
+        from backend.blockchain import Block
+        make_block = Block.from_dict
+    else:
+        make_block = lambda d: LegacyBlock(d['index'], d['transactions'], d['timestamp'],
+                                           d['previous_hash'], d['nonce'], d['hash'])
+
+    before = current_rss()
+    chain = [make_block(data) for data in generate_blocks(total_blocks, tx_per_block, tx_size)]
+    after = current_rss()
+    assert len(chain) == total_blocks
+    print(after - before)
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == "--run":
+        measure(sys.argv[2], *map(int, sys.argv[3:6]))
+        return
+
+    total_blocks = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    tx_per_block = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    tx_size = 416  # Ciphertext của một transaction lương (JSON ~400 byte + padding)
+
+    print(f"🧠 Chain {total_blocks:,} block x {tx_per_block} transaction ({tx_size} byte ciphertext)")
+    results = {}
+    for kind in ("legacy", "compact"):
+        output = subprocess.run([sys.executable, __file__, "--run", kind, str(total_blocks), str(tx_per_block), str(tx_size)],
+                                capture_output=True, text=True, check=True).stdout
+        results[kind] = int(output.strip().splitlines()[-1])
+
+    print("-" * 52)
+    print(f"{'Block':<28} | {'RSS tăng thêm (MB)':<20}")
+    print("-" * 52)
+    print(f"{'Cũ (__dict__, list str)':<28} | {results['legacy'] / 1024 / 1024:<20.1f}")
+    print(f"{'Mới (__slots__, bytes)':<28} | {results['compact'] / 1024 / 1024:<20.1f}")
+    print("-" * 52)
+    print(f"📉 Giảm {100 * (1 - results['compact'] / results['legacy']):.1f}% RSS")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark Oracle: đo độ trễ oracle_fetch_data / oracle_fetch_month
+trên bảng attendance lớn (mặc định 1M dòng) trước và sau khi chạy migration index.
+Chạy trong thư mục tạm, không đụng tới payroll.db thật.
+"""
+
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+from backend.migrations import run_migrations
+from backend.oracle import oracle_fetch_data, oracle_fetch_month
+
+def create_test_db(total_rows, employees=2000):
+    """Tạo payroll.db với schema cũ (không index) và total_rows dòng attendance"""
+    conn = sqlite3.connect('payroll.db')
+    c = conn.cursor()
+    c.execute("CREATE TABLE employees (id INTEGER PRIMARY KEY, name TEXT, agreed_salary REAL, public_key TEXT)")
+    c.execute("CREATE TABLE attendance (employee_id INTEGER, date TEXT, hours_worked REAL, overtime_hours REAL)")
+    c.execute("CREATE TABLE kpi (employee_id INTEGER, date TEXT, kpi_score REAL)")
+    c.executemany("INSERT INTO employees (id, name, agreed_salary) VALUES (?, ?, ?)",
+                  ((i, f"Employee {i}", 1000 + i) for i in range(1, employees + 1)))
+
+    days = max(1, total_rows // employees)
+    start = date(2023, 1, 1)
+    dates = [(start + timedelta(days=d)).isoformat() for d in range(days)]
+
+    def attendance_rows():
+        for d in dates:
+            for employee_id in range(1, employees + 1):
+                yield employee_id, d, 8.0, random.choice((0.0, 1.0, 2.0))
+
+    c.executemany("INSERT INTO attendance VALUES (?, ?, ?, ?)", attendance_rows())
+    # KPI ghi theo tuần
+    c.executemany("INSERT INTO kpi VALUES (?, ?, ?)",
+                  ((employee_id, d, random.uniform(40, 100))
+                   for d in dates[::7] for employee_id in range(1, employees + 1)))
+    conn.commit()
+    conn.close()
+    return days * employees, dates
+
+def measure(func, runs):
+    times = []
+    for _ in range(runs):
+        start_time = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start_time)
+    return statistics.mean(times)
+
+def run_round(label, months, employees, runs):
+    single = measure(lambda: oracle_fetch_data(random.randint(1, employees), random.choice(months)), runs)
+    bulk = measure(lambda: oracle_fetch_month(random.choice(months)), max(1, runs // 5))
+    print(f"{label:<22} | {single * 1000:<22.3f} | {bulk * 1000:<22.3f}")
+    return single, bulk
+
+def main():
+    total_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    employees = 2000
+    runs = 20
+
+    workdir = tempfile.mkdtemp(prefix="oracle_bench_")
+    os.chdir(workdir)
+    print(f"🗄️  Đang tạo {total_rows:,} dòng attendance trong {workdir} ...")
+    rows, dates = create_test_db(total_rows, employees)
+    months = sorted({d[:7] for d in dates})
+    print(f"✅ Đã tạo {rows:,} dòng, {len(months)} tháng, {employees} nhân viên")
+
+    print("-" * 72)
+    print(f"{'Schema':<22} | {'oracle_fetch_data (ms)':<22} | {'oracle_fetch_month (ms)':<22}")
+    print("-" * 72)
+    before = run_round("Không index", months, employees, runs)
+
+    conn = sqlite3.connect('payroll.db')
+    start_time = time.perf_counter()
+    version = run_migrations(conn)
+    migrate_time = time.perf_counter() - start_time
+    conn.close()
+
+    after = run_round(f"Migration v{version}", months, employees, runs)
+    print("-" * 72)
+    print(f"⏱️  Thời gian migrate: {migrate_time:.2f}s")
+    print(f"🚀 oracle_fetch_data nhanh hơn {before[0] / after[0]:.1f} lần, "
+          f"oracle_fetch_month nhanh hơn {before[1] / after[1]:.1f} lần")
+
+if __name__ == "__main__":
+    main()
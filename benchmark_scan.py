@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark Scan: thời gian giải mã toàn chain (parallel_scan) khi tăng số worker 1..N.
+Chạy trong thư mục tạm với chain giả lập (key AES ngẫu nhiên), không đụng tới blockchain thật.
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+from backend.blockchain import Block, Blockchain
+from backend.crypto_utils import CryptoUtils
+from backend.tx_envelope import seal_transaction
+
+def create_test_blockchain(crypto, total_blocks, tx_per_block):
+    """Chain giả lập: mỗi transaction là JSON bảng lương trong envelope "v2:" (giống PayrollSystem.encrypt_transaction)"""
+    blockchain = Blockchain()
+    blockchain.crypto = crypto
+    for i in range(1, total_blocks + 1):
+        transactions = []
+        for j in range(tx_per_block):
+            transaction = {
+                'employee_id': j, 'employee_name': f"Employee {j}", 'month': "2025-01",
+                'work_hours': 176, 'overtime_hours': 4, 'kpi_score': 90,
+                'total_salary': 1000 + j, 'timestamp': time.time()
+            }
+            transactions.append(seal_transaction(transaction, crypto))
+        # Append trực tiếp (không mine, không ghi file) - chỉ đo phần giải mã
+        blockchain.chain.append(Block(len(blockchain.chain), transactions, time.time(), blockchain.chain[-1].hash))
+    return blockchain
+
+def main():
+    total_blocks = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    tx_per_block = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+    max_workers = int(sys.argv[3]) if len(sys.argv) > 3 else (os.cpu_count() or 1)
+
+    workdir = tempfile.mkdtemp(prefix="scan_bench_")
+    os.chdir(workdir)
+    crypto = CryptoUtils.from_key(os.urandom(32), os.urandom(16))
+
+    total_transactions = total_blocks * tx_per_block
+    print(f"⛓️  Tạo chain {total_blocks:,} block x {tx_per_block:,} transaction trong {workdir} ...")
+    blockchain = create_test_blockchain(crypto, total_blocks, tx_per_block)
+    print(f"🖥️  CPU: {os.cpu_count()}")
+
+    print("-" * 60)
+    print(f"{'Workers':<8} | {'Thời gian (s)':<14} | {'tx/s':<14} | {'Tăng tốc':<10}")
+    print("-" * 60)
+    baseline = None
+    expected = None
+    for workers in range(1, max_workers + 1):
+        blockchain.tx_cache.clear()
+        start_time = time.perf_counter()
+        results = blockchain.parallel_scan(workers=workers, fill_cache=False)
+        elapsed = time.perf_counter() - start_time
+
+        salaries = [tx_dict['total_salary'] for _, _, tx_dict in results]
+        if expected is None:
+            expected = salaries
+        assert len(results) == total_transactions and salaries == expected, "Kết quả giải mã sai thứ tự!"
+
+        baseline = baseline or elapsed
+        print(f"{workers:<8} | {elapsed:<14.3f} | {total_transactions / elapsed:<14,.0f} | {baseline / elapsed:<10.2f}")
+    print("-" * 60)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark Storage: kích thước file và thời gian load của chain
+khi lưu dạng JSON, JSON-lines (log) và nhị phân (binary).
+Chạy trong thư mục tạm với chain giả lập, không đụng tới blockchain thật.
+"""
+
+import base64
+import os
+import sys
+import tempfile
+import time
+
+from backend.blockchain import Block
+from backend.chain_storage import create_storage
+
+def create_test_chain(total_blocks, tx_per_block, tx_size=416):
+    """Chain giả lập: mỗi transaction là ciphertext ngẫu nhiên đã base64 (giống PayrollSystem.encrypt_transaction)"""
+    blocks = [Block(0, [], time.time(), "0")]
+    for i in range(1, total_blocks):
+        transactions = [base64.b64encode(os.urandom(tx_size)).decode('utf-8') for _ in range(tx_per_block)]
+        blocks.append(Block(i, transactions, time.time(), blocks[-1].hash))
+    return blocks
+
+def run(mode, blocks, workdir):
+    storage = create_storage(mode, os.path.join(workdir, f"chain_{mode}"))
+
+    start_time = time.perf_counter()
+    storage.write_all(blocks)
+    write_time = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    data = storage.load()
+    load_time = time.perf_counter() - start_time
+
+    assert len(data) == len(blocks) and data[-1]['transactions'] == blocks[-1].transactions, "Load sai dữ liệu!"
+    return os.path.getsize(storage.path), write_time, load_time
+
+def run_raw(blocks, workdir):
+    """Load file binary ở chế độ raw: ciphertext là memoryview, không base64"""
+    storage = create_storage("binary", os.path.join(workdir, "chain_binary"))
+    start_time = time.perf_counter()
+    data = storage.load(raw=True)
+    load_time = time.perf_counter() - start_time
+
+    kind, ciphertext = data[-1]['raw_transactions'][-1]
+    assert bytes(ciphertext) == base64.b64decode(blocks[-1].transactions[-1]), "Load sai dữ liệu!"
+    return load_time
+
+def main():
+    total_blocks = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    tx_per_block = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+
+    workdir = tempfile.mkdtemp(prefix="storage_bench_")
+    print(f"⛓️  Tạo chain {total_blocks:,} block x {tx_per_block} transaction trong {workdir} ...")
+    blocks = create_test_chain(total_blocks, tx_per_block)
+    raw_size = sum(len(base64.b64decode(tx)) for block in blocks for tx in block.transactions)
+
+    print("-" * 76)
+    print(f"{'Định dạng':<10} | {'Kích thước (MB)':<16} | {'So với ciphertext':<18} | {'Ghi (s)':<9} | {'Load (s)':<9}")
+    print("-" * 76)
+    results = {}
+    for mode in ("json", "log", "binary"):
+        size, write_time, load_time = run(mode, blocks, workdir)
+        results[mode] = (size, load_time)
+        print(f"{mode:<10} | {size / 1024 / 1024:<16.2f} | {size / raw_size:<18.2f} | {write_time:<9.3f} | {load_time:<9.3f}")
+    raw_load = run_raw(blocks, workdir)
+    print(f"{'binary raw':<10} | {'':<16} | {'':<18} | {'':<9} | {raw_load:<9.3f}")
+    print("-" * 76)
+
+    json_size, json_load = results["json"]
+    binary_size, binary_load = results["binary"]
+    print(f"📦 Binary nhỏ hơn JSON {json_size / binary_size:.2f} lần")
+    print(f"⏱️  Load so với JSON: binary {json_load / binary_load:.2f} lần, binary raw {json_load / raw_load:.2f} lần")
+
+if __name__ == "__main__":
+    main()
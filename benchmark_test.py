@@ -14,7 +14,12 @@ import base64
 
 # Import các class từ file gốc
 from blockchain import Blockchain, SalaryData, Transaction
-from crypto_utils import CryptoUtils
+from backend.crypto_utils import CryptoUtils  # có encrypt_many/decrypt_many
+from backend.tx_envelope import ENVELOPE_AAD
+
+# Kích thước batch cho encrypt_many/decrypt_many, mỗi cỡ batch xử lý tổng cộng BATCH_TOTAL payload
+BATCH_SIZES = [1, 100, 10000]
+BATCH_TOTAL = 10000
 
 def create_sample_salary_data(size="medium"):
     """Tạo dữ liệu lương mẫu với kích thước khác nhau"""
@@ -25,6 +30,47 @@ def create_sample_salary_data(size="medium"):
     else:  # large
         return SalaryData("Le Van C" * 10, 50000000, 5000000, 7500000)
 
+def _batch_throughput(label, tx_count, data_size, encrypt_time, decrypt_time):
+    total_mb = tx_count * data_size / 1024 / 1024
+    return {
+        'batch_size': label,
+        'encrypt_mb_s': total_mb / encrypt_time,
+        'encrypt_tx_s': tx_count / encrypt_time,
+        'decrypt_mb_s': total_mb / decrypt_time,
+        'decrypt_tx_s': tx_count / decrypt_time
+    }
+
+def benchmark_aes_batch(crypto, data, data_size):
+    """Throughput (MB/s, tx/s) của encrypt_many/decrypt_many (envelope AES-GCM như khi ghi/quét block)
+    theo từng cỡ batch, so với aead_encrypt/aead_decrypt từng bản ghi"""
+    records = [data] * BATCH_TOTAL
+    start_time = time.perf_counter()
+    encrypted = [crypto.aead_encrypt(record, ENVELOPE_AAD) for record in records]
+    encrypt_time = time.perf_counter() - start_time
+    start_time = time.perf_counter()
+    decrypted = [crypto.aead_decrypt(envelope, ENVELOPE_AAD) for envelope in encrypted]
+    decrypt_time = time.perf_counter() - start_time
+    assert [record.decode('utf-8') for record in decrypted] == records, "Dữ liệu sau giải mã không khớp!"
+    batch_results = [_batch_throughput("single", BATCH_TOTAL, data_size, encrypt_time, decrypt_time)]
+
+    for batch_size in BATCH_SIZES:
+        batch = [data] * batch_size
+        rounds = max(1, BATCH_TOTAL // batch_size)
+
+        start_time = time.perf_counter()
+        for _ in range(rounds):
+            encrypted = crypto.encrypt_many(batch, ENVELOPE_AAD)
+        encrypt_time = time.perf_counter() - start_time
+
+        start_time = time.perf_counter()
+        for _ in range(rounds):
+            decrypted = crypto.decrypt_many(encrypted, ENVELOPE_AAD)
+        decrypt_time = time.perf_counter() - start_time
+
+        assert [record.decode('utf-8') for record, error in decrypted] == batch, "Dữ liệu sau giải mã batch không khớp!"
+        batch_results.append(_batch_throughput(batch_size, rounds * batch_size, data_size, encrypt_time, decrypt_time))
+    return batch_results
+
 def benchmark_aes_encryption(crypto, test_runs=100):
     """Đo hiệu suất mã hóa AES-256"""
     print("🔒 Đang test hiệu suất AES-256...")
@@ -67,10 +113,15 @@ def benchmark_aes_encryption(crypto, test_runs=100):
             'avg_encrypt_time': statistics.mean(encrypt_times),
             'avg_decrypt_time': statistics.mean(decrypt_times),
             'std_encrypt_time': statistics.stdev(encrypt_times) if len(encrypt_times) > 1 else 0,
-            'std_decrypt_time': statistics.stdev(decrypt_times) if len(decrypt_times) > 1 else 0
+            'std_decrypt_time': statistics.stdev(decrypt_times) if len(decrypt_times) > 1 else 0,
+            'batch': benchmark_aes_batch(crypto, data, data_size)
         })
         
         print(f"✅ {data_type}: Encrypt {statistics.mean(encrypt_times):.6f}s, Decrypt {statistics.mean(decrypt_times):.6f}s")
+        for batch_result in results[-1]['batch']:
+            print(f"   GCM batch {batch_result['batch_size']:>6}: Encrypt {batch_result['encrypt_mb_s']:.1f} MB/s "
+                  f"({batch_result['encrypt_tx_s']:,.0f} tx/s), Decrypt {batch_result['decrypt_mb_s']:.1f} MB/s "
+                  f"({batch_result['decrypt_tx_s']:,.0f} tx/s)")
     
     return results
 
@@ -206,6 +257,11 @@ def print_comparison_tables(aes_results, rsa_results, blockchain_results):
             encrypt_ms = result['avg_encrypt_time'] * 1000
             decrypt_ms = result['avg_decrypt_time'] * 1000
             print(f"{'AES-256':<12} | {'1KB':<12} | {encrypt_ms:<12.3f} | {decrypt_ms:<12.3f} | Nhanh, phù hợp mã hóa giao dịch")
+            for batch_result in result['batch']:
+                batch_label = f"batch {batch_result['batch_size']}"
+                print(f"{'AES-256-GCM':<12} | {batch_label:<12} | {batch_result['encrypt_mb_s']:<7.1f} MB/s | "
+                      f"{batch_result['decrypt_mb_s']:<7.1f} MB/s | "
+                      f"{batch_result['encrypt_tx_s']:,.0f} / {batch_result['decrypt_tx_s']:,.0f} tx/s")
     
     # Giả lập RSA cho so sánh (RSA thường chậm hơn nhiều)
     for result in rsa_results:
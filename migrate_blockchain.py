@@ -0,0 +1,34 @@
+import os
+import sys
+
+from backend.blockchain import Blockchain
+from backend.chain_storage import STORAGE_FILES
+
+def migrate_storage(target_mode):
+    """Chuyển chain đang dùng (json/log) sang định dạng target_mode (log hoặc binary)"""
+    # Ưu tiên log (mới hơn) nếu có, ngược lại dùng blockchain.json
+    source_mode = "log" if target_mode != "log" and os.path.exists(STORAGE_FILES["log"][0]) else "json"
+    source_file = STORAGE_FILES[source_mode][0]
+    target_file = STORAGE_FILES[target_mode][0]
+
+    if not os.path.exists(source_file):
+        print(f"Không tìm thấy {source_file}, không có gì để migrate.")
+        return False
+
+    if os.path.exists(target_file) and "--force" not in sys.argv:
+        print(f"ℹ️ {target_file} đã tồn tại. Dùng --force để ghi đè.")
+        return False
+
+    count = Blockchain.migrate_storage(source_mode, target_mode)
+    print(f"✅ Đã chuyển {count} block từ {source_file} sang {target_file}.")
+    print(f"Blockchain sẽ tự dùng định dạng {target_mode} ở lần khởi động tiếp theo.")
+    return True
+
+if __name__ == "__main__":
+    # python migrate_blockchain.py [log|binary] [--force]
+    modes = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    target_mode = modes[0] if modes else "log"
+    if target_mode not in ("log", "binary"):
+        print(f"Định dạng không hợp lệ: {target_mode} (chọn log hoặc binary)")
+        sys.exit(1)
+    migrate_storage(target_mode)
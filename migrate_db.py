@@ -0,0 +1,21 @@
+import sqlite3
+
+from backend.migrations import MIGRATIONS, get_schema_version, run_migrations
+
+def migrate():
+    conn = sqlite3.connect('payroll.db')
+
+    current = get_schema_version(conn)
+    latest = MIGRATIONS[-1][0]
+    print(f"Schema version hiện tại: {current} (mới nhất: {latest})")
+
+    if current >= latest:
+        print("ℹ️ Database đã ở phiên bản mới nhất.")
+    else:
+        version = run_migrations(conn)
+        print(f"✅ Đã nâng schema lên version {version}.")
+
+    conn.close()
+
+if __name__ == "__main__":
+    migrate()
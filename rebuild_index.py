@@ -0,0 +1,11 @@
+from backend.blockchain import Blockchain
+
+def rebuild_employee_index():
+    blockchain = Blockchain()
+    if blockchain.rebuild_employee_index():
+        print(f"✅ Đã dựng lại index employee/month và tổng hợp theo tháng cho {len(blockchain.chain)} block: {blockchain.index_file}")
+    else:
+        print("❌ Không thể dựng lại index.")
+
+if __name__ == "__main__":
+    rebuild_employee_index()
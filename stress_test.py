@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Stress Test: N thread cùng xử lý bảng lương (mỗi lần một block qua Blockchain.add_block),
+song song một thread đọc get_blockchain_stats liên tục (như trang dashboard),
+đo throughput và kiểm tra chain sau cùng: hợp lệ, index liên tục, không mất/trùng transaction,
+bộ đếm block/transaction khớp chain thật, load lại từ file khớp với chain trong bộ nhớ.
+Chạy trong thư mục tạm với DB giả lập, không đụng tới blockchain/payroll.db thật.
+
+    python stress_test.py [threads] [payroll_mỗi_thread] [difficulty] [json|log|binary]
+"""
+
+import os
+import sys
+import tempfile
+import threading
+import time
+
+from backend.database import init_db
+from backend.db import get_connection
+
+def create_test_db(employees):
+    init_db()
+    conn = get_connection()
+    c = conn.cursor()
+    c.executemany("INSERT INTO employees (id, name, agreed_salary) VALUES (?, ?, ?)",
+                  ((i, f"Employee {i}", 1000 + i) for i in range(1, employees + 1)))
+    c.executemany("INSERT INTO attendance (employee_id, date, hours_worked, overtime_hours) VALUES (?, ?, ?, ?)",
+                  ((i, f"2025-01-{d:02d}", 8.0, 1.0) for i in range(1, employees + 1) for d in range(1, 21)))
+    c.executemany("INSERT INTO kpi (employee_id, date, kpi_score) VALUES (?, ?, ?)",
+                  ((i, "2025-01-15", 80.0) for i in range(1, employees + 1)))
+    conn.commit()
+    conn.close()
+
+def main():
+    threads_count = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    per_thread = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    difficulty = int(sys.argv[3]) if len(sys.argv) > 3 else 2
+    storage_mode = sys.argv[4] if len(sys.argv) > 4 else "log"
+
+    workdir = tempfile.mkdtemp(prefix="stress_")
+    os.chdir(workdir)
+    create_test_db(employees=threads_count)
+
+    from backend.blockchain import Blockchain
+    from backend.payroll_system import PayrollSystem
+
+    payroll = PayrollSystem()
+    payroll.blockchain = Blockchain(difficulty=difficulty, storage_mode=storage_mode)
+    payroll.blockchain.crypto = payroll.crypto
+    start_blocks = len(payroll.blockchain.chain)
+    start_transactions = sum(block.tx_count for block in payroll.blockchain.chain)
+
+    print(f"🔥 {threads_count} thread x {per_thread} payroll, difficulty {difficulty}, storage {storage_mode} ({workdir})")
+
+    errors = []
+    committed = []  # (employee_id, block_index)
+    committed_lock = threading.Lock()
+    barrier = threading.Barrier(threads_count + 1)
+    done = threading.Event()
+    stats_samples = []  # (total_blocks, total_transactions) đọc trong lúc các worker đang ghi
+
+    def stats_reader():
+        barrier.wait()
+        while not done.is_set():
+            try:
+                stats = payroll.blockchain.get_blockchain_stats()
+                stats_samples.append((stats['total_blocks'], stats['total_transactions']))
+            except Exception as e:
+                errors.append(f"stats: {e}")
+
+    def worker(employee_id):
+        barrier.wait()
+        for _ in range(per_thread):
+            try:
+                payroll.process_payroll(employee_id, "2025-01")
+                with committed_lock:
+                    committed.append(employee_id)
+            except Exception as e:
+                errors.append(str(e))
+
+    threads = [threading.Thread(target=worker, args=(i + 1,)) for i in range(threads_count)]
+    reader = threading.Thread(target=stats_reader)
+    start_time = time.perf_counter()
+    reader.start()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start_time
+    done.set()
+    reader.join()
+
+    blockchain = payroll.blockchain
+    expected = threads_count * per_thread
+    new_blocks = blockchain.chain[start_blocks:]
+    print("-" * 60)
+    print(f"⏱️  {elapsed:.2f}s, {len(committed) / elapsed:.1f} block/s, {len(errors)} lỗi, "
+          f"{len(stats_samples)} lần đọc stats")
+
+    checks = []
+    checks.append(("Không có lỗi", not errors))
+    checks.append(("Đủ số block", len(new_blocks) == expected == len(committed)))
+    checks.append(("Index liên tục", all(block.index == i for i, block in enumerate(blockchain.chain))))
+    checks.append(("Liên kết previous_hash", all(blockchain.chain[i].previous_hash == blockchain.chain[i - 1].hash
+                                                 for i in range(1, len(blockchain.chain)))))
+    checks.append(("verify_full_chain", blockchain.verify_full_chain()))
+
+    employee_ids = []
+    for block in new_blocks:
+        for tx_index in range(block.tx_count):
+            tx_dict = blockchain.get_decoded_transaction(block, tx_index)
+            employee_ids.append(tx_dict['employee_id'] if tx_dict else None)
+    checks.append(("Không mất/trùng transaction", sorted(employee_ids) == sorted(committed)))
+
+    # Mỗi block mới có đúng 1 transaction: mọi lần đọc stats phải thấy số block và transaction khớp nhau
+    actual_transactions = sum(block.tx_count for block in blockchain.chain)
+    stats = blockchain.get_blockchain_stats()
+    checks.append(("Stats khớp chain thật", stats['total_blocks'] == len(blockchain.chain)
+                   and stats['total_transactions'] == actual_transactions == start_transactions + expected))
+    checks.append(("Stats đọc song song nhất quán", all(
+        total_transactions - start_transactions == total_blocks - start_blocks
+        for total_blocks, total_transactions in stats_samples)))
+
+    reloaded = Blockchain(difficulty=difficulty, storage_mode=storage_mode)
+    checks.append(("Load lại từ file khớp", len(reloaded.chain) == len(blockchain.chain)
+                   and reloaded.get_latest_block().hash == blockchain.get_latest_block().hash
+                   and reloaded.verify_full_chain()))
+    reloaded_stats = reloaded.get_blockchain_stats()
+    checks.append(("Bộ đếm lưu trong checkpoint đúng", reloaded_stats['total_transactions'] == actual_transactions))
+
+    for name, ok in checks:
+        print(f"{'✅' if ok else '❌'} {name}")
+    for error in errors[:5]:
+        print(f"   {error}")
+    print("-" * 60)
+    sys.exit(0 if all(ok for _, ok in checks) else 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Test nhận diện/giải mã định dạng transaction (backend.tx_decoder).
+Dùng key AES ngẫu nhiên, không đọc crypto_keys.json thật.
+
+    python -m unittest test_tx_decoder
+"""
+
+import base64
+import json
+import os
+import unittest
+
+from backend.crypto_utils import CryptoUtils
+from backend.tx_decoder import (FORMAT_CBC, FORMAT_ENVELOPE, FORMAT_JSON, detect_format, try_decode, try_decode_many)
+from backend.tx_envelope import STREAM_CHUNK_SIZE, seal_transaction, seal_transactions
+
+TRANSACTION = {'employee_id': 7, 'month': "2025-01", 'total_salary': 1234.5}
+
+
+class TransactionFormatTest(unittest.TestCase):
+    def setUp(self):
+        self.crypto = CryptoUtils.from_key(os.urandom(32), os.urandom(16))
+
+    def assertDecodes(self, tx_data, expected_format):
+        tx_dict, tx_format, error = try_decode(tx_data, self.crypto)
+        self.assertIsNone(error)
+        self.assertEqual(tx_format, expected_format)
+        self.assertEqual(tx_dict, TRANSACTION)
+
+    def test_plain_json(self):
+        self.assertDecodes(json.dumps(TRANSACTION), FORMAT_JSON)
+
+    def test_plain_json_with_leading_whitespace(self):
+        # Bản ghi JSON cũ có khoảng trắng/xuống dòng đầu không được coi là CBC rồi bị quarantine
+        self.assertDecodes("\n  \t" + json.dumps(TRANSACTION), FORMAT_JSON)
+
+    def test_plain_json_with_bom(self):
+        self.assertDecodes("\ufeff" + json.dumps(TRANSACTION), FORMAT_JSON)
+        self.assertDecodes("\ufeff \n" + json.dumps(TRANSACTION), FORMAT_JSON)
+
+    def test_legacy_cbc(self):
+        tx_data = base64.b64encode(self.crypto.aes_encrypt(json.dumps(TRANSACTION))).decode()
+        self.assertEqual(detect_format(tx_data), FORMAT_CBC)
+        self.assertDecodes(tx_data, FORMAT_CBC)
+
+    def test_envelope(self):
+        self.assertDecodes(seal_transaction(TRANSACTION, self.crypto), FORMAT_ENVELOPE)
+
+    def test_decode_many_matches_single(self):
+        # Lô lẫn định dạng: envelope hỏng chỉ lỗi riêng nó, kết quả giống hệt try_decode từng transaction
+        large = dict(TRANSACTION, note="x" * (STREAM_CHUNK_SIZE + 1))
+        sealed = seal_transactions([TRANSACTION, large, TRANSACTION], self.crypto)
+        tampered = sealed[2][:-6] + ("A" if sealed[2][-6] != "A" else "B") + sealed[2][-5:]
+        transactions = [sealed[0], json.dumps(TRANSACTION), sealed[1], tampered, "v2:###", "v2:QUJD",
+                        base64.b64encode(self.crypto.aes_encrypt(json.dumps(TRANSACTION))).decode(),
+                        seal_transaction([1, 2], self.crypto)]
+        results = try_decode_many(transactions, self.crypto)
+        self.assertEqual(results, [try_decode(tx_data, self.crypto) for tx_data in transactions])
+        self.assertEqual([error is None for _, _, error in results], [True, True, True, False, False, False, True, False])
+        self.assertEqual(results[2][0], large)
+
+
+if __name__ == "__main__":
+    unittest.main()